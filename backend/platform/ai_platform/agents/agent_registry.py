@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func
+
+from ai_platform.settings import AGENT_REGISTRY_TTL_SEC
+from ai_platform.supafast.database import SessionLocal
+from ai_platform.supafast.models.ai_agent import AiAgent
+
+
+class AgentRegistry:
+    """
+    Process-wide cache of the AiAgent configurations.
+
+    The agents are loaded into a snapshot of detached rows, the session used for loading is closed
+    right away so no connection is pinned. Every `ttl` seconds the cheap version signature
+    (count, sum of config_version, max id) is polled and the snapshot is reloaded only if it changed,
+    so edits done by any uvicorn worker become visible to all of them. Writes done through
+    `apis/agents/crud.py` call `invalidate()`, the next `refresh_if_stale()` reloads the snapshot in a thread.
+    Lookups keep serving the previous snapshot until then, only the very first load runs where it is needed.
+    """
+
+    def __init__(self, session_factory=SessionLocal, ttl: float = AGENT_REGISTRY_TTL_SEC):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self._agents: Optional[Dict[int, AiAgent]] = None
+        self._signature: Optional[Tuple] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch_signature(self, db) -> Tuple:
+        count, version_sum, max_id = db.query(
+            func.count(AiAgent.id), func.coalesce(func.sum(AiAgent.config_version), 0), func.max(AiAgent.id)
+        ).one()
+        return count, int(version_sum), max_id
+
+    def _reload(self) -> Dict[int, AiAgent]:
+        db = self.session_factory()
+        try:
+            signature = self._fetch_signature(db)
+            agents = {agent.id: agent for agent in db.query(AiAgent).all()}
+            db.expunge_all()
+        finally:
+            db.close()
+        self._agents, self._signature, self._checked_at = agents, signature, time.monotonic()
+        return agents
+
+    def refresh(self, force: bool = False) -> Dict[int, AiAgent]:
+        """Reload the snapshot if the version signature changed (or always when forced), returns the snapshot"""
+        with self._lock:
+            if self._agents is None or force:
+                return self._reload()
+            if time.monotonic() - self._checked_at < self.ttl:
+                return self._agents
+            db = self.session_factory()
+            try:
+                signature = self._fetch_signature(db)
+            finally:
+                db.close()
+            if signature != self._signature:
+                return self._reload()
+            self._checked_at = time.monotonic()
+            return self._agents
+
+    async def refresh_if_stale(self) -> None:
+        """Non-blocking variant of refresh for the request path, DB work only happens once the TTL expires"""
+        if self._agents is not None and time.monotonic() - self._checked_at < self.ttl:
+            return
+        await asyncio.to_thread(self.refresh)
+
+    def invalidate(self) -> None:
+        """Mark the snapshot stale, it keeps being served until the next refresh reloads it"""
+        with self._lock:
+            self._signature = None
+            self._checked_at = float("-inf")
+
+    def all(self) -> Dict[int, AiAgent]:
+        agents = self._agents
+        return agents if agents is not None else self.refresh()
+
+    def get(self, agent_id: int) -> Optional[AiAgent]:
+        return self.all().get(agent_id)
+
+
+agent_registry = AgentRegistry()
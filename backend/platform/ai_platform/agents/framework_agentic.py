@@ -1,31 +1,57 @@
+import asyncio
 import json
 import os
-from typing import List, Dict, AsyncGenerator, Union
-from openai import OpenAI
-from ai_platform.agents.tools_implemented import get_course_content
-from ai_platform.supafast.database import get_db
+import time
+from typing import List, Dict, AsyncGenerator, Union, Tuple, Optional
+from ai_platform.agents.agent_registry import agent_registry
+from ai_platform.agents.history_budget import HistoryBudgeter
+from ai_platform.agents.metrics import record_usage, PARSER_LATENCY, RETRIEVAL_LATENCY, TIME_TO_FIRST_TOKEN, \
+    STREAM_DURATION, TOOL_CALLS, RESPONSE_CACHE_LOOKUPS
+from ai_platform.agents.model_routing import ModelRouter, RoutingSignals
+from ai_platform.agents.query_router import EmbeddingRouter
+from ai_platform.agents.semantic_cache import CacheKey, response_cache
+from ai_platform.agents.singleflight import SingleFlight
+from ai_platform.agents.stream_events import StreamEvent
+from ai_platform.agents.tools_implemented import AVAILABLE_TOOLS
+from ai_platform.agents.tokens import count_tokens
+from ai_platform.agents.usage import usage_recorder
+from ai_platform.llm.base import LLMProvider, close_stream
+from ai_platform.llm.governor import llm_priority, BACKGROUND
+from ai_platform.llm.providers import get_provider
+from ai_platform.settings import AGENT_MAX_TOOL_ROUNDS, AGENT_TOOL_TIMEOUT_SEC, ROUTER_ENABLED, \
+    RESPONSE_CACHE_ENABLED, EMBEDDING_MODEL, HISTORY_SUMMARY_MODEL, HISTORY_SUMMARY_MAX_TOKENS, SINGLEFLIGHT_ENABLED
+from ai_platform.supafast.database import read_only_session
 from ai_platform.agents.tools import course_content_tool
 from ai_platform.supafast.models.ai_agent import AiAgent
-from ai_platform.vectordb.db_pgvector import PgvectorDB
+from ai_platform.vectordb.query_embeddings import query_embeddings
+from ai_platform.vectordb.store_registry import vector_stores
 
 
 class Agents:
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        self.db = next(get_db())
-        self.agents = self._load_agents()
-
-    def _load_agents(self) -> Dict[int, AiAgent]:
-        """Load all agents from the database"""
-        agents = {}
-        db_agents = self.db.query(AiAgent).all()
-        for agent in db_agents:
-            agents[agent.id] = agent
-        return agents
+    def __init__(self, max_tool_rounds: int = AGENT_MAX_TOOL_ROUNDS, tool_timeout: float = AGENT_TOOL_TIMEOUT_SEC,
+                 llm: LLMProvider = None):
+        self.max_tool_rounds = max_tool_rounds
+        self.tool_timeout = tool_timeout
+        self.llm = llm or get_provider()
+        self.registry = agent_registry
+        self.router = EmbeddingRouter(self._embed_texts) if ROUTER_ENABLED else None
+        self.response_cache = response_cache if RESPONSE_CACHE_ENABLED else None
+        self.history_budgeter = HistoryBudgeter()
+        self.flights = SingleFlight(enabled=SINGLEFLIGHT_ENABLED)
+        # Streams stopped by a client disconnect, the tokens generated before it and the max_tokens left unused
+        self.cancellation_stats = {"streams": 0, "completion_tokens": 0, "unused_token_budget": 0}
+        self.usage_recorder = usage_recorder
+        self.model_router = ModelRouter()
+        self.query_embeddings = query_embeddings
+
+    @property
+    def agents(self) -> Dict[int, AiAgent]:
+        """All agents from the registry cache, kept in sync with the database"""
+        return self.registry.all()
 
     def _get_agent_config(self, agent_id: int) -> AiAgent:
         """Get configuration for a specific agent"""
-        return self.agents.get(agent_id)
+        return self.registry.get(agent_id)
 
     async def stream_response(
             self,
@@ -33,24 +59,43 @@ class Agents:
             agent_id: int,
             course_id: int = None,
             chat_history: List[Dict[str, str]] = [],
-            context: str = None
-    ) -> AsyncGenerator[str, None]:
-        """Generic stream response method that uses agent-specific configuration"""
+            context: str = None,
+            cache_key: CacheKey = None,
+            history_summary: str = None,
+            summarized_until: int = 0,
+            routing: RoutingSignals = None,
+            cache_context: str = None
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """
+        Generic stream response method that uses agent-specific configuration.
+        `cache_key` is passed by callers which already looked the query up in the response cache,
+        with `cache_context` the caller supplied context the answer is cached under.
+        `history_summary` is the rolling summary of the first `summarized_until` messages of `chat_history`.
+        `routing` holds the retrieval signals the model router uses to pick the fast or the strong model.
+        """
+        await self.registry.refresh_if_stale()
         agent = self._get_agent_config(agent_id)
         if not agent:
-            yield json.dumps({"type": "error", "content": "Agent not found"})
+            yield StreamEvent.error("Agent not found")
             return
 
+        if cache_key is None:
+            cache_key, cached_answer = await self.cache_lookup(agent_id, course_id, user_input, chat_history,
+                                                               cache_context)
+            if cached_answer is not None:
+                for chunk in self._replay(cached_answer):
+                    yield chunk
+                return
+
         system_prompt = agent.system_prompt or "You are a helpful assistant."
         if context:
             system_prompt += "\nHere is the context...\n" + context
 
         messages = [{"role": "system", "content": system_prompt}]
-        for msg in chat_history:
-            if msg.get("role") == "user":
-                messages.append({"role": "user", "content": msg.get("content", "")})
-            elif msg.get("role") == "assistant":
-                messages.append({"role": "assistant", "content": msg.get("content", "")})
+        messages.extend(self._history_messages(chat_history, history_summary, summarized_until, keep_overflow=True))
+
+        decision = self.model_router.choose(agent, user_input, chat_history, routing)
+        model = decision.model if decision else agent.model_name
 
         if course_id:
             user_input += f" (Course ID: {course_id})"
@@ -58,80 +103,227 @@ class Agents:
 
         model_params = {
             "messages": messages,
-            "model": agent.model_name,
+            "model": model,
             "tools": [course_content_tool],
             "temperature": agent.temperature,
             "max_tokens": agent.response_token_limit,
-            "stream": True
+            "stream_options": {"include_usage": True},
         }
 
-        completion = self.openai_client.chat.completions.create(**model_params)
-        # For now handling single tool call
-        tool_args = ""
-        tool_name = ""
-        tool_id = ""
-        tool_call_object = None
-        for chunk in completion:
-            # Handle content chunks
-            if chunk.choices[0].delta.content:
-                yield json.dumps({"type": "text", "content": chunk.choices[0].delta.content})
-
-            # Handle tool calls - this is the problematic part
-            if chunk.choices[0].delta.tool_calls:
-                if chunk.choices[0].delta.tool_calls[0]:
-                    if chunk.choices[0].delta.tool_calls[0].function.arguments:
-                        tool_args += chunk.choices[0].delta.tool_calls[0].function.arguments
+        answer_parts = []
+        started = time.perf_counter()
+        first_token_at = None
+        completion_tokens = 0
+        for round_no in range(self.max_tool_rounds + 1):
+            if round_no == self.max_tool_rounds:
+                # Out of tool rounds, force the model to answer with what it already has
+                model_params["tool_choice"] = "none"
+            round_started = time.perf_counter()
+            completion = await self.llm.stream_chat(**model_params)
+            # Tool calls arrive as fragments keyed by index, several calls can be interleaved in one stream
+            tool_calls: Dict[int, Dict] = {}
+            try:
+                async for chunk in completion:
+                    if not chunk.choices:
+                        # The last chunk only carries the usage of the round
+                        self._record_usage(agent, "answer" if round_no == 0 else "tool_follow_up", chunk.usage,
+                                           round_started, model)
+                        if chunk.usage:
+                            completion_tokens += chunk.usage.completion_tokens or 0
                         continue
-                    else:
-                        # If argument is empty then it must be first chunk so get tool id and name
-                        tool_call_object = chunk.choices[0].delta.tool_calls
-                        tool_name += chunk.choices[0].delta.tool_calls[0].function.name
-                        tool_id += chunk.choices[0].delta.tool_calls[0].id
-
-            if not chunk.choices[0].delta.tool_calls and chunk.choices[0].finish_reason == "tool_calls":
-                #If finish reason is tool calls then break this and call the tool and start another streaming
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        if not answer_parts:
+                            first_token_at = time.perf_counter() - started
+                            TIME_TO_FIRST_TOKEN.observe(first_token_at, agent.id, model)
+                        answer_parts.append(delta.content)
+                        yield StreamEvent.text(delta.content)
+                    for tool_call in delta.tool_calls or []:
+                        call = tool_calls.setdefault(tool_call.index, {"id": "", "name": "", "arguments": ""})
+                        if tool_call.id:
+                            call["id"] = tool_call.id
+                        if tool_call.function and tool_call.function.name:
+                            call["name"] += tool_call.function.name
+                        if tool_call.function and tool_call.function.arguments:
+                            call["arguments"] += tool_call.function.arguments
+            except (GeneratorExit, asyncio.CancelledError):
+                # The consumer went away (client disconnect), stop the generation instead of reading it to the end
+                self._record_cancellation(agent, answer_parts)
+                self.model_router.record_outcome(decision, first_token_at, time.perf_counter() - started,
+                                                 count_tokens("".join(answer_parts)), round_no, cancelled=True)
+                raise
+            finally:
+                await close_stream(completion)
+
+            if not tool_calls:
                 break
-
-        # Now if the loop breaks using tool call, then call the tool and yield the final chunks
-        # Handle tool calls
-        if tool_name == "get_course_content":
-            args = json.loads(tool_args)
-            print(f"Tool call detected: get_course_content with args {args}")
-            content = get_course_content(next(get_db()), **args)
+            # Run every tool call of this round concurrently, then let the model continue with the results
+            ordered_calls = [tool_calls[index] for index in sorted(tool_calls)]
+            for call in ordered_calls:
+                TOOL_CALLS.inc(agent.id, model, call["name"])
             messages.append({
                 "role": "assistant",
                 "content": None,
-                "tool_calls": tool_call_object
-            })
-            messages.append({
-                "role": "tool",
-                "content": json.dumps(content),
-                "tool_call_id": tool_id
+                "tool_calls": [
+                    {"id": call["id"], "type": "function",
+                     "function": {"name": call["name"], "arguments": call["arguments"]}}
+                    for call in ordered_calls
+                ]
             })
-            # Step 3: Stream the final response
-            stream = self.openai_client.chat.completions.create(
-                messages=messages,
-                model=agent.model_name,
-                stream=True
+            messages.extend(await self._execute_tool_calls(ordered_calls))
+        duration = time.perf_counter() - started
+        STREAM_DURATION.observe(duration, agent.id, model)
+        self.model_router.record_outcome(decision, first_token_at, duration, completion_tokens, round_no)
+        if cache_key is not None and answer_parts:
+            self.response_cache.store(agent_id, course_id, cache_key.embedding, "".join(answer_parts), cache_context,
+                                      version=cache_key.version)
+        yield StreamEvent.end()
+
+    def _history_messages(self, chat_history: List[Dict], history_summary: str = None,
+                          summarized_until: int = 0, keep_overflow: bool = False) -> List[Dict]:
+        """
+        The rolling summary followed by the newest messages that fit in the history token budget.
+        With `keep_overflow` the messages that left the window but aren't covered by the saved summary yet are
+        kept verbatim too, they are only dropped once a fold advanced `summarized_until` past them.
+        """
+        overflow, recent = self.history_budgeter.split(chat_history or [], summarized_until)
+        if keep_overflow:
+            recent = overflow + recent
+        messages = []
+        if history_summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{history_summary}"})
+        for msg in recent:
+            if msg.get("role") in ("user", "assistant"):
+                messages.append({"role": msg["role"], "content": msg.get("content", "")})
+        return messages
+
+    def _record_usage(self, agent: AiAgent, kind: str, usage, started: float, model: str = None) -> None:
+        """Token counters for the metrics endpoint and a usage row for the persistent accounting"""
+        model = model or agent.model_name
+        record_usage(usage, agent.id, model)
+        self.usage_recorder.record(agent.id, model, kind, usage, (time.perf_counter() - started) * 1000)
+
+    def _record_cancellation(self, agent: AiAgent, answer_parts: List[str]) -> None:
+        generated = count_tokens("".join(answer_parts))
+        self.cancellation_stats["streams"] += 1
+        self.cancellation_stats["completion_tokens"] += generated
+        if agent.response_token_limit:
+            self.cancellation_stats["unused_token_budget"] += max(agent.response_token_limit - generated, 0)
+        print(f"INFO: Stream of agent {agent.id} cancelled by the client after {generated} completion tokens")
+
+    async def summarize_history(self, chat_history: List[Dict], history_summary: str = None,
+                                summarized_until: int = 0, agent_id: int = None) -> Optional[Tuple[str, int]]:
+        """
+        Fold the messages that no longer fit in the token window into the rolling summary.
+        Only the new overflow is sent along with the previous summary, the summary is never rebuilt from scratch.
+        Returns the new (summary, summarized_until) or None when nothing overflowed.
+        `agent_id` is the agent of the conversation, the usage of the summary is accounted to it.
+        """
+        overflow, _ = self.history_budgeter.split(chat_history or [], summarized_until)
+        if not overflow:
+            return None
+        started = time.perf_counter()
+        # The answer was already sent, the summary queues behind interactive calls
+        with llm_priority(BACKGROUND):
+            completion = await self.llm.chat(
+                model=HISTORY_SUMMARY_MODEL,
+                messages=self.history_budgeter.summary_messages(history_summary, overflow),
+                max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+                temperature=0
             )
-            for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield json.dumps({"type": "text", "content": chunk.choices[0].delta.content})
-        # Finally reset the tool metadata and yield end
-        tool_id = ""
-        tool_name = ""
-        tool_args = ""
-        tool_call_object = None
-        yield json.dumps({"type": "end"})
-
-    def _execute_agent_sync(
+        self.usage_recorder.record(agent_id, HISTORY_SUMMARY_MODEL, "summary", completion.usage,
+                                   (time.perf_counter() - started) * 1000)
+        return completion.choices[0].message.content, summarized_until + len(overflow)
+
+    async def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        # The response cache, the router and the vector search embed the same query, it is sent to the model once
+        return await self.query_embeddings.aembed_texts(texts, self._embed_uncached, EMBEDDING_MODEL)
+
+    async def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        return await self.llm.embed(texts, model=EMBEDDING_MODEL)
+
+    async def cache_lookup(self, agent_id: int, course_id: int, user_query: str, history: List[Dict] = None,
+                            context: str = None,
+                            version: Tuple[int, int] = None) -> Tuple[Optional[CacheKey], Optional[str]]:
+        """
+        Look the query up in the semantic response cache, `context` is the caller supplied context if any.
+        Returns the key to store the answer under (None when the query must not be cached) and the cached answer
+        if any. The key carries the knowledge base version read here, or `version` when the caller started
+        loading content earlier, so an answer generated while the content changed isn't stored.
+        Only fresh questions are cached, follow ups depend on the earlier answers of the conversation.
+        """
+        if not self.response_cache or any(msg.get("role") == "assistant" for msg in history or []):
+            return None, None
+        version = version or self.response_cache.version(course_id)
+        try:
+            query_embedding = (await self._embed_texts([user_query]))[0]
+        except Exception as e:
+            print(f"Response cache lookup skipped: {e}")
+            return None, None
+        cached_answer = self.response_cache.lookup(agent_id, course_id, query_embedding, context)
+        await self.registry.refresh_if_stale()
+        agent = self._get_agent_config(agent_id)
+        RESPONSE_CACHE_LOOKUPS.inc(
+            agent_id, agent.model_name if agent else "", "miss" if cached_answer is None else "hit"
+        )
+        return CacheKey(query_embedding, version), cached_answer
+
+    @staticmethod
+    def _replay(answer: str):
+        """Replay a cached answer with the same events a live stream produces"""
+        yield StreamEvent.text(answer)
+        yield StreamEvent.end()
+
+    async def replay_stream(self, answer: str) -> AsyncGenerator[StreamEvent, None]:
+        """Async variant of _replay for callers that consume stream_response"""
+        for chunk in self._replay(answer):
+            yield chunk
+
+    async def _execute_tool_calls(self, tool_calls: List[Dict]) -> List[Dict]:
+        """Execute the tool calls of one round concurrently and return the matching tool messages"""
+        results = await asyncio.gather(
+            *(self._execute_tool_call(call["name"], call["arguments"]) for call in tool_calls)
+        )
+        return [
+            {"role": "tool", "content": json.dumps(result, default=str), "tool_call_id": call["id"]}
+            for call, result in zip(tool_calls, results)
+        ]
+
+    async def _execute_tool_call(self, name: str, arguments: str) -> Dict:
+        """Execute a single tool call, errors are returned to the model instead of failing the stream"""
+        tool_fn = AVAILABLE_TOOLS.get(name)
+        if not tool_fn:
+            return {"error": f"Unknown tool {name}"}
+        try:
+            args = json.loads(arguments or "{}")
+        except json.JSONDecodeError as e:
+            return {"error": f"Invalid arguments for {name}: {e}"}
+        print(f"Tool call detected: {name} with args {args}")
+        try:
+            return await asyncio.wait_for(self._run_tool(tool_fn, **args), timeout=self.tool_timeout)
+        except asyncio.TimeoutError:
+            return {"error": f"Tool {name} timed out after {self.tool_timeout} seconds"}
+        except Exception as e:
+            return {"error": f"Tool {name} failed: {e}"}
+
+    async def _run_tool(self, tool_fn, **args):
+        """Run a blocking DB-backed tool in a worker thread so the event loop keeps serving other streams"""
+        return await asyncio.to_thread(self._run_tool_in_session, tool_fn, **args)
+
+    @staticmethod
+    def _run_tool_in_session(tool_fn, **args):
+        # Concurrent tool calls run in different threads, so each gets its own short lived session
+        with read_only_session() as db:
+            return tool_fn(db, **args)
+
+    async def _execute_agent(
             self,
             agent_id: int,
             user_query: str,
             context: str = None,
             history: List[Dict] = None
     ) -> Union[Dict, str]:
-        """Synchronous execution logic for non-streaming agents"""
+        """Execution logic for non-streaming agents"""
         agent = self._get_agent_config(agent_id)
         if not agent:
             return {"error": "Agent not found"}
@@ -142,7 +334,7 @@ class Agents:
 
         messages = [{"role": "system", "content": system_prompt}]
         if history:
-            messages.extend(history)
+            messages.extend(self._history_messages(history))
         messages.append({"role": "user", "content": user_query})
 
         is_json_response = agent.response_format == "json" or "parser" in agent.name.lower()
@@ -158,37 +350,45 @@ class Agents:
         if is_json_response:
             model_params["response_format"] = {"type": "json_object"}
 
-        completion = self.openai_client.chat.completions.create(**model_params)
+        started = time.perf_counter()
+        completion = await self.llm.chat(**model_params)
+        self._record_usage(agent, "parser" if "parser" in agent.name.lower() else "completion", completion.usage,
+                           started)
         response = completion.choices[0].message
 
         if response.tool_calls and not is_json_response:
-            # Create a new messages array with the original messages plus the assistant's response
+            # Keep calling tools until the model answers or the round cap is reached
             tool_messages = messages.copy()
-            tool_messages.append({
-                "role": "assistant",
-                "content": response.content,
-                "tool_calls": response.tool_calls
-            })
-
-            # Now add the tool response
-            for tool_call in response.tool_calls:
-                if tool_call.function.name == "get_course_content":
-                    args = json.loads(tool_call.function.arguments)
-                    content = get_course_content(next(get_db()), **args)
-                    tool_messages.append({
-                        "role": "tool",
-                        "content": json.dumps(content),
-                        "tool_call_id": tool_call.id
-                    })
-
-            # Make the final call with the tool responses included
-            final_completion = self.openai_client.chat.completions.create(
-                messages=tool_messages,
-                model=agent.model_name,
-                temperature=agent.temperature,
-                max_tokens=agent.response_token_limit
-            )
-            return final_completion.choices[0].message.content
+            for round_no in range(1, self.max_tool_rounds + 1):
+                tool_calls = [
+                    {"id": tc.id, "name": tc.function.name, "arguments": tc.function.arguments}
+                    for tc in response.tool_calls
+                ]
+                for call in tool_calls:
+                    TOOL_CALLS.inc(agent.id, agent.model_name, call["name"])
+                tool_messages.append({
+                    "role": "assistant",
+                    "content": response.content,
+                    "tool_calls": [tc.model_dump() for tc in response.tool_calls]
+                })
+                tool_messages.extend(await self._execute_tool_calls(tool_calls))
+
+                follow_up_params = {
+                    "messages": tool_messages,
+                    "model": agent.model_name,
+                    "temperature": agent.temperature,
+                    "max_tokens": agent.response_token_limit,
+                    "tools": [course_content_tool],
+                }
+                if round_no == self.max_tool_rounds:
+                    follow_up_params["tool_choice"] = "none"
+                started = time.perf_counter()
+                final_completion = await self.llm.chat(**follow_up_params)
+                self._record_usage(agent, "tool_follow_up", final_completion.usage, started)
+                response = final_completion.choices[0].message
+                if not response.tool_calls:
+                    break
+            return response.content
         elif is_json_response:
             return json.loads(response.content)
         return response.content
@@ -199,70 +399,127 @@ class Agents:
             user_query: str,
             history: List[Dict] = None,
             context: str = None,
-            streaming: bool = False
-    ) -> AsyncGenerator[Union[Dict, str], None]:
+            streaming: bool = False,
+            course_id: int = None
+    ) -> AsyncGenerator[StreamEvent, None]:
         """Public method to handle agent responses with dynamic behavior"""
+        await self.registry.refresh_if_stale()
         agent = self._get_agent_config(agent_id)
         if not agent:
-            yield json.dumps({"type": "error", "content": "Agent not found"})
+            yield StreamEvent.error("Agent not found")
             return
 
-        # If this is a host-like agent, use a parser-like agent first
-        if "host" in agent.name.lower():
-            parser_agent_id = next(
-                (id for id, a in self.agents.items() if "parser" in a.name.lower()),
-                None
-            )
-            if parser_agent_id:
-                parser_response = self._execute_agent_sync(
-                    agent_id=parser_agent_id,
-                    user_query=user_query,
-                    context=context,
-                    history=history
-                )
-                if isinstance(parser_response, dict) and "vector_index" in parser_response:
-                    vector_index = parser_response["vector_index"]
-                    if vector_index != "general":
-                        vectordb = PgvectorDB(
-                            collection_name=vector_index,
-                            connection_str=os.getenv("SQLALCHEMY_DATABASE_URL")
-                        )
-                        additional_context = vectordb.get_context_for_query(user_query, include_metadata=False)
-                        context = (context or "") + f"\nVector DB Context: {additional_context}"
-
         if streaming:
-            # For tracking tool calls
-            messages = []
-            if history:
-                for msg in history:
-                    messages.append(msg)
-
-            # Keep track of accumulated text content to send to frontend
-            accumulated_text = ""
-
-            async for chunk in self.stream_response(
-                    user_input=user_query,
-                    agent_id=agent_id,
-                    chat_history=history,
-                    context=context
-            ):
-                chunk_data = json.loads(chunk)
-
-                # If it's a text chunk, send it to the frontend directly
-                if chunk_data["type"] == "text":
-                    accumulated_text += chunk_data["content"]
-                    yield json.dumps({"type": "text", "content": chunk_data["content"]})
-
-                elif chunk_data["type"] == "end":
-                    yield json.dumps({"type": "end"})
+            flight_key = self.flights.key(agent_id, user_query, course_id=course_id, context=context, history=history)
+            if flight_key is None:
+                async for event in self._stream_answer(agent, user_query, history, context, course_id):
+                    yield event
+                return
+            # Identical questions in flight share the leader's routing, retrieval and completion
+            flight, leading = self.flights.acquire(flight_key)
+            if leading:
+                self.flights.start(flight, self._stream_answer(agent, user_query, history, context, course_id))
+            async for event in flight.subscribe():
+                yield event
         else:
-            result = self._execute_agent_sync(
+            if "host" in agent.name.lower():
+                context = await self._knowledge_base_context(agent, user_query, context, history)
+            result = await self._execute_agent(
                 agent_id=agent_id,
                 user_query=user_query,
                 context=context,
                 history=history
             )
-            yield json.dumps({"type": "result", "content": result})
+            yield StreamEvent("result", result)
+
+    async def _stream_answer(self, agent: AiAgent, user_query: str, history: List[Dict] = None,
+                             context: str = None, course_id: int = None) -> AsyncGenerator[StreamEvent, None]:
+        """Response cache lookup, knowledge base retrieval for host-like agents and the streamed completion"""
+        # Cached under the caller's context, the knowledge base results appended below follow from the query
+        cache_context = context
+        cache_key, cached_answer = await self.cache_lookup(agent.id, course_id, user_query, history, cache_context)
+        if cached_answer is not None:
+            for chunk in self._replay(cached_answer):
+                yield chunk
+            return
+
+        routing = RoutingSignals()
+        if "host" in agent.name.lower():
+            context = await self._knowledge_base_context(agent, user_query, context, history, routing)
+
+        async for event in self.stream_response(
+                user_input=user_query,
+                agent_id=agent.id,
+                course_id=course_id,
+                chat_history=history or [],
+                context=context,
+                cache_key=cache_key,
+                routing=routing,
+                cache_context=cache_context
+        ):
+            yield event
+
+    async def _knowledge_base_context(self, agent: AiAgent, user_query: str, context: str = None,
+                                      history: List[Dict] = None, routing: RoutingSignals = None) -> str:
+        """Pick the knowledge base of the query and append its search results to the context"""
+        started = time.perf_counter()
+        route = await self._resolve_route(user_query, context=context, history=history)
+        if routing and route:
+            routing.knowledge_base, routing.route_score = route["vector_index"], route.get("score")
+        if route and route["vector_index"] != "general":
+            additional_context, distance = await self.search_knowledge_base_scored(route["vector_index"], user_query)
+            if routing:
+                routing.retrieval_distance = distance
+            context = (context or "") + f"\nVector DB Context: {additional_context}"
+        RETRIEVAL_LATENCY.observe(time.perf_counter() - started, agent.id, agent.model_name)
+        return context
+
+    async def _resolve_route(self, user_query: str, context: str = None, history: List[Dict] = None) -> Dict:
+        """
+        Decide which knowledge base should answer the query.
+        The local embedding router answers confident cases, only ambiguous queries pay for the parser agent call.
+        """
+        if self.router:
+            route = await self.router.route(user_query, context=context)
+            if route:
+                return route
+        return await self.parser_route(user_query, context=context, history=history)
+
+    async def parser_route(self, user_query: str, context: str = None, history: List[Dict] = None) -> Dict:
+        """Ask the parser agent for the knowledge base, returns None when there is no parser agent"""
+        parser_agent_id = next(
+            (id for id, a in self.agents.items() if "parser" in a.name.lower()),
+            None
+        )
+        if not parser_agent_id:
+            return None
+        started = time.perf_counter()
+        parser_response = await self._execute_agent(
+            agent_id=parser_agent_id,
+            user_query=user_query,
+            context=context,
+            history=history
+        )
+        PARSER_LATENCY.observe(time.perf_counter() - started, parser_agent_id, self.agents[parser_agent_id].model_name)
+        if isinstance(parser_response, dict) and "vector_index" in parser_response:
+            return parser_response
+        return None
+
+    async def search_knowledge_base(self, collection_name: str, user_query: str) -> str:
+        """Similarity search on a knowledge base collection, run in a worker thread"""
+        context, _ = await self.search_knowledge_base_scored(collection_name, user_query)
+        return context
+
+    async def search_knowledge_base_scored(self, collection_name: str, user_query: str) -> Tuple[str, Optional[float]]:
+        """The search results and the distance of the closest chunk (None when nothing was found)"""
+        docs = await asyncio.to_thread(self._query_collection, collection_name, user_query)
+        context = "".join(f"\n{'- ' * 90}\nContent: {doc.page_content}\n" for doc, _ in docs)
+        return context, min((score for _, score in docs), default=None)
+
+    @staticmethod
+    def _query_collection(collection_name: str, user_query: str, k: int = 6):
+        # The collection's handle is shared by every request, only its first use pays for building it
+        return vector_stores.get(collection_name).query_with_score(user_query, k=k)
 
     def load_course_data(self, course_name):
         """Loads course data from the specified course_data directory."""
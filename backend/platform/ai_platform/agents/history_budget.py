@@ -0,0 +1,52 @@
+from typing import Dict, List
+
+from ai_platform.agents.tokens import count_message_tokens
+from ai_platform.settings import HISTORY_TOKEN_BUDGET
+
+SUMMARY_PROMPT = """You maintain the running summary of a conversation between a student and the Seek Portal
+academic guidance assistant. Update the existing summary with the new messages. Keep the course, weeks,
+lectures and assignments discussed, the student's goals and any open questions. Do not drop facts from the
+existing summary unless the new messages correct them. Reply with the updated summary only."""
+
+
+class HistoryBudgeter:
+    """
+    Keeps the prompt history under a token budget.
+
+    The newest messages are kept verbatim as long as they fit in `budget_tokens` (the newest one is always kept),
+    everything older has to be represented by the rolling summary stored on the conversation.
+    """
+
+    def __init__(self, budget_tokens: int = HISTORY_TOKEN_BUDGET):
+        self.budget_tokens = budget_tokens
+
+    def window_start(self, history: List[Dict]) -> int:
+        """Index of the first message of `history` that still fits in the verbatim window"""
+        used = 0
+        start = len(history)
+        for index in range(len(history) - 1, -1, -1):
+            tokens = count_message_tokens(history[index])
+            if used + tokens > self.budget_tokens and start < len(history):
+                break
+            used += tokens
+            start = index
+        return start
+
+    def split(self, history: List[Dict], summarized_until: int = 0):
+        """
+        Split the messages that are not summarized yet into (overflow, recent).
+        `overflow` must be folded into the summary, `recent` goes to the prompt verbatim.
+        """
+        pending = history[summarized_until:]
+        start = self.window_start(pending)
+        return pending[:start], pending[start:]
+
+    @staticmethod
+    def summary_messages(previous_summary: str, overflow: List[Dict]) -> List[Dict]:
+        transcript = "\n".join(
+            f"{msg.get('role')}: {msg.get('content', '')}" for msg in overflow if msg.get("role") in ("user", "assistant")
+        )
+        return [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Existing summary:\n{previous_summary or 'None'}\n\nNew messages:\n{transcript}"}
+        ]
@@ -0,0 +1,174 @@
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from ai_platform.settings import METRICS_ENABLED
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter per label values, label values are passed positionally in `labelnames` order"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in values]
+
+
+class Histogram:
+    """Cumulative buckets plus sum and count per label values, an observation is one bisect and three adds"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}  # labels -> [bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        lines = []
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Prometheus text exposition of the metrics recorded in process plus collectors read at scrape time.
+
+    Recording is a dict update under a per-metric lock, cheap enough to stay on in production.
+    Collectors expose the stats the caches, the LLM governor and the monitors already keep, they return
+    (name, type, documentation, [(labels dict, value)]) with type "counter" or "gauge".
+    """
+
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict, float]]]]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collector in self._collectors:
+            try:
+                collected = list(collector())
+            except Exception as e:
+                print(f"WARNING: Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, kind, documentation, samples in collected:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+AGENT_LABELS = ("agent_id", "model")
+
+PARSER_LATENCY = metrics.histogram(
+    "agent_parser_latency_seconds", "Parser agent call choosing the knowledge base", AGENT_LABELS
+)
+RETRIEVAL_LATENCY = metrics.histogram(
+    "agent_retrieval_latency_seconds", "Knowledge base routing and similarity search before the answer", AGENT_LABELS
+)
+TIME_TO_FIRST_TOKEN = metrics.histogram(
+    "agent_time_to_first_token_seconds", "From the start of the answer stream to its first text delta", AGENT_LABELS
+)
+STREAM_DURATION = metrics.histogram(
+    "agent_stream_duration_seconds", "Streamed answer from start to end, tool rounds included", AGENT_LABELS
+)
+PROMPT_TOKENS = metrics.counter("agent_prompt_tokens_total", "Prompt tokens reported by the provider", AGENT_LABELS)
+COMPLETION_TOKENS = metrics.counter(
+    "agent_completion_tokens_total", "Completion tokens reported by the provider", AGENT_LABELS
+)
+TOOL_CALLS = metrics.counter("agent_tool_calls_total", "Tool calls requested by the model", AGENT_LABELS + ("tool",))
+RESPONSE_CACHE_LOOKUPS = metrics.counter(
+    "agent_response_cache_lookups_total", "Semantic response cache lookups", AGENT_LABELS + ("result",)
+)
+
+
+def record_usage(usage, agent_id: int, model: str) -> None:
+    """Token counters from the usage of a completion, or of the last chunk of a stream with include_usage"""
+    if usage is None:
+        return
+    PROMPT_TOKENS.inc(agent_id, model, amount=usage.prompt_tokens or 0)
+    COMPLETION_TOKENS.inc(agent_id, model, amount=usage.completion_tokens or 0)
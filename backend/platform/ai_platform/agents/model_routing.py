@@ -0,0 +1,152 @@
+import re
+from collections import deque
+from typing import Dict, List, Optional
+
+from ai_platform.agents.metrics import metrics
+from ai_platform.agents.tokens import count_tokens
+from ai_platform.settings import MODEL_ROUTING_ENABLED, MODEL_ROUTING_MAX_QUERY_TOKENS, \
+    MODEL_ROUTING_MAX_RETRIEVAL_DISTANCE, MODEL_ROUTING_FAST_WITH_TOOLS
+from ai_platform.supafast.models.ai_agent import AiAgent
+
+FAST, STRONG = "fast", "strong"
+
+# Questions asking for an explanation, a comparison or a derivation rather than a fact
+REASONING_CUES = re.compile(
+    r"\b(why|explain|how (does|do|is|can|would)|compare|difference|derive|prove|analy[sz]e|design|debug|"
+    r"optimi[sz]e|intuition|trade-?offs?|step by step)\b",
+    re.IGNORECASE
+)
+# Questions about course material the model fetches with the get_course_content tool
+COURSE_CONTENT_CUES = re.compile(
+    r"\b(week\s*\d+|lectures?|assignments?|modules?|quiz(zes)?|graded|syllabus|deadlines?|due)\b", re.IGNORECASE
+)
+
+MODEL_ROUTES = metrics.counter(
+    "agent_model_routes_total", "Answers routed to the fast or the strong model of an agent",
+    ("agent_id", "tier", "reason")
+)
+
+
+class RoutingSignals:
+    """
+    Cheap signals about a request gathered while its context is assembled, no LLM call is spent on them.
+    `knowledge_base` is the parser or embedding router output, `route_score` the embedding router's similarity
+    (None when the parser agent decided) and `retrieval_distance` the cosine distance of the best chunk found.
+    """
+
+    def __init__(self):
+        self.knowledge_base: Optional[str] = None
+        self.route_score: Optional[float] = None
+        self.retrieval_distance: Optional[float] = None
+
+    def as_dict(self) -> Dict:
+        return {"knowledge_base": self.knowledge_base, "route_score": self.route_score,
+                "retrieval_distance": self.retrieval_distance}
+
+
+class RoutingDecision:
+    def __init__(self, agent_id: int, model: str, tier: str, reason: str, signals: Dict):
+        self.agent_id = agent_id
+        self.model = model
+        self.tier = tier
+        self.reason = reason
+        self.signals = signals
+
+
+class RoutingPolicy:
+    """Thresholds of an agent, the keys of `AiAgent.routing_policy` override the defaults from the settings"""
+    KEYS = ("max_query_tokens", "max_retrieval_distance", "fast_with_tools")
+
+    def __init__(self, max_query_tokens: int = MODEL_ROUTING_MAX_QUERY_TOKENS,
+                 max_retrieval_distance: float = MODEL_ROUTING_MAX_RETRIEVAL_DISTANCE,
+                 fast_with_tools: bool = MODEL_ROUTING_FAST_WITH_TOOLS):
+        self.max_query_tokens = max_query_tokens
+        self.max_retrieval_distance = max_retrieval_distance
+        self.fast_with_tools = fast_with_tools
+
+    @classmethod
+    def for_agent(cls, agent: AiAgent) -> "RoutingPolicy":
+        overrides = agent.routing_policy or {}
+        return cls(**{key: value for key, value in overrides.items() if key in cls.KEYS})
+
+
+class ModelRouter:
+    """
+    Picks the fast or the strong model of an agent for one answer.
+
+    Only agents with a `fast_model_name` are routed, `model_name` stays their strong model. The strong model
+    answers questions asking for reasoning, long questions and knowledge base answers whose best chunk is far
+    from the query. Every other question goes to the fast model, questions needing the course content tool
+    only when the policy allows it.
+    Decisions and their outcomes (time to first token, duration, completion tokens, tool rounds) are kept per
+    (agent, tier, reason) so the thresholds can be tuned from the latency they buy.
+    """
+
+    def __init__(self, enabled: bool = MODEL_ROUTING_ENABLED, window: int = 200):
+        self.enabled = enabled
+        self._outcomes: Dict[tuple, deque] = {}
+        self.window = window
+        self.recent: deque = deque(maxlen=20)
+
+    def choose(self, agent: AiAgent, query: str, history: List[Dict] = None,
+               signals: RoutingSignals = None) -> Optional[RoutingDecision]:
+        """The decision for this answer, None when the agent is not routed and answers with `model_name`"""
+        if not self.enabled or not agent.fast_model_name:
+            return None
+        policy = RoutingPolicy.for_agent(agent)
+        signals = signals or RoutingSignals()
+        query_tokens = count_tokens(query)
+        grounded = signals.knowledge_base not in (None, "general") and signals.retrieval_distance is not None
+
+        if REASONING_CUES.search(query):
+            tier, reason = STRONG, "reasoning"
+        elif query_tokens > policy.max_query_tokens:
+            tier, reason = STRONG, "long_query"
+        elif grounded and signals.retrieval_distance > policy.max_retrieval_distance:
+            tier, reason = STRONG, "weak_retrieval"
+        elif not grounded and COURSE_CONTENT_CUES.search(query):
+            # The answer depends on a get_course_content round, kept apart in the stats to compare both tiers
+            tier, reason = FAST if policy.fast_with_tools else STRONG, "tool_use"
+        else:
+            tier, reason = FAST, "grounded" if grounded else "simple"
+
+        model = agent.fast_model_name if tier == FAST else agent.model_name
+        decision = RoutingDecision(agent.id, model, tier, reason, {
+            **signals.as_dict(), "query_tokens": query_tokens, "history_messages": len(history or [])
+        })
+        MODEL_ROUTES.inc(agent.id, tier, reason)
+        print(f"INFO: Agent {agent.id} answers with {model} ({tier}, {reason}), signals: {decision.signals}")
+        return decision
+
+    def record_outcome(self, decision: Optional[RoutingDecision], ttft: Optional[float], duration: float,
+                       completion_tokens: int, tool_rounds: int, cancelled: bool = False) -> None:
+        if decision is None:
+            return
+        outcome = {"ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+                   "duration_ms": round(duration * 1000, 1), "completion_tokens": completion_tokens,
+                   "tool_rounds": tool_rounds, "cancelled": cancelled}
+        key = (decision.agent_id, decision.tier, decision.reason)
+        self._outcomes.setdefault(key, deque(maxlen=self.window)).append(outcome)
+        self.recent.append({"agent_id": decision.agent_id, "model": decision.model, "tier": decision.tier,
+                            "reason": decision.reason, **decision.signals, **outcome})
+        print(f"INFO: Routed answer of agent {decision.agent_id} ({decision.tier}, {decision.reason}): {outcome}")
+
+    def get_stats(self) -> Dict:
+        routes = []
+        for (agent_id, tier, reason), outcomes in sorted(self._outcomes.items()):
+            ttfts = sorted(o["ttft_ms"] for o in outcomes if o["ttft_ms"] is not None)
+            durations = sorted(o["duration_ms"] for o in outcomes)
+            routes.append({
+                "agent_id": agent_id,
+                "tier": tier,
+                "reason": reason,
+                "answers": len(outcomes),
+                "avg_ttft_ms": round(sum(ttfts) / len(ttfts), 1) if ttfts else None,
+                "p95_ttft_ms": ttfts[min(int(len(ttfts) * 0.95), len(ttfts) - 1)] if ttfts else None,
+                "avg_duration_ms": round(sum(durations) / len(durations), 1),
+                "p95_duration_ms": durations[min(int(len(durations) * 0.95), len(durations) - 1)],
+                "avg_completion_tokens": round(sum(o["completion_tokens"] for o in outcomes) / len(outcomes), 1),
+                "tool_round_rate": sum(1 for o in outcomes if o["tool_rounds"]) / len(outcomes),
+                "cancel_rate": sum(1 for o in outcomes if o["cancelled"]) / len(outcomes),
+            })
+        return {"enabled": self.enabled, "routes": routes, "recent": list(self.recent)}
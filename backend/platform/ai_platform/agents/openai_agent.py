@@ -3,11 +3,10 @@ import os
 from typing import List, Dict, AsyncGenerator
 
 from langchain_core.messages import SystemMessage
-from openai import OpenAI
 from ai_platform.agents.prompts import INST_HOST_AGENT, INST_PARSER_AGENT
 from ai_platform.agents.streaming_services import OpenAIStreaming
 from ai_platform.agents.tools_implemented import get_course_content
-from ai_platform.supafast.database import get_db
+from ai_platform.supafast.database import read_only_session
 from ai_platform.agents.tools import course_content_tool
 from langchain_openai import ChatOpenAI
 
@@ -15,7 +14,6 @@ from langchain_openai import ChatOpenAI
 class Agents(OpenAIStreaming):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
         self.system_prompt = SystemMessage(content=INST_HOST_AGENT)
 
     async def stream_response(
@@ -43,7 +41,7 @@ class Agents(OpenAIStreaming):
             user_input += f" (Course ID: {course_id})"
         messages.append({"role": "user", "content": user_input})
         # Step 1: Synchronous call to handle tool calling
-        completion = self.openai_client.chat.completions.create(
+        completion = self.llm.chat_sync(
             messages=messages,
             model="gpt-4o-mini",
             tools=[course_content_tool]  # Use the same tool as call_openai_sync
@@ -62,7 +60,8 @@ class Agents(OpenAIStreaming):
                 if tool_call.function.name == "get_course_content":
                     args = json.loads(tool_call.function.arguments)
                     print(f"Tool call detected: get_course_content with args {args}")
-                    content = get_course_content(next(get_db()), **args)
+                    with read_only_session() as db:
+                        content = get_course_content(db, **args)
                     print(f"Response from get_course_content: {content}")
                     messages.append({
                         "role": "tool",
@@ -70,20 +69,18 @@ class Agents(OpenAIStreaming):
                         "tool_call_id": tool_call.id
                     })
                     # Step 3: Stream the final response
-                    stream = self.openai_client.chat.completions.create(
+                    stream = self.llm.stream_chat_sync(
                         messages=messages,
-                        model="gpt-4o-mini",
-                        stream=True
+                        model="gpt-4o-mini"
                     )
                     for chunk in stream:
                         if chunk.choices[0].delta.content:
                             yield json.dumps({"type": "text", "content": chunk.choices[0].delta.content})
         else:
             # No tool calls, stream the response directly
-            stream = self.openai_client.chat.completions.create(
+            stream = self.llm.stream_chat_sync(
                 messages=messages,
-                model="gpt-4o-mini",
-                stream=True
+                model="gpt-4o-mini"
             )
             for chunk in stream:
                 if chunk.choices[0].delta.content:
@@ -95,7 +92,7 @@ class Agents(OpenAIStreaming):
         # Prepend system prompt to messages
 
         # Initial call to OpenAI with tools
-        completion = self.openai_client.chat.completions.create(
+        completion = self.llm.chat_sync(
             messages=messages,
             model="gpt-4o-mini",
             tools=tools if tools else None
@@ -120,10 +117,11 @@ class Agents(OpenAIStreaming):
             if tool_call.function.name == "get_course_content":
                 args = json.loads(tool_call.function.arguments)
                 print(f"Below are the args to pass the function get course content: {args}")
-                content = get_course_content(
-                    db=next(get_db()),
-                    **args
-                )
+                with read_only_session() as db:
+                    content = get_course_content(
+                        db=db,
+                        **args
+                    )
                 print(f"Content received from get coure_content: {content}")
                 # Append the tool response
                 messages.append({
@@ -133,7 +131,7 @@ class Agents(OpenAIStreaming):
                 })
 
         # Second call to OpenAI with the updated message history
-        final_completion = self.openai_client.chat.completions.create(
+        final_completion = self.llm.chat_sync(
             messages=messages,
             model="gpt-4o-mini"
         )
@@ -165,7 +163,7 @@ class Agents(OpenAIStreaming):
             messages.extend(history)
         messages.append({"role": "user", "content": user_query})
 
-        completion = self.openai_client.chat.completions.create(
+        completion = self.llm.chat_sync(
             messages=messages,
             model="gpt-4o-mini",
             response_format={"type": "json_object"}
@@ -0,0 +1,69 @@
+import asyncio
+import codecs
+from typing import Iterator, Optional
+
+from ai_platform.agents.tokens import get_encoding
+
+FRAME_SECONDS = 0.05  # a paced stream sends about this much time worth of tokens per frame
+
+
+class Pacer:
+    """Per-stream clock of a PacingPolicy, waits until the tokens sent so far are due"""
+
+    def __init__(self, tokens_per_sec: float):
+        self.tokens_per_sec = tokens_per_sec
+        self.sent = 0
+        self.start = None
+
+    async def wait(self, tokens: int = 1) -> None:
+        loop = asyncio.get_running_loop()
+        if self.start is None:
+            self.start = loop.time()
+        # Sleep against the schedule rather than a fixed delay so slow upstream chunks don't add up
+        delay = self.start + self.sent / self.tokens_per_sec - loop.time()
+        self.sent += tokens
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class PacingPolicy:
+    """
+    How fast an endpoint streams to the client. `tokens_per_sec=None` (or 0) sends everything as soon as
+    it is available, otherwise tokens are released at that rate in frames of ~FRAME_SECONDS.
+    """
+
+    def __init__(self, tokens_per_sec: Optional[float] = None, frame_tokens: int = 64):
+        self.tokens_per_sec = tokens_per_sec or None
+        self.frame_tokens = max(1, round(self.tokens_per_sec * FRAME_SECONDS)) if self.tokens_per_sec \
+            else frame_tokens
+
+    @property
+    def enabled(self) -> bool:
+        return self.tokens_per_sec is not None
+
+    def pacer(self) -> Optional[Pacer]:
+        return Pacer(self.tokens_per_sec) if self.enabled else None
+
+    def frames(self, text: str) -> Iterator[str]:
+        """
+        Split a string into frames of `frame_tokens` tokens. The string is encoded once and each frame is
+        decoded as a batch, an incremental decoder keeps multi-byte characters split across frames intact.
+        """
+        encoding = get_encoding()
+        if encoding is None:
+            step = self.frame_tokens * 4  # ~4 characters per token
+            for start in range(0, len(text), step):
+                yield text[start:start + step]
+            return
+        tokens = encoding.encode(text, disallowed_special=())
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        for start in range(0, len(tokens), self.frame_tokens):
+            frame = decoder.decode(encoding.decode_bytes(tokens[start:start + self.frame_tokens]))
+            if frame:
+                yield frame
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+NO_PACING = PacingPolicy()
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from ai_platform.agents.vector_math import normalize, dot
+from ai_platform.settings import ROUTER_MIN_SCORE, ROUTER_MIN_MARGIN, ROUTER_REFRESH_SEC
+from ai_platform.supafast.database import read_only_session
+from ai_platform.supafast.models.ai_agent import AiAgent
+from ai_platform.supafast.models.courses import Course
+
+GENERAL_ROUTE = {"vector_index": "general", "agent": "general_agent"}
+GENERAL_DESCRIPTION = ("General questions about the IITM BS degree program: admissions, fees, terms, "
+                       "course registration, eligibility, exams and grading policies.")
+
+
+def course_vector_index(title: str) -> str:
+    """Same naming rule the parser agent follows: kb_ + first letter of every word of the course title"""
+    initials = "".join(word[0] for word in title.replace("-", " ").split() if word[0].isalnum())
+    return f"kb_{initials.lower()}"
+
+
+class EmbeddingRouter:
+    """
+    Picks the knowledge base (vector_index) for a query without calling the parser agent.
+
+    Every collection gets a description (course title and description, or the description of the agent
+    bound to it) which is embedded once and cached. A query is embedded together with the request context
+    and routed directly when the best candidate is similar enough and clearly ahead of the best one of another
+    collection (a course description and the description of its agent describe the same collection).
+    Otherwise `route` returns None and the caller falls back to the parser agent.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+                 min_score: float = ROUTER_MIN_SCORE, min_margin: float = ROUTER_MIN_MARGIN,
+                 refresh_sec: float = ROUTER_REFRESH_SEC):
+        self.embed_fn = embed_fn
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.refresh_sec = refresh_sec
+        self._candidates: List[Dict] = []
+        self._loaded_at: Optional[float] = None
+        self._load_lock = asyncio.Lock()
+        self.stats = {"decisions": 0, "fallbacks": 0, "errors": 0, "latency_sec_total": 0.0}
+
+    @staticmethod
+    def _load_descriptions() -> List[Dict]:
+        candidates = [{**GENERAL_ROUTE, "description": GENERAL_DESCRIPTION}]
+        with read_only_session() as db:
+            try:
+                existing = {row[0] for row in db.execute(text("SELECT name FROM langchain_pg_collection"))}
+            except Exception:
+                db.rollback()
+                existing = None
+            for course in db.query(Course).all():
+                candidates.append({
+                    "vector_index": course_vector_index(course.title),
+                    "agent": "course_agent",
+                    "description": f"{course.title}: {course.description}"
+                })
+            for agent in db.query(AiAgent).filter(AiAgent.vector_index.isnot(None)).all():
+                if agent.vector_index and agent.description:
+                    candidates.append({
+                        "vector_index": agent.vector_index,
+                        "agent": "course_agent",
+                        "description": agent.description
+                    })
+        if existing is not None:
+            candidates = [c for c in candidates if c["vector_index"] == "general" or c["vector_index"] in existing]
+        return candidates
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        return [normalize(vector) for vector in await self.embed_fn(texts)]
+
+    async def _ensure_candidates(self) -> None:
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_sec:
+            return
+        async with self._load_lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_sec:
+                return
+            candidates = await asyncio.to_thread(self._load_descriptions)
+            embeddings = await self._embed([c["description"] for c in candidates])
+            for candidate, embedding in zip(candidates, embeddings):
+                candidate["embedding"] = embedding
+            self._candidates, self._loaded_at = candidates, time.monotonic()
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def has_collection(self, vector_index: str) -> bool:
+        """Whether the collection is one of the known routing candidates (i.e. it exists)"""
+        return any(c["vector_index"] == vector_index for c in self._candidates)
+
+    async def route(self, user_query: str, context: str = None) -> Optional[Dict]:
+        """Return the parser-agent style route, or None when the query is ambiguous"""
+        started = time.perf_counter()
+        try:
+            await self._ensure_candidates()
+            texts = [user_query] + ([context[:2000]] if context else [])
+            vectors = await self._embed(texts)
+            # Best candidate per collection, the margin is measured against the closest other collection
+            best_by_index: Dict[str, tuple] = {}
+            for candidate in self._candidates:
+                score = max(dot(v, candidate["embedding"]) for v in vectors)
+                best = best_by_index.get(candidate["vector_index"])
+                if best is None or score > best[0]:
+                    best_by_index[candidate["vector_index"]] = (score, candidate)
+            scored = sorted(best_by_index.values(), key=lambda item: item[0], reverse=True)
+        except Exception as e:
+            print(f"Router failed, falling back to parser agent: {e}")
+            self.stats["errors"] += 1
+            scored = []
+
+        route = None
+        if scored:
+            best_score, best = scored[0]
+            runner_up = scored[1][0] if len(scored) > 1 else 0.0
+            if best_score >= self.min_score and best_score - runner_up >= self.min_margin:
+                route = {"vector_index": best["vector_index"], "agent": best["agent"], "score": round(best_score, 4)}
+
+        elapsed = time.perf_counter() - started
+        self.stats["decisions"] += 1
+        self.stats["latency_sec_total"] += elapsed
+        if route is None:
+            self.stats["fallbacks"] += 1
+        print(f"Router decision in {elapsed * 1000:.1f} ms: {route or 'fallback to parser agent'}")
+        return route
+
+    def get_stats(self) -> Dict:
+        decisions = self.stats["decisions"]
+        return {
+            **self.stats,
+            "fallback_rate": self.stats["fallbacks"] / decisions if decisions else 0.0,
+            "avg_latency_ms": self.stats["latency_sec_total"] * 1000 / decisions if decisions else 0.0,
+            "candidates": len(self._candidates),
+        }
@@ -0,0 +1,9 @@
+"""
+Process wide instances of the agent runtime.
+
+The agents API streams answers through them and the monitoring API reads their counters, both import them from
+here rather than from each other.
+"""
+from ai_platform.agents.framework_agentic import Agents
+
+agents = Agents()
@@ -0,0 +1,176 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from ai_platform.settings import RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SEC, RESPONSE_CACHE_THRESHOLD
+
+
+def _unit_vector(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class CacheKey(NamedTuple):
+    """A looked up query, `version` is the knowledge base version the lookup saw, its answer is stored under it"""
+    embedding: List[float]
+    version: Tuple[int, int]
+
+
+class _Bucket:
+    """The entries of one cache key, their embeddings are the rows of one matrix so a lookup is a single matmul"""
+    __slots__ = ("ids", "matrix", "created_at", "responses")
+
+    def __init__(self, dimensions: int):
+        self.ids: List[int] = []
+        self.matrix = np.empty((0, dimensions), dtype=np.float32)
+        self.created_at = np.empty(0, dtype=np.float64)
+        self.responses: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, entry_id: int, vector: np.ndarray, response: str, now: float) -> None:
+        self.ids.append(entry_id)
+        self.matrix = np.vstack([self.matrix, vector])
+        self.created_at = np.append(self.created_at, now)
+        self.responses[entry_id] = response
+
+    def keep(self, mask: np.ndarray) -> List[int]:
+        """Keep the rows where `mask` is set, returns the ids of the dropped entries"""
+        dropped = [entry_id for entry_id, kept in zip(self.ids, mask) if not kept]
+        for entry_id in dropped:
+            del self.responses[entry_id]
+        self.ids = [entry_id for entry_id, kept in zip(self.ids, mask) if kept]
+        self.matrix = self.matrix[mask]
+        self.created_at = self.created_at[mask]
+        return dropped
+
+
+class SemanticCache:
+    """
+    In-process cache of agent answers keyed by (agent_id, course_id, context, knowledge base version, query embedding).
+
+    A lookup returns a stored answer when a query of the same agent, course and caller supplied context is at
+    least `threshold` cosine-similar to a cached one. Entries expire after `ttl` seconds and the least recently
+    used ones are evicted above `max_entries`. The knowledge base version is bumped by the weekwise content and
+    course writes (per course) and by knowledge base ingestion (all collections), which drops every stale answer.
+    The embeddings of a key are kept as one float32 matrix and scored with one matrix product, a lookup over a
+    full bucket takes well under a millisecond on the event loop.
+    An answer is stored with the version read before its content was retrieved, when the course or a collection
+    changed while it was generated it is dropped instead of being cached under the new version.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL_SEC,
+                 threshold: float = RESPONSE_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lru: OrderedDict[int, Tuple] = OrderedDict()  # entry id -> bucket key, in LRU order
+        self._buckets: Dict[Tuple, _Bucket] = {}
+        self._course_versions: Dict[Optional[int], int] = {}
+        self._collection_version = 0
+        self._ids = count()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "stale_stores": 0, "evictions": 0, "invalidations": 0}
+
+    def version(self, course_id: Optional[int]) -> Tuple[int, int]:
+        """The (course, collection) version of the knowledge base, read it before retrieving content to answer from"""
+        return self._course_versions.get(course_id, 0), self._collection_version
+
+    def _bucket_key(self, agent_id: int, course_id: Optional[int], context: Optional[str]) -> Tuple:
+        context_hash = hashlib.sha1(context.encode("utf-8")).hexdigest() if context else None
+        return (agent_id, course_id, context_hash) + self.version(course_id)
+
+    def _drop_bucket(self, bucket_key: Tuple) -> None:
+        for entry_id in self._buckets.pop(bucket_key).ids:
+            self._lru.pop(entry_id, None)
+
+    def _remove(self, entry_id: int) -> None:
+        bucket_key = self._lru.pop(entry_id, None)
+        bucket = self._buckets.get(bucket_key)
+        if bucket is not None:
+            bucket.keep(np.array([other != entry_id for other in bucket.ids], dtype=bool))
+            if not bucket:
+                del self._buckets[bucket_key]
+
+    def lookup(self, agent_id: int, course_id: Optional[int], embedding: List[float],
+               context: Optional[str] = None) -> Optional[str]:
+        query = _unit_vector(embedding)
+        now = time.monotonic()
+        with self._lock:
+            bucket_key = self._bucket_key(agent_id, course_id, context)
+            bucket = self._buckets.get(bucket_key)
+            if bucket is not None:
+                fresh = now - bucket.created_at <= self.ttl
+                if not fresh.all():
+                    for entry_id in bucket.keep(fresh):
+                        self._lru.pop(entry_id, None)
+                if not bucket:
+                    del self._buckets[bucket_key]
+                    bucket = None
+            if bucket is None or bucket.matrix.shape[1] != query.shape[0]:
+                self.stats["misses"] += 1
+                return None
+            scores = bucket.matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.stats["misses"] += 1
+                return None
+            best_id = bucket.ids[best]
+            self._lru.move_to_end(best_id)
+            self.stats["hits"] += 1
+            return bucket.responses[best_id]
+
+    def store(self, agent_id: int, course_id: Optional[int], embedding: List[float], response: str,
+              context: Optional[str] = None, version: Optional[Tuple[int, int]] = None) -> bool:
+        """Cache `response`, returns False when `version` is given and the knowledge base changed since"""
+        vector = _unit_vector(embedding)
+        with self._lock:
+            if version is not None and version != self.version(course_id):
+                self.stats["stale_stores"] += 1
+                return False
+            bucket_key = self._bucket_key(agent_id, course_id, context)
+            bucket = self._buckets.get(bucket_key)
+            if bucket is None or bucket.matrix.shape[1] != vector.shape[0]:
+                if bucket is not None:
+                    # The embedding model changed, the old vectors can't be compared with the new ones
+                    self._drop_bucket(bucket_key)
+                bucket = self._buckets[bucket_key] = _Bucket(vector.shape[0])
+            entry_id = next(self._ids)
+            bucket.add(entry_id, vector, response, time.monotonic())
+            self._lru[entry_id] = bucket_key
+            self.stats["stores"] += 1
+            while len(self._lru) > self.max_entries:
+                self._remove(next(iter(self._lru)))
+                self.stats["evictions"] += 1
+            return True
+
+    def invalidate_course(self, course_id: int) -> None:
+        """Weekwise content or course details changed, drop the answers given in that course"""
+        with self._lock:
+            self._course_versions[course_id] = self._course_versions.get(course_id, 0) + 1
+            for bucket_key in [key for key in self._buckets if key[1] == course_id]:
+                self._drop_bucket(bucket_key)
+            self.stats["invalidations"] += 1
+
+    def invalidate_collection(self, collection_name: str) -> None:
+        """A knowledge base collection changed, answers of any course may have used it"""
+        print(f"INFO: Response cache cleared, collection {collection_name} changed")
+        with self._lock:
+            self._collection_version += 1
+            self._lru.clear()
+            self._buckets.clear()
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "entries": len(self._lru), "hit_rate": self.stats["hits"] / lookups if lookups else 0.0}
+
+
+response_cache = SemanticCache()
@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import re
+from typing import AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple
+
+from ai_platform.agents.stream_events import StreamEvent
+
+
+class FlightAborted(Exception):
+    """The leader gave up before its answer started, followers have to answer on their own"""
+
+
+class Flight:
+    """
+    One upstream answer shared by every request asking the same question while it is generated.
+
+    The leader hands the upstream event stream to `start`, it is consumed by a task of its own so a leader
+    whose client goes away does not end the answer of its followers. Every event is buffered, a subscriber
+    first gets the buffered prefix and then the live events in the same order.
+    Every request holding the flight is a member, once the last one leaves the upstream stream is cancelled.
+    """
+
+    def __init__(self, key: Tuple):
+        self.key = key
+        self.events: List[StreamEvent] = []
+        self.started = False
+        self.done = False
+        self.aborted = False
+        self.cancelled = False
+        self.followers = 0
+        self.members = 1  # the leader
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._on_done = None
+
+    def _notify(self) -> None:
+        # Waiters hold the previous event, a fresh one is armed for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def start(self, source: AsyncIterator[StreamEvent], on_done=None) -> None:
+        self.started = True
+        self._on_done = on_done
+        self._task = asyncio.create_task(self._pump(source))
+
+    def leave(self) -> None:
+        """A member stopped reading (or never subscribed), nobody left means nobody waits for the answer"""
+        self.members -= 1
+        if self.members <= 0 and self._task is not None and not self.done and not self.cancelled:
+            self.cancelled = True
+            self._task.cancel()
+            if self._on_done:
+                self._on_done(self)
+
+    def abort(self) -> None:
+        """Called by a leader that returns before starting the upstream stream"""
+        if not self.started and not self.done:
+            self.aborted = self.done = True
+            self._notify()
+
+    async def _pump(self, source: AsyncIterator[StreamEvent]) -> None:
+        try:
+            async for event in source:
+                self.events.append(event)
+                self._notify()
+        except Exception as e:
+            print(f"Shared answer failed: {e}")
+            self.events.append(StreamEvent.error(f"Error generating response: {e}"))
+        finally:
+            self.done = True
+            self._notify()
+            if self._on_done:
+                self._on_done(self)
+
+    async def subscribe(self) -> AsyncGenerator[StreamEvent, None]:
+        """Buffered prefix first, then the live events until the upstream stream ends"""
+        index = 0
+        try:
+            while True:
+                while index < len(self.events):
+                    yield self.events[index]
+                    index += 1
+                if self.done:
+                    if self.aborted:
+                        raise FlightAborted()
+                    return
+                changed = self._changed
+                await changed.wait()
+        finally:
+            self.leave()
+
+
+class SingleFlight:
+    """
+    In-flight deduplication of agent answers, keyed by (agent_id, course_id, context hash, normalized query).
+
+    Only fresh questions are shared, like the response cache a follow up depends on the earlier answers of
+    its own conversation. A flight is dropped from the registry once its answer is complete, later requests
+    are served by the response cache the leader's answer was stored in.
+    All methods run on the event loop, the registry needs no lock.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights: Dict[Tuple, Flight] = {}
+        self.stats = {"leaders": 0, "followers": 0, "aborted": 0, "cancelled": 0}
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return re.sub(r"\s+", " ", query).strip().rstrip("?!. ").lower()
+
+    def key(self, agent_id: int, query: str, course_id: int = None, context: str = None,
+            history: List[Dict] = None) -> Optional[Tuple]:
+        """Flight key of a request, None when its answer must not be shared"""
+        if not self.enabled or not query or any(msg.get("role") == "assistant" for msg in history or []):
+            return None
+        context_hash = hashlib.sha1(context.encode("utf-8")).hexdigest() if context else None
+        return agent_id, course_id, context_hash, self.normalize_query(query)
+
+    def acquire(self, key: Tuple) -> Tuple[Flight, bool]:
+        """
+        The flight of `key` and whether the caller leads it, a leader must `start` or `abort` it.
+        The caller is a member of the flight until its `subscribe` ends, or until it calls `leave`.
+        """
+        flight = self._flights.get(key)
+        if flight is not None and not flight.done and not flight.cancelled:
+            flight.members += 1
+            flight.followers += 1
+            self.stats["followers"] += 1
+            return flight, False
+        flight = Flight(key)
+        self._flights[key] = flight
+        self.stats["leaders"] += 1
+        return flight, True
+
+    def start(self, flight: Flight, source: AsyncIterator[StreamEvent]) -> None:
+        flight.start(source, on_done=self._release)
+
+    def abort(self, flight: Flight) -> None:
+        if not flight.started and not flight.done:
+            flight.abort()
+            self.stats["aborted"] += 1
+            self._release(flight)
+
+    def _release(self, flight: Flight) -> None:
+        if self._flights.get(flight.key) is not flight:
+            return
+        del self._flights[flight.key]
+        if flight.cancelled:
+            self.stats["cancelled"] += 1
+            print(f"INFO: Shared answer of {flight.key[0]}/{flight.key[1]} cancelled, every client disconnected")
+        elif flight.followers:
+            print(f"INFO: Shared answer of {flight.key[0]}/{flight.key[1]} streamed to {flight.followers} followers")
+
+    def get_stats(self) -> Dict:
+        requests = self.stats["leaders"] + self.stats["followers"]
+        return {
+            **self.stats,
+            "in_flight": len(self._flights),
+            "dedup_rate": self.stats["followers"] / requests if requests else 0.0
+        }
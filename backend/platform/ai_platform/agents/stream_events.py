@@ -0,0 +1,131 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import anyio
+
+from ai_platform.settings import SSE_FLUSH_INTERVAL_MS, SSE_FLUSH_BYTES
+
+
+class StreamEvent:
+    """
+    An event of an agent stream ("text", "end", "error", "metadata" or "result").
+    Agents yield these objects and only the SSE layer serializes them, exactly once, with `serialize()`.
+    """
+    __slots__ = ("type", "content", "fields", "_serialized")
+
+    def __init__(self, type: str, content: Any = None, **fields):
+        self.type = type
+        self.content = content
+        self.fields = fields
+        self._serialized = None
+
+    @classmethod
+    def text(cls, content: str) -> "StreamEvent":
+        return cls("text", content)
+
+    @classmethod
+    def end(cls) -> "StreamEvent":
+        return cls("end")
+
+    @classmethod
+    def error(cls, content: str) -> "StreamEvent":
+        return cls("error", content)
+
+    def to_dict(self) -> Dict:
+        data = {"type": self.type}
+        if self.content is not None:
+            data["content"] = self.content
+        data.update(self.fields)
+        return data
+
+    def serialize(self) -> str:
+        if self._serialized is None:
+            self._serialized = json.dumps(self.to_dict(), separators=(",", ":"), default=str)
+        return self._serialized
+
+    def __repr__(self):
+        return f"StreamEvent({self.to_dict()!r})"
+
+
+class FrameCoalescer:
+    """
+    Groups consecutive text events into frames so a stream sends a few SSE events instead of one per token.
+
+    Flush rules:
+    - the first text of a stream is sent right away, it is what the user waits for
+    - a frame is sent once it holds `max_bytes` of text, or `interval_ms` after its first delta,
+      even when the model pauses (e.g. during a tool call)
+    - any other event flushes the pending frame first, so event order is kept
+    """
+
+    def __init__(self, interval_ms: float = SSE_FLUSH_INTERVAL_MS, max_bytes: int = SSE_FLUSH_BYTES):
+        self.interval = interval_ms / 1000
+        self.max_bytes = max_bytes
+        self.stats = {"events_in": 0, "frames_out": 0}
+
+    async def coalesce(self, events: AsyncIterator[StreamEvent]) -> AsyncIterator[StreamEvent]:
+        loop = asyncio.get_running_loop()
+        iterator = events.__aiter__()
+        buffer: List[str] = []
+        buffered_bytes = 0
+        deadline: Optional[float] = None
+        first_text_sent = False
+        pending = None
+
+        def flush() -> StreamEvent:
+            nonlocal buffer, buffered_bytes, deadline
+            frame = StreamEvent.text("".join(buffer))
+            buffer, buffered_bytes, deadline = [], 0, None
+            self.stats["frames_out"] += 1
+            return frame
+
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                if buffer:
+                    done, _ = await asyncio.wait({pending}, timeout=max(deadline - loop.time(), 0))
+                    if not done:
+                        yield flush()
+                        continue
+                try:
+                    event = await pending
+                except StopAsyncIteration:
+                    pending = None
+                    break
+                pending = None
+                self.stats["events_in"] += 1
+
+                if event.type != "text":
+                    if buffer:
+                        yield flush()
+                    self.stats["frames_out"] += 1
+                    yield event
+                    continue
+                if not first_text_sent:
+                    first_text_sent = True
+                    self.stats["frames_out"] += 1
+                    yield event
+                    continue
+
+                buffer.append(event.content)
+                buffered_bytes += len(event.content.encode("utf-8"))
+                if deadline is None:
+                    deadline = loop.time() + self.interval
+                if buffered_bytes >= self.max_bytes:
+                    yield flush()
+            if buffer:
+                yield flush()
+        finally:
+            # The client went away or the stream failed, stop the upstream generator too. Shielded, the
+            # server keeps cancelling a disconnected response and the upstream must still be closed
+            with anyio.CancelScope(shield=True):
+                if pending is not None:
+                    pending.cancel()
+                    try:
+                        await pending
+                    except BaseException:
+                        pass
+                if hasattr(iterator, "aclose"):
+                    await iterator.aclose()
@@ -0,0 +1,38 @@
+from functools import lru_cache
+from typing import Dict, Optional
+
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = "cl100k_base") -> Optional[tiktoken.Encoding]:
+    """
+    Load a tiktoken encoding once per process, loading it costs far more than encoding a message.
+    Returns None when the encoding can't be loaded (it is downloaded on first use), callers then estimate.
+    """
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        print(f"WARNING: tiktoken encoding {name} unavailable, token counts are estimated: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text or "") // 4 + 1  # ~4 characters per token for English text
+    return len(encoding.encode(text or "", disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The longest prefix of `text` within `max_tokens` tokens"""
+    encoding = get_encoding()
+    if encoding is None:
+        return (text or "")[:max(max_tokens - 1, 0) * 4]
+    tokens = encoding.encode(text or "", disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def count_message_tokens(message: Dict) -> int:
+    # ~4 tokens of chat formatting overhead per message
+    return 4 + count_tokens(message.get("content") or "")
@@ -0,0 +1,64 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from ai_platform.settings import TOOL_CACHE_MAX_ENTRIES, TOOL_CACHE_TTL_SEC
+
+
+class ToolResultCache:
+    """
+    In-process LRU cache of tool results keyed by (tool name, normalized arguments).
+
+    Every key starts with the course id so the weekwise content and course writes can drop the results of
+    a single course. Entries also expire after `ttl` seconds as a safety net for writes made outside the API.
+    """
+
+    def __init__(self, max_entries: int = TOOL_CACHE_MAX_ENTRIES, ttl: float = TOOL_CACHE_TTL_SEC):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[Tuple, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            # Callers may add to the result, keep the cached copy untouched
+            return copy.deepcopy(entry[1])
+
+    def set(self, key: Tuple, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate_course(self, course_id: int) -> None:
+        """Weekwise content or course details changed, drop the tool results of that course"""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == course_id]:
+                del self._entries[key]
+            self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "entries": len(self._entries),
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0}
+
+
+tool_cache = ToolResultCache()
@@ -10,9 +10,10 @@ course_content_tool = {
                             "course_id": {"type": "integer", "description": "The ID of the course to fetch content for."},
                             "week_no": {"type": "integer", "description": "The week number to filter content by (optional)."},
                             "lecture_no": {"type": "integer", "description": "The lecture number within the week (optional)."},
-                            "is_transcript_required": {"type": "boolean", "description": "Whether to include the lecture transcript (default: false).", "default": False},
+                            "is_transcript_required": {"type": "boolean", "description": "Whether to include the lecture transcript segments relevant to the query, with timestamps (default: false).", "default": False},
                             "graded_assignment_id": {"type": "integer", "description": "The ID of a graded assignment to fetch (optional)."},
-                            "practice_assignment_id": {"type": "integer", "description": "The ID of a practice assignment to fetch (optional)."}
+                            "practice_assignment_id": {"type": "integer", "description": "The ID of a practice assignment to fetch (optional)."},
+                            "query": {"type": "string", "description": "The student's question, used to pick the relevant transcript segments (optional)."}
                         },
                         "required": ["course_id"]
                     }
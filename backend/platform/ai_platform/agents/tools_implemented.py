@@ -1,11 +1,37 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+from sqlalchemy import and_, func, select
 from sqlalchemy.orm import Session
 
+from ai_platform.agents.tool_cache import tool_cache
+from ai_platform.agents.transcript_index import LectureTranscript, transcript_index
+from ai_platform.settings import TOOL_CACHE_ENABLED
 from ai_platform.supafast.models.courses import Course
 from ai_platform.supafast.models.weekwise_content import WeekwiseContent, VideoLecture, GradedAssignment, \
     PracticeAssignment
 
 
+def _optional_int(value: Any) -> Optional[int]:
+    # The model sometimes sends numbers as strings, 0 means "not asked for" like before
+    return int(value) if value not in (None, "", 0, "0") else None
+
+
+def _cache_key(course_id, week_no, lecture_no, is_transcript_required, graded_assignment_id, practice_assignment_id,
+               query):
+    week_no, lecture_no = _optional_int(week_no), _optional_int(lecture_no)
+    transcript_required = bool(is_transcript_required) and bool(week_no and lecture_no)
+    return (
+        "get_course_content",
+        int(course_id),
+        week_no,
+        lecture_no if week_no else None,  # lectures are only looked up within a week
+        transcript_required,
+        _optional_int(graded_assignment_id),
+        _optional_int(practice_assignment_id),
+        # The query only picks transcript segments, ignore it otherwise so more calls share an entry
+        (" ".join(str(query).lower().split()) or None) if transcript_required and query else None,
+    )
+
+
 # Define the tool function (without @tool decorator since we’ll bind it manually)
 def get_course_content(
         db: Session,
@@ -14,91 +40,151 @@ def get_course_content(
         lecture_no: Optional[int] = None,
         is_transcript_required: bool = False,
         graded_assignment_id: Optional[int] = None,
-        practice_assignment_id: Optional[int] = None
+        practice_assignment_id: Optional[int] = None,
+        query: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Fetch course content details from the database based on provided filters.
     Returns a structured dictionary for the AI agent to use.
+    With `is_transcript_required` only the transcript segments relevant to `query` are returned.
+    Results are cached per normalized arguments until the course content changes, except transcripts ranked
+    lexically while their lecture isn't indexed yet.
     """
     print(f"Calling tool get_course_content with args: {course_id}, {week_no}, {lecture_no}")
-    result = {"course_id": course_id, "content": {}}
+    try:
+        key = _cache_key(course_id, week_no, lecture_no, is_transcript_required,
+                         graded_assignment_id, practice_assignment_id, query)
+    except (TypeError, ValueError):
+        return {"error": "Invalid arguments, course_id, week_no, lecture_no and assignment ids must be integers."}
 
-    # Fetch course details
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if not course:
-        return {"error": f"Course with ID {course_id} not found."}
-    result["content"]["course_title"] = course.title
-    result["content"]["description"] = course.description
+    if TOOL_CACHE_ENABLED:
+        cached = tool_cache.get(key)
+        if cached is not None:
+            return cached
 
-    # Fetch week-wise content if week_no is provided
-    if week_no:
-        week_content = (
-            db.query(WeekwiseContent)
-            .filter(WeekwiseContent.course_id == course_id, WeekwiseContent.week_no == week_no)
-            .first()
-        )
-        if week_content:
-            result["content"]["week"] = {
-                "week_no": week_content.week_no,
-                "title": week_content.title,
-                "term": week_content.term
-            }
+    result, cacheable = _query_course_content(db, *key[1:])
+    # Not found results are not cached, the course may be created later
+    if TOOL_CACHE_ENABLED and cacheable and "error" not in result:
+        tool_cache.set(key, result)
+    return result
 
-            # Fetch lectures if lecture_no is provided
-            if lecture_no:
-                lecture = (
-                    db.query(VideoLecture)
-                    .filter(
-                        VideoLecture.course_id == course_id,
-                        VideoLecture.week_no == week_no,
-                        VideoLecture.lecture_no == lecture_no
-                    )
-                    .first()
-                )
-                if lecture:
-                    lecture_data = {
-                        "title": lecture.title,
-                        "duration": lecture.duration,
-                        "video_link": lecture.video_link
-                    }
-                    if is_transcript_required:
-                        lecture_data["transcript"] = lecture.transcript
-                    result["content"]["lecture"] = lecture_data
-
-    # Fetch graded assignment if ID is provided
-    if graded_assignment_id:
-        graded_assignment = (
-            db.query(GradedAssignment)
-            .filter(GradedAssignment.assignment_no == graded_assignment_id, GradedAssignment.course_id == course_id)
-            .first()
-        )
-        if graded_assignment:
-            result["content"]["graded_assignment"] = {
-                "title": graded_assignment.title,
-                "description": graded_assignment.description,
-                "deadline": graded_assignment.deadline,
-                "assignment_content": graded_assignment.assignment_content
-            }
 
-    # Fetch practice assignment if ID is provided
+def _query_course_content(
+        db: Session,
+        course_id: int,
+        week_no: Optional[int],
+        lecture_no: Optional[int],
+        is_transcript_required: bool,
+        graded_assignment_id: Optional[int],
+        practice_assignment_id: Optional[int],
+        query: Optional[str]
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Fetch the course and every requested item in one round trip, each item is outer joined on its own
+    filters so a missing week or assignment leaves its columns empty instead of dropping the row.
+    The session is closed before the transcript search, which needs its own connection and a query embedding.
+    Returns the result and whether it can be cached.
+    """
+    joins = []  # (entity, on clause) in select order
+    if week_no:
+        joins.append((WeekwiseContent,
+                      and_(WeekwiseContent.course_id == Course.id, WeekwiseContent.week_no == week_no)))
+        if lecture_no:
+            joins.append((VideoLecture, and_(
+                VideoLecture.course_id == Course.id,
+                VideoLecture.week_no == week_no,
+                VideoLecture.lecture_no == lecture_no
+            )))
+    if graded_assignment_id:
+        joins.append((GradedAssignment, and_(
+            GradedAssignment.course_id == Course.id,
+            GradedAssignment.assignment_no == graded_assignment_id
+        )))
     if practice_assignment_id:
-        practice_assignment = (
-            db.query(PracticeAssignment)
-            .filter(PracticeAssignment.assignment_no == practice_assignment_id,
-                    PracticeAssignment.course_id == course_id)
-            .first()
+        joins.append((PracticeAssignment, and_(
+            PracticeAssignment.course_id == Course.id,
+            PracticeAssignment.assignment_no == practice_assignment_id
+        )))
+
+    columns = [Course] + [entity for entity, _ in joins]
+    names = [entity.__name__ for entity in columns]
+    # Total weeks in the course (if no specific week is requested)
+    count_weeks = not week_no and not lecture_no and not graded_assignment_id and not practice_assignment_id
+    if count_weeks:
+        columns.append(
+            select(func.count(WeekwiseContent.id))
+            .where(WeekwiseContent.course_id == Course.id)
+            .correlate(Course)
+            .scalar_subquery()
         )
-        if practice_assignment:
-            result["content"]["practice_assignment"] = {
-                "title": practice_assignment.title,
-                "description": practice_assignment.description,
-                "deadline": practice_assignment.deadline,
-                "assignment_content": practice_assignment.assignment_content
+        names.append("total_weeks")
+
+    db_query = db.query(*columns).select_from(Course)
+    for entity, on_clause in joins:
+        db_query = db_query.outerjoin(entity, on_clause)
+
+    row = db_query.filter(Course.id == course_id).first()
+    if not row:
+        return {"error": f"Course with ID {course_id} not found."}, False
+    row = dict(zip(names, row))
+
+    course = row["Course"]
+    result = {"course_id": course_id, "content": {}}
+    transcript_lecture = None
+    result["content"]["course_title"] = course.title
+    result["content"]["description"] = course.description
+
+    week_content = row.get("WeekwiseContent")
+    if week_content:
+        result["content"]["week"] = {
+            "week_no": week_content.week_no,
+            "title": week_content.title,
+            "term": week_content.term
+        }
+
+        lecture = row.get("VideoLecture")
+        if lecture:
+            lecture_data = {
+                "title": lecture.title,
+                "duration": lecture.duration,
+                "video_link": lecture.video_link
             }
+            if is_transcript_required:
+                transcript_lecture = LectureTranscript.of(lecture)
+            result["content"]["lecture"] = lecture_data
 
-    # Calculate total weeks in the course (if no specific week is requested)
-    if not week_no and not lecture_no and not graded_assignment_id and not practice_assignment_id:
-        total_weeks = db.query(WeekwiseContent).filter(WeekwiseContent.course_id == course_id).count()
-        result["content"]["total_weeks"] = total_weeks
+    graded_assignment = row.get("GradedAssignment")
+    if graded_assignment:
+        result["content"]["graded_assignment"] = {
+            "title": graded_assignment.title,
+            "description": graded_assignment.description,
+            "deadline": graded_assignment.deadline,
+            "assignment_content": graded_assignment.assignment_content
+        }
 
-    return result
+    practice_assignment = row.get("PracticeAssignment")
+    if practice_assignment:
+        result["content"]["practice_assignment"] = {
+            "title": practice_assignment.title,
+            "description": practice_assignment.description,
+            "deadline": practice_assignment.deadline,
+            "assignment_content": practice_assignment.assignment_content
+        }
+
+    if count_weeks:
+        result["content"]["total_weeks"] = row["total_weeks"]
+
+    if transcript_lecture is not None:
+        # Everything is read, give the connection back before the search takes its own
+        db.close()
+        segments, ranked_lexically = transcript_index.relevant_segments(transcript_lecture, query)
+        result["content"]["lecture"]["transcript_segments"] = segments
+        # The lexical ranking stands in until the lecture is indexed, the next call should search the index
+        return result, not ranked_lexically
+    return result, True
+
+
+# Tool name -> implementation, used by the agents to dispatch tool calls returned by the model
+AVAILABLE_TOOLS = {
+    "get_course_content": get_course_content,
+}
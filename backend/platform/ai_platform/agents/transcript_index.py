@@ -0,0 +1,291 @@
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ai_platform.agents.tokens import count_tokens, truncate_tokens
+from ai_platform.llm.governor import llm_priority, BACKGROUND
+from ai_platform.settings import TRANSCRIPT_COLLECTION, TRANSCRIPT_CHUNK_CHARS, TRANSCRIPT_CHUNK_OVERLAP, \
+    TRANSCRIPT_TOP_K, TRANSCRIPT_MAX_TOKENS
+
+# Inline markers such as "[12:05]" or "1:02:03" written by most transcription tools
+TIMESTAMP_PATTERN = re.compile(r"\[?\b(?:(\d{1,2}):)?(\d{1,2}):(\d{2})\b\]?")
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def parse_duration(duration: Optional[str]) -> Optional[int]:
+    """"10:30" or "1:02:03" -> seconds, None when the duration isn't in that format"""
+    parts = (duration or "").strip().split(":")
+    if not 2 <= len(parts) <= 3 or not all(part.isdigit() for part in parts):
+        return None
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+def format_timestamp(seconds: Optional[float]) -> Optional[str]:
+    if seconds is None:
+        return None
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def split_transcript(transcript: str, duration: Optional[str] = None) -> List[Dict]:
+    """
+    Split a transcript into overlapping segments with start/end times in seconds.
+    Times come from the inline timestamp markers when the transcript has them, otherwise they are
+    estimated from the character offset and the lecture duration. Times are None when neither is known.
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=TRANSCRIPT_CHUNK_CHARS,
+                                              chunk_overlap=TRANSCRIPT_CHUNK_OVERLAP,
+                                              add_start_index=True)
+    markers = [
+        (match.start(), int(match.group(1) or 0) * 3600 + int(match.group(2)) * 60 + int(match.group(3)))
+        for match in TIMESTAMP_PATTERN.finditer(transcript)
+    ]
+    total_seconds = parse_duration(duration)
+
+    def time_at(offset: int) -> Optional[float]:
+        if markers:
+            seconds = 0
+            for position, marker_seconds in markers:
+                if position > offset:
+                    break
+                seconds = marker_seconds
+            return seconds
+        if total_seconds:
+            return total_seconds * offset / max(len(transcript), 1)
+        return None
+
+    segments = []
+    for doc in splitter.create_documents([transcript]):
+        start = doc.metadata["start_index"]
+        segments.append({
+            "text": doc.page_content,
+            "start_sec": time_at(start),
+            "end_sec": time_at(start + len(doc.page_content)),
+        })
+    return segments
+
+
+def rank_segments_lexically(segments: List[Dict], query: str) -> List[Dict]:
+    """Fallback ranking by shared words, used when the vector store can't be reached"""
+    query_words = set(WORD_PATTERN.findall(query.lower()))
+    return sorted(segments, key=lambda segment: -len(query_words & set(WORD_PATTERN.findall(segment["text"].lower()))))
+
+
+class LectureTranscript:
+    """The fields of a lecture the index needs, copied out so the search runs after its session is closed"""
+    __slots__ = ("course_id", "week_no", "lecture_no", "transcript", "duration")
+
+    def __init__(self, course_id: int, week_no: int, lecture_no: Optional[int], transcript: Optional[str],
+                 duration: Optional[str]):
+        self.course_id = course_id
+        self.week_no = week_no
+        self.lecture_no = lecture_no
+        self.transcript = transcript
+        self.duration = duration
+
+    @classmethod
+    def of(cls, lecture) -> "LectureTranscript":
+        return cls(lecture.course_id, lecture.week_no, lecture.lecture_no, lecture.transcript, lecture.duration)
+
+
+def _default_store():
+    from ai_platform.vectordb.store_registry import vector_stores
+
+    return vector_stores.get(TRANSCRIPT_COLLECTION)
+
+
+class TranscriptIndex:
+    """
+    Lecture transcripts chunked into timestamped segments and embedded in one pgvector collection,
+    filtered by course/week/lecture at query time.
+
+    Lectures are indexed in a background worker, never inside a tool call: when a transcript is uploaded or
+    edited through the admin API, and when a search finds a lecture missing from the index. Every segment
+    carries a hash of the transcript it came from, so a transcript edited directly in the database is found
+    stale by its next search. Until its index is ready a lecture's segments are ranked lexically.
+    Lectures deleted through the admin API have their segments removed by the same worker.
+    """
+
+    def __init__(self, store_factory: Callable = _default_store, top_k: int = TRANSCRIPT_TOP_K,
+                 max_tokens: int = TRANSCRIPT_MAX_TOKENS, executor=None):
+        self.store_factory = store_factory
+        self.top_k = top_k
+        self.max_tokens = max_tokens
+        self._store = None
+        self._lock = threading.Lock()
+        self._executor = executor
+        self._scheduled: Set[Tuple] = set()  # (lecture, transcript hash) queued or being indexed
+
+    @property
+    def store(self):
+        with self._lock:
+            if self._store is None:
+                self._store = self.store_factory()
+            return self._store
+
+    @staticmethod
+    def _lecture_filter(lecture) -> Dict:
+        return {"course_id": lecture.course_id, "week_no": lecture.week_no, "lecture_no": lecture.lecture_no}
+
+    @staticmethod
+    def _segment_id(lecture, index: int) -> str:
+        return f"transcript-{lecture.course_id}-{lecture.week_no}-{lecture.lecture_no}-{index}"
+
+    @staticmethod
+    def _fingerprint(lecture) -> str:
+        return hashlib.sha256(f"{lecture.duration}\n{lecture.transcript}".encode("utf-8")).hexdigest()
+
+    def index_lecture(self, lecture, previous_count: int = 0) -> int:
+        """(Re)embed the segments of a lecture, returns the segment count"""
+        from langchain_core.documents import Document
+
+        segments = split_transcript(lecture.transcript or "", lecture.duration)
+        fingerprint = self._fingerprint(lecture)
+        docs = [
+            Document(page_content=segment["text"], metadata={
+                **self._lecture_filter(lecture),
+                "segment": index,
+                "start_sec": segment["start_sec"],
+                "end_sec": segment["end_sec"],
+                "transcript_hash": fingerprint,
+                "segment_count": len(segments),
+            })
+            for index, segment in enumerate(segments)
+        ]
+        if docs:
+            self.store.vectorstore.add_documents(docs, ids=[self._segment_id(lecture, i) for i in range(len(docs))])
+        # Drop the tail left over from a longer previous version of the transcript
+        stale_ids = [self._segment_id(lecture, i) for i in range(len(docs), previous_count)]
+        if stale_ids:
+            self.store.vectorstore.delete(ids=stale_ids)
+        print(f"INFO: Indexed {len(docs)} transcript segments of lecture {lecture.course_id}/{lecture.week_no}/"
+              f"{lecture.lecture_no}")
+        return len(docs)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcript-index")
+            return self._executor
+
+    def schedule_index(self, lecture, previous_count: int = 0, previous_transcript: Optional[str] = None) -> bool:
+        """
+        Queue the (re)indexing of a lecture on the background worker, returns False when it is already queued
+        or has nothing to index. `previous_transcript` is the text being replaced, its tail segments are dropped.
+        """
+        lecture = LectureTranscript.of(lecture)
+        if lecture.lecture_no is None or not (lecture.transcript or "").strip():
+            return False
+        key = (lecture.course_id, lecture.week_no, lecture.lecture_no, self._fingerprint(lecture))
+        with self._lock:
+            if key in self._scheduled:
+                return False
+            self._scheduled.add(key)
+        self._get_executor().submit(self._index_in_background, key, lecture, previous_count, previous_transcript)
+        return True
+
+    def schedule_remove(self, lecture: LectureTranscript) -> bool:
+        """
+        Queue the removal of the segments of a deleted lecture, returns False when it was never indexed.
+        Takes a LectureTranscript copied before the delete is committed, the row can't be read afterwards.
+        """
+        if lecture.lecture_no is None or not (lecture.transcript or "").strip():
+            return False
+        self._get_executor().submit(self._remove_in_background, lecture)
+        return True
+
+    def _remove_in_background(self, lecture: LectureTranscript) -> None:
+        try:
+            count = len(split_transcript(lecture.transcript, lecture.duration))
+            self.store.vectorstore.delete(ids=[self._segment_id(lecture, i) for i in range(count)])
+            print(f"INFO: Removed {count} transcript segments of lecture {lecture.course_id}/{lecture.week_no}/"
+                  f"{lecture.lecture_no}")
+        except Exception as e:
+            print(f"WARNING: Failed to remove the transcript of lecture {lecture.course_id}/{lecture.week_no}/"
+                  f"{lecture.lecture_no}: {e}")
+
+    def _index_in_background(self, key: Tuple, lecture: LectureTranscript, previous_count: int,
+                             previous_transcript: Optional[str]) -> None:
+        try:
+            if previous_transcript:
+                previous_count = max(previous_count, len(split_transcript(previous_transcript)))
+            with llm_priority(BACKGROUND):
+                self.index_lecture(lecture, previous_count)
+        except Exception as e:
+            print(f"WARNING: Failed to index the transcript of lecture {lecture.course_id}/{lecture.week_no}/"
+                  f"{lecture.lecture_no}: {e}")
+        finally:
+            with self._lock:
+                self._scheduled.discard(key)
+
+    def _search(self, lecture, query: str, top_k: int) -> Optional[List[Dict]]:
+        """The indexed segments closest to `query`, None when the lecture's index isn't ready (indexing is queued)"""
+        results = self.store.query_with_score(query, k=top_k, filter=self._lecture_filter(lecture))
+        fingerprint = self._fingerprint(lecture)
+        if not results or any(doc.metadata.get("transcript_hash") != fingerprint for doc, _ in results):
+            previous_count = max((doc.metadata.get("segment_count", 0) for doc, _ in results), default=0)
+            self.schedule_index(lecture, previous_count)
+            return None
+        return [
+            {"text": doc.page_content, "start_sec": doc.metadata.get("start_sec"),
+             "end_sec": doc.metadata.get("end_sec")}
+            for doc, _ in results
+        ]
+
+    def relevant_segments(self, lecture, query: Optional[str] = None, top_k: Optional[int] = None,
+                          max_tokens: Optional[int] = None) -> Tuple[List[Dict], bool]:
+        """
+        Return the transcript segments of a lecture most relevant to `query`, in lecture order and within
+        `max_tokens`, and whether they were ranked lexically because the index wasn't ready or failed (callers
+        shouldn't cache those). Without a query the opening segments are returned. Blocking, and meant to run
+        without a database session held: pass a LectureTranscript copied out of the session.
+        """
+        top_k = top_k or self.top_k
+        max_tokens = max_tokens or self.max_tokens
+        if not (lecture.transcript or "").strip():
+            return [], False
+
+        ranked_lexically = False
+        if not query:
+            segments = split_transcript(lecture.transcript, lecture.duration)
+        else:
+            try:
+                segments = self._search(lecture, query, top_k)
+            except Exception as e:
+                print(f"WARNING: Transcript search failed, ranking segments locally: {e}")
+                segments = None
+            if segments is None:
+                segments = rank_segments_lexically(split_transcript(lecture.transcript, lecture.duration), query)
+                ranked_lexically = True
+        return self._fit(segments[:top_k], max_tokens), ranked_lexically
+
+    @staticmethod
+    def _fit(segments: List[Dict], max_tokens: int) -> List[Dict]:
+        """Keep the most relevant segments that fit in the token cap, then order them by time"""
+        selected, used = [], 0
+        for segment in segments:
+            tokens = count_tokens(segment["text"])
+            if used + tokens > max_tokens:
+                if selected:
+                    continue
+                # A single oversized segment is cut rather than returning nothing
+                segment, tokens = {**segment, "text": truncate_tokens(segment["text"], max_tokens)}, max_tokens
+            selected.append(segment)
+            used += tokens
+        selected.sort(key=lambda segment: segment["start_sec"] or 0)
+        return [
+            {"start": format_timestamp(segment["start_sec"]), "end": format_timestamp(segment["end_sec"]),
+             "text": segment["text"]}
+            for segment in selected
+        ]
+
+
+transcript_index = TranscriptIndex()
@@ -0,0 +1,223 @@
+import asyncio
+import contextvars
+import json
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from ai_platform.settings import USAGE_ACCOUNTING_ENABLED, USAGE_FLUSH_INTERVAL_SEC, USAGE_FLUSH_BATCH_SIZE, \
+    USAGE_MAX_BUFFER, USAGE_MODEL_PRICES
+from ai_platform.supafast.database import SessionLocal
+from ai_platform.supafast.models.llm_usage import LlmUsage
+
+# USD per 1M (prompt, completion) tokens, USAGE_MODEL_PRICES overrides or extends them
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+if USAGE_MODEL_PRICES:
+    MODEL_PRICES.update({model: tuple(price) for model, price in json.loads(USAGE_MODEL_PRICES).items()})
+
+
+def completion_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Cost in USD, dated snapshots ("gpt-4o-mini-2024-07-18") are priced like their model, unknown models are free"""
+    price = MODEL_PRICES.get(model)
+    if price is None:
+        prefix = max((name for name in MODEL_PRICES if model.startswith(name + "-")), key=len, default=None)
+        price = MODEL_PRICES.get(prefix, (0.0, 0.0))
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+class UsageScope:
+    """
+    What the completions of a request are billed to.
+    The conversation of a new chat is created while the parser already runs, the request fills it in once known
+    and rows are attributed when they are written, so the parser call still lands on the conversation.
+    """
+
+    def __init__(self, conversation_id: uuid.UUID = None, course_id: int = None, user_id: int = None):
+        self.conversation_id = conversation_id
+        self.course_id = course_id
+        self.user_id = user_id
+
+
+_usage_scope: contextvars.ContextVar[Optional[UsageScope]] = contextvars.ContextVar("usage_scope", default=None)
+
+
+def set_usage_scope(conversation_id: uuid.UUID = None, course_id: int = None, user_id: int = None) -> UsageScope:
+    """
+    Bill the completions of the current request to this scope. Set once per request task and not reset,
+    tasks started from it (retrieval, shared answers) and its streaming response inherit it.
+    """
+    scope = UsageScope(conversation_id, course_id, user_id)
+    _usage_scope.set(scope)
+    return scope
+
+
+class UsageRecorder:
+    """
+    Buffers one row per completion and writes them in bulk from a background task.
+
+    `record` only appends to a deque, no database work happens on the request path. The flush task wakes up
+    every `flush_interval` seconds, or as soon as a batch is full, and inserts the rows in one statement from a
+    worker thread. Rows of a failed flush are put back, the buffer is bounded and drops the oldest rows.
+    A batch rejected because of its data (a scope id that doesn't exist, ...) is not put back, it would fail
+    every later flush: its rows are written one by one instead and the rows rejected again are dropped.
+    """
+
+    def __init__(self, enabled: bool = USAGE_ACCOUNTING_ENABLED, session_factory=SessionLocal,
+                 flush_interval: float = USAGE_FLUSH_INTERVAL_SEC, batch_size: int = USAGE_FLUSH_BATCH_SIZE,
+                 max_buffer: int = USAGE_MAX_BUFFER):
+        self.enabled = enabled
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: deque = deque()
+        self.max_buffer = max_buffer
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "rejected": 0, "failed_flushes": 0}
+
+    def record(self, agent_id: Optional[int], model: str, kind: str, usage, latency_ms: float = None) -> None:
+        """Queue the usage of one completion, `usage` is the CompletionUsage reported by the provider"""
+        if not self.enabled or usage is None:
+            return
+        prompt_tokens, completion_tokens = usage.prompt_tokens or 0, usage.completion_tokens or 0
+        row = {
+            "created_at": datetime.utcnow(),
+            "agent_id": agent_id,
+            "model": model,
+            "kind": kind,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": completion_cost(model, prompt_tokens, completion_tokens),
+            "latency_ms": round(latency_ms) if latency_ms is not None else None,
+        }
+        with self._lock:
+            self._pending.append((_usage_scope.get(), row))
+            self.stats["recorded"] += 1
+            self._trim()
+            full = len(self._pending) >= self.batch_size
+        if full and self._wake is not None:
+            self._wake.set()
+
+    def _trim(self) -> None:
+        while len(self._pending) > self.max_buffer:
+            self._pending.popleft()
+            self.stats["dropped"] += 1
+
+    def _take(self) -> List[Tuple[Optional[UsageScope], Dict]]:
+        with self._lock:
+            taken = list(self._pending)
+            self._pending.clear()
+        return taken
+
+    @staticmethod
+    def _attribute(scope: Optional[UsageScope], row: Dict) -> Dict:
+        return {
+            **row,
+            "conversation_id": scope.conversation_id if scope else None,
+            "course_id": scope.course_id if scope else None,
+            "user_id": scope.user_id if scope else None,
+        }
+
+    def _put_back(self, taken: List[Tuple[Optional[UsageScope], Dict]], error: Exception) -> None:
+        with self._lock:
+            self._pending.extendleft(reversed(taken))
+            self.stats["failed_flushes"] += 1
+            self._trim()
+        print(f"WARNING: Failed to write {len(taken)} usage rows, retrying on the next flush: {error}")
+
+    def _write_each(self, db, taken: List[Tuple[Optional[UsageScope], Dict]]) -> int:
+        """Write the rows of a rejected batch one by one, drops the ones rejected again"""
+        written = 0
+        for index, (scope, row) in enumerate(taken):
+            try:
+                db.execute(insert(LlmUsage), [self._attribute(scope, row)])
+                db.commit()
+                written += 1
+            except (IntegrityError, DataError) as e:
+                db.rollback()
+                with self._lock:
+                    self.stats["rejected"] += 1
+                print(f"WARNING: Dropped a usage row rejected by the database ({row['kind']}, {row['model']}): "
+                      f"{e.orig}")
+            except Exception as e:
+                db.rollback()
+                self._put_back(taken[index:], e)
+                break
+        return written
+
+    def flush(self) -> int:
+        """Write every buffered row in one insert, returns the number of rows written. Blocking, run in a thread"""
+        with self._flush_lock:
+            taken = self._take()
+            if not taken:
+                return 0
+            db = self.session_factory()
+            try:
+                db.execute(insert(LlmUsage), [self._attribute(scope, row) for scope, row in taken])
+                db.commit()
+                written = len(taken)
+            except (IntegrityError, DataError) as e:
+                db.rollback()
+                print(f"WARNING: A batch of {len(taken)} usage rows was rejected, writing them one by one: {e.orig}")
+                written = self._write_each(db, taken)
+            except Exception as e:
+                db.rollback()
+                self._put_back(taken, e)
+                return 0
+            finally:
+                db.close()
+            with self._lock:
+                self.stats["written"] += written
+            return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await asyncio.to_thread(self.flush)
+
+    def start(self) -> None:
+        if self.enabled and (self._task is None or self._task.done()):
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush task and write what is left"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "running": self._task is not None and not self._task.done(),
+        }
+
+
+usage_recorder = UsageRecorder()
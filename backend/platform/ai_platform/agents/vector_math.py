@@ -0,0 +1,12 @@
+import math
+from typing import List
+
+
+def normalize(vector: List[float]) -> List[float]:
+    """Scale the vector to unit length so cosine similarity becomes a plain dot product"""
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def dot(a: List[float], b: List[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
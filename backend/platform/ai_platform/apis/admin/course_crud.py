@@ -1,5 +1,7 @@
 # crud/test_course.py
 from sqlalchemy.orm import Session
+from ai_platform.agents.semantic_cache import response_cache
+from ai_platform.agents.tool_cache import tool_cache
 from ai_platform.supafast.models.courses import Course
 from ai_platform.schemas.admin import CourseCreate, CourseUpdate
 
@@ -31,6 +33,8 @@ def update_course(db: Session, course_id: int, course_update: CourseUpdate):
 
     db.commit()
     db.refresh(db_course)
+    response_cache.invalidate_course(course_id)
+    tool_cache.invalidate_course(course_id)
     return db_course
 
 
@@ -41,4 +45,6 @@ def delete_course(db: Session, course_id: int):
 
     db.delete(db_course)
     db.commit()
+    response_cache.invalidate_course(course_id)
+    tool_cache.invalidate_course(course_id)
     return db_course
\ No newline at end of file
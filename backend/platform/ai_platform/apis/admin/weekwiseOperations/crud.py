@@ -1,6 +1,9 @@
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 
+from ai_platform.agents.semantic_cache import response_cache
+from ai_platform.agents.tool_cache import tool_cache
+from ai_platform.agents.transcript_index import LectureTranscript, transcript_index
 from ai_platform.schemas.weekwise_operations import WeekwiseContentCreate, WeekwiseContentUpdate
 from ai_platform.supafast.models.weekwise_content import VideoLecture, PracticeAssignment, GradedAssignment, \
     WeekwiseContent
@@ -33,17 +36,21 @@ def create_weekwise_content(db: Session, content: WeekwiseContentCreate):
     db.refresh(db_content)
 
     # Create VideoLecture objects (if provided)
+    new_videos = []
     if content.video_lectures:
-        for video in content.video_lectures:
+        # Lectures are numbered in upload order, the agent tool and the transcript index look them up by number
+        for lecture_no, video in enumerate(content.video_lectures, start=1):
             db_video = VideoLecture(
                 course_id=content.course_id,
                 week_no=db_content.week_no,
+                lecture_no=lecture_no,
                 title=video.title,
                 transcript=video.transcript,
                 duration=video.duration,
                 video_link=video.video_link,
             )
             db.add(db_video)
+            new_videos.append(db_video)
 
     # Create PracticeAssignment objects (if provided)
     if content.practice_assignments:
@@ -75,6 +82,10 @@ def create_weekwise_content(db: Session, content: WeekwiseContentCreate):
 
     db.commit()
     db.refresh(db_content)
+    response_cache.invalidate_course(db_content.course_id)
+    tool_cache.invalidate_course(db_content.course_id)
+    for db_video in new_videos:
+        transcript_index.schedule_index(db_video)
     return db_content
 
 
@@ -116,13 +127,20 @@ def update_weekwise_content(db: Session, content_id: int, content_update: Weekwi
         db_content.upload_date = content_update.upload_date
 
     # Update Videos
+    # Transcripts to (re)index once committed: (lecture, replaced transcript), and of deleted lectures to remove
+    indexed_videos = []
+    removed_videos = []
     if content_update.video_lectures is not None:
         existing_video_ids = {video.id for video in db_content.videos}
         new_video_ids = {video.id for video in content_update.video_lectures if video.id is not None}
+        # New lectures are numbered after the ones kept
+        next_lecture_no = max((video.lecture_no or 0 for video in db_content.videos if video.id in new_video_ids),
+                              default=0) + 1
 
         # Delete videos not in the new payload
         for video in db_content.videos[:]:  # Use a copy to avoid modifying during iteration
             if video.id not in new_video_ids:
+                removed_videos.append(LectureTranscript.of(video))
                 db.delete(video)
 
         # Add or update videos
@@ -131,6 +149,8 @@ def update_weekwise_content(db: Session, content_id: int, content_update: Weekwi
                 # Update existing video
                 db_video = db.query(VideoLecture).filter(VideoLecture.id == video.id).first()
                 if db_video:
+                    if db_video.transcript != video.transcript or db_video.duration != video.duration:
+                        indexed_videos.append((db_video, db_video.transcript))
                     db_video.title = video.title
                     db_video.transcript = video.transcript
                     db_video.duration = video.duration
@@ -140,12 +160,15 @@ def update_weekwise_content(db: Session, content_id: int, content_update: Weekwi
                 db_video = VideoLecture(
                     course_id=db_content.course_id,
                     week_no=db_content.week_no,
+                    lecture_no=next_lecture_no,
                     title=video.title,
                     transcript=video.transcript,
                     duration=video.duration,
                     video_link=video.video_link,
                 )
                 db.add(db_video)
+                indexed_videos.append((db_video, None))
+                next_lecture_no += 1
 
     # Update Practice Assignments
     if content_update.practice_assignments is not None:
@@ -223,4 +246,10 @@ def update_weekwise_content(db: Session, content_id: int, content_update: Weekwi
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+    response_cache.invalidate_course(db_content.course_id)
+    tool_cache.invalidate_course(db_content.course_id)
+    for db_video, previous_transcript in indexed_videos:
+        transcript_index.schedule_index(db_video, previous_transcript=previous_transcript)
+    for lecture in removed_videos:
+        transcript_index.schedule_remove(lecture)
     return db_content
\ No newline at end of file
@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
 
+from ai_platform.agents.agent_registry import agent_registry
 from ai_platform.schemas.ai_agent import AiAgentCreate, AiAgentUpdate
 from ai_platform.supafast.models.ai_agent import AiAgent
 
@@ -13,6 +14,7 @@ def create_agent(db: Session, agent: AiAgentCreate):
     db.add(db_agent)
     db.commit()
     db.refresh(db_agent)
+    agent_registry.invalidate()
     return db_agent
 
 
@@ -24,8 +26,10 @@ def update_agent(db: Session, agent_id: int, agent: AiAgentUpdate):
     db_agent = get_agent(db, agent_id)
     for key, value in agent.dict().items():
         setattr(db_agent, key, value)
+    db_agent.config_version = (db_agent.config_version or 0) + 1
     db.commit()
     db.refresh(db_agent)
+    agent_registry.invalidate()
     return db_agent
 
 
@@ -33,4 +37,5 @@ def delete_agent(db: Session, agent_id: int):
     db_agent = get_agent(db, agent_id)
     db.delete(db_agent)
     db.commit()
+    agent_registry.invalidate()
     return db_agent
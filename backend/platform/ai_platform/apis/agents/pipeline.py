@@ -0,0 +1,259 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+
+from ai_platform.agents.metrics import RETRIEVAL_LATENCY
+from ai_platform.agents.model_routing import RoutingSignals
+from ai_platform.agents.query_router import course_vector_index
+from ai_platform.apis.conversations.crud import get_conversation, create_conversation, update_conversation, \
+    update_conversation_summary
+from ai_platform.apis.courses.crud import get_course
+from ai_platform.apis.students.course_crud import get_course_weeks
+from ai_platform.schemas.conversation import ConversationCreate, ConversationUpdate
+from ai_platform.supafast.database import SessionLocal, read_only_session
+
+
+class ConversationAccessDenied(Exception):
+    """The conversation of the request doesn't exist or belongs to another user"""
+
+
+class StageTimer:
+    """Wall time of every context assembly stage in milliseconds, to see where time to first token goes"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+
+    async def run(self, stage: str, awaitable):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.timings[stage] = round((time.perf_counter() - started) * 1000, 2)
+
+    def mark(self, stage: str) -> None:
+        """Record the time elapsed since the request started"""
+        self.timings[stage] = round((time.perf_counter() - self.started) * 1000, 2)
+
+
+def _load_course(course_id: int) -> Dict:
+    with read_only_session() as db:
+        course_week_details = get_course_weeks(db=db, course_id=course_id)
+        course_data = get_course(db=db, course_id=course_id)
+    return {
+        "title": course_data.title,
+        "context": f"Course Details: {course_data}\nCourse Week Details: {course_week_details}"
+    }
+
+
+def _load_conversation(conversation_id: uuid.UUID) -> Optional[Dict]:
+    with read_only_session() as db:
+        conversation = get_conversation(db, conversation_id)
+        if not conversation:
+            return None
+        return {
+            "user_id": conversation.user_id,
+            "summary": conversation.summary,
+            "summarized_until": conversation.summarized_until or 0
+        }
+
+
+def _create_conversation(convo_create: ConversationCreate) -> uuid.UUID:
+    db = SessionLocal()
+    try:
+        return create_conversation(db, convo_create)
+    finally:
+        db.close()
+
+
+def save_conversation_history(conversation_id: uuid.UUID, conversations: List[Dict]) -> None:
+    """Blocking, for paths that can't use the request session such as the cleanup of a disconnected stream"""
+    db = SessionLocal()
+    try:
+        update_conversation(db, conversation_id, ConversationUpdate(conversations=conversations,
+                                                                    modified_at=datetime.now()))
+    finally:
+        db.close()
+
+
+def _save_summary(conversation_id: uuid.UUID, summary: str, summarized_until: int) -> None:
+    db = SessionLocal()
+    try:
+        update_conversation_summary(db, conversation_id, summary, summarized_until)
+    finally:
+        db.close()
+
+
+# Summaries being folded after their answer was sent by conversation, referenced until they finish so they aren't
+# garbage collected and so a second turn doesn't fold the same overflow again
+_summary_tasks: Dict[uuid.UUID, asyncio.Task] = {}
+
+
+def schedule_history_summary(agents, conversation_id: uuid.UUID, history: List[Dict], history_summary: Optional[str],
+                             summarized_until: int, agent_id: int) -> Optional[asyncio.Task]:
+    """
+    Fold the messages that left the token window into the rolling summary used by the next turn.
+    Runs after the stream ended, in its own task and database session: the summary is an LLM call at background
+    priority that can wait behind the governor, the student doesn't wait for it.
+    Returns None without folding while a fold of the same conversation is running, the turn after it lands
+    folds whatever is still left over.
+    """
+    if conversation_id in _summary_tasks:
+        return None
+
+    async def fold():
+        try:
+            folded = await agents.summarize_history(history, history_summary, summarized_until, agent_id=agent_id)
+            if folded:
+                await asyncio.to_thread(_save_summary, conversation_id, *folded)
+        except Exception as e:
+            print(f"Failed to update the conversation summary: {e}")
+
+    task = asyncio.create_task(fold())
+    _summary_tasks[conversation_id] = task
+    task.add_done_callback(lambda _: _summary_tasks.pop(conversation_id, None))
+    return task
+
+
+async def _retrieve(agents, query: str, history: List[Dict], course_task, timer: StageTimer,
+                    routing: RoutingSignals = None) -> Optional[str]:
+    """
+    Knowledge base routing and similarity search.
+    The embedding router runs on the query alone so it does not wait for the course lookup. When it can't decide,
+    the parser agent needs the course context, and while it runs the course's own knowledge base is searched
+    speculatively, that result is used if the parser agent picks the same collection.
+    The route and the distance of the closest chunk are noted in `routing` for the model router.
+    """
+    routing = routing or RoutingSignals()
+    route = await timer.run("routing", agents.router.route(query)) if agents.router else None
+    if route is None:
+        course = await course_task if course_task else None
+        likely = course_vector_index(course["title"]) if course else None
+        speculative = None
+        if likely and agents.router and agents.router.has_collection(likely):
+            speculative = asyncio.create_task(agents.search_knowledge_base_scored(likely, query))
+        try:
+            route = await timer.run("parser_agent", agents.parser_route(
+                query, context=course["context"] if course else None, history=history
+            ))
+        except Exception:
+            if speculative:
+                speculative.cancel()
+            raise
+        if speculative:
+            if route and route["vector_index"] == likely:
+                routing.knowledge_base = likely
+                context, routing.retrieval_distance = await timer.run("vector_search", speculative)
+                return context
+            speculative.cancel()
+    if route:
+        routing.knowledge_base, routing.route_score = route["vector_index"], route.get("score")
+    if not route or route["vector_index"] == "general":
+        return None
+    context, routing.retrieval_distance = await timer.run(
+        "vector_search", agents.search_knowledge_base_scored(route["vector_index"], query)
+    )
+    return context
+
+
+async def retrieve_context(agents, agent, query: str, course_id: Optional[int], chat_history: List[Dict],
+                           timer: StageTimer, routing: RoutingSignals = None) -> Optional[str]:
+    """Knowledge base retrieval on its own, for a request whose shared in-flight answer was aborted"""
+    if "host" not in agent.name.lower():
+        return None
+    course_task = asyncio.create_task(asyncio.to_thread(_load_course, course_id)) if course_id else None
+    try:
+        return await timer.run("retrieval", _retrieve(agents, query, chat_history, course_task, timer, routing))
+    except Exception as e:
+        print(f"Knowledge base retrieval failed: {e}")
+        return None
+    finally:
+        if course_task and not course_task.done():
+            course_task.cancel()
+
+
+async def assemble_host_agent_context(
+        agents,
+        agent,
+        query: str,
+        course_id: Optional[int],
+        conversation_id: Optional[uuid.UUID],
+        chat_history: List[Dict],
+        convo_create: Optional[ConversationCreate],
+        timer: StageTimer,
+        retrieve: bool = True,
+        user_id: Optional[int] = None
+) -> Dict:
+    """
+    Collect everything the host agent needs before the first token, running the independent stages concurrently:
+    course context, conversation lookup (or creation), response cache lookup and knowledge base retrieval.
+    An existing conversation is checked to belong to `user_id` before the cache lookup and the retrieval start,
+    they embed the query and may call the parser agent, raises ConversationAccessDenied otherwise.
+    A new conversation is only created once the course lookup succeeded, retrieval is dropped on a cache hit.
+    With `retrieve` off (the request follows an identical in-flight answer) only course and conversation run.
+    """
+    result = {
+        "course_context": None,
+        "vector_context": None,
+        "conversation_id": conversation_id,
+        "conversation": None,
+        "cache_key": None,
+        "cached_answer": None,
+        "routing": RoutingSignals(),
+    }
+    # Read before the course content is loaded, an answer built from content that changed since isn't cached
+    cache_version = agents.response_cache.version(course_id) if agents.response_cache else None
+    course_task = asyncio.create_task(
+        timer.run("course_context", asyncio.to_thread(_load_course, course_id))
+    ) if course_id else None
+    tasks = [course_task] if course_task else []
+
+    try:
+        if conversation_id:
+            # Nothing that is billed starts before the conversation is known to be the user's
+            conversation = await timer.run(
+                "conversation_lookup", asyncio.to_thread(_load_conversation, conversation_id)
+            )
+            if not conversation or conversation["user_id"] != user_id:
+                raise ConversationAccessDenied(conversation_id)
+            result["conversation"] = conversation
+        cache_task = asyncio.create_task(
+            timer.run("cache_lookup", agents.cache_lookup(agent.id, course_id, query, chat_history,
+                                                      version=cache_version))
+        ) if retrieve else None
+        retrieval_task = asyncio.create_task(
+            timer.run("retrieval", _retrieve(agents, query, chat_history, course_task, timer, result["routing"]))
+        ) if retrieve and "host" in agent.name.lower() else None
+        tasks += [task for task in (cache_task, retrieval_task) if task]
+
+        if course_task:
+            try:
+                course = await course_task
+            except Exception as e:
+                print(f"Error getting course data: {e}")
+                raise HTTPException(status_code=500, detail=f"Error retrieving course data: {e}")
+            result["course_context"] = course["context"]
+        if convo_create is not None:
+            result["conversation_id"] = await timer.run(
+                "conversation_create", asyncio.to_thread(_create_conversation, convo_create)
+            )
+        if cache_task:
+            result["cache_key"], result["cached_answer"] = await cache_task
+        if retrieval_task and result["cached_answer"] is None:
+            try:
+                result["vector_context"] = await retrieval_task
+                RETRIEVAL_LATENCY.observe(timer.timings["retrieval"] / 1000, agent.id, agent.model_name)
+            except Exception as e:
+                # The answer can still be given from the course context and tools
+                print(f"Knowledge base retrieval failed: {e}")
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    timer.mark("context_ready")
+    print(f"Host agent context assembled, stage timings (ms): {timer.timings}")
+    return result
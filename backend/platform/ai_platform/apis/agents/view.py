@@ -1,3 +1,4 @@
+import asyncio
 import os
 import time
 import uuid
@@ -10,28 +11,37 @@ import pdfplumber
 from io import BytesIO
 from fastapi import UploadFile, File, Form, Query
 
+from ai_platform.agents.pacing import PacingPolicy
 from ai_platform.agents.streaming_services import OpenAIStreaming
 from starlette.responses import StreamingResponse, JSONResponse
 from fastapi import APIRouter, Depends, HTTPException
 from ai_platform.apis.agents import crud
 from ai_platform.apis.agents.crud import get_agent
-from ai_platform.apis.conversations.crud import update_conversation, get_conversation, create_conversation
-from ai_platform.apis.courses.crud import get_course
-from ai_platform.apis.students.course_crud import get_course_weeks
+from ai_platform.apis.agents.pipeline import StageTimer, ConversationAccessDenied, assemble_host_agent_context, \
+    retrieve_context, schedule_history_summary, save_conversation_history
+from ai_platform.apis.conversations.crud import update_conversation
 from ai_platform.schemas.ai_agent import AiAgentInDB, AiAgentCreate, AiAgentUpdate, CreateKnowledgeBaseResponse, \
     CreateKnowledgeBaseRequest
 from ai_platform.schemas.conversation import ConversationUpdate, ConversationCreate
 from ai_platform.supafast.database import get_db
-from ai_platform.vectordb.db_pgvector import PgvectorDB
+from ai_platform.vectordb.ingestion import IngestionPipeline
+from ai_platform.vectordb.store_registry import vector_stores
 from docx import Document
 from sse_starlette.sse import EventSourceResponse
+import anyio
 import json
-from ai_platform.agents.framework_agentic import Agents
+from ai_platform.agents.model_routing import RoutingSignals
+from ai_platform.agents.runtime import agents
+from ai_platform.agents.semantic_cache import response_cache
+from ai_platform.agents.singleflight import FlightAborted
+from ai_platform.agents.stream_events import StreamEvent, FrameCoalescer
+from ai_platform.agents.usage import set_usage_scope
+from ai_platform.settings import SSE_COALESCE_ENABLED, SSE_DEMO_TOKENS_PER_SEC
 
 # from ai_platform.agents.openai_agent import Agents
 
 streamClient = OpenAIStreaming()
-agents = Agents()
+demo_stream_pacing = PacingPolicy(tokens_per_sec=SSE_DEMO_TOKENS_PER_SEC)
 
 router = APIRouter()
 
@@ -68,6 +78,24 @@ def extract_text_from_file(file: UploadFile) -> str:
         raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
 
 
+def knowledge_base_text(content: Optional[str], file: Optional[UploadFile]) -> str:
+    """The text of a knowledge base upload, the raw content followed by the text of the file"""
+    if not content and not file:
+        raise HTTPException(status_code=400, detail="Either 'content' or 'file' must be provided.")
+
+    extracted_text = content or ""  # Start with provided content if available
+
+    if file:
+        extracted_text += "\n" + extract_text_from_file(file)
+    return extracted_text
+
+
+def knowledge_base_docs(vector_index: str, text: str):
+    """The store of the collection and the chunks of `text`. Blocking, run it in a worker thread"""
+    vectorstore = vector_stores.get(vector_index)
+    return vectorstore, vectorstore.create_docs_from_text(text=text, chunk_size=500)
+
+
 @router.post("/create_knowledgebase", response_model=CreateKnowledgeBaseResponse)
 async def create_knowledge_base(
         vector_index: str = Form(...),
@@ -92,28 +120,64 @@ async def create_knowledge_base(
         HTTPException: If neither 'content' nor 'file' is provided.
         HTTPException: If an error occurs while processing the file or creating embeddings.
     """
-    if not content and not file:
-        raise HTTPException(status_code=400, detail="Either 'content' or 'file' must be provided.")
-
-    extracted_text = content or ""  # Start with provided content if available
-
-    if file:
-        extracted_text += "\n" + extract_text_from_file(file)
-
+    extracted_text = knowledge_base_text(content, file)
     try:
-        vectorstore = PgvectorDB(collection_name=vector_index, connection_str=os.getenv("SQLALCHEMY_DATABASE_URL"))
-        docs = vectorstore.create_docs_from_text(text=extracted_text, chunk_size=500)
-        vectorstore.create_embeddings(docs)
+        vectorstore, docs = await asyncio.to_thread(knowledge_base_docs, vector_index, extracted_text)
+        report = await IngestionPipeline(vectorstore).ingest(docs)
+        if report["inserted"]:
+            response_cache.invalidate_collection(vector_index)
 
         return CreateKnowledgeBaseResponse(
-            status=True,
-            document_inserted_count=len(docs),
+            status=not report["failed"],
+            document_inserted_count=report["inserted"],
+            embedded_count=report["embedded"],
+            reused_count=report["reused"],
+            skipped_count=report["duplicates"] + report["existing"],
+            failed_count=report["failed"],
             vector_index=vector_index
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/create_knowledgebase/stream")
+async def create_knowledge_base_stream(
+        vector_index: str = Form(...),
+        content: Optional[str] = Form(None),
+        file: Optional[UploadFile] = File(None)
+):
+    """
+    **Create a knowledge base and stream the progress of the ingestion (SSE).**
+
+    Same input as `/create_knowledgebase`. Large documents take minutes to embed, this variant reports
+    every embedded batch as it is inserted.
+
+    **Events:**
+        `{"type": "progress", "stage": "planned", "chunks": int, "to_embed": int, "batches": int, ...}`
+        `{"type": "progress", "stage": "batch", "batch": int, "completed_batches": int, "inserted": int, ...}`
+        `{"type": "result", "inserted": int, "embedded": int, "reused": int, "failed": int, ...}`, then `end`.
+        An `error` event replaces the result when the ingestion could not run.
+
+    **Raises:**
+        HTTPException: If neither 'content' nor 'file' is provided or the file can't be read.
+    """
+    extracted_text = knowledge_base_text(content, file)
+
+    async def event_generator():
+        try:
+            vectorstore, docs = await asyncio.to_thread(knowledge_base_docs, vector_index, extracted_text)
+            async for event in IngestionPipeline(vectorstore).run(docs):
+                if event.type == "result" and event.fields["inserted"]:
+                    response_cache.invalidate_collection(vector_index)
+                yield {"data": event.serialize()}
+        except Exception as e:
+            print(f"Knowledge base ingestion of {vector_index} failed: {e}")
+            yield {"data": StreamEvent.error(f"Error creating embeddings: {str(e)}").serialize()}
+        yield {"data": StreamEvent.end().serialize()}
+
+    return EventSourceResponse(event_generator())
+
+
 @router.get("/agents/", response_model=List[AiAgentInDB])
 def read_agents(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """
@@ -253,10 +317,10 @@ async def openai_streaming(request):
         request: The incoming request (not currently used).
 
     **Returns:**
-        StreamingResponse: Sample streaming data as an event stream.
+        StreamingResponse: Sample streaming data as an event stream, paced at SSE_DEMO_TOKENS_PER_SEC.
     """
     return StreamingResponse(
-        streamClient.stream_string("Sample Streaming Data"),
+        streamClient.stream_string("Sample Streaming Data", pacing=demo_stream_pacing),
         media_type='text/event-stream')
 
 
@@ -340,18 +404,6 @@ async def stream_agent_response(
             content={"error": f"Agent with ID {agent_id} not found"}
         )
 
-    # Prepare course context if course_id is provided
-    course_context = None
-    if course_id:
-        try:
-            course_week_details = get_course_weeks(db=db, course_id=course_id)
-            course_data = get_course(db=db, course_id=course_id)
-            course_context = (f"Course Details: {course_data}\n"
-                              f"Course Week Details: {course_week_details}")
-        except Exception as e:
-            print(f"Error getting course data: {e}")
-            raise HTTPException(status_code=500, detail=f"Error retrieving course data: {e}")
-
     # Parse chat history
     chat_history = []
     if history:
@@ -362,8 +414,8 @@ async def stream_agent_response(
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Invalid history format: {str(e)}")
 
-    # Handle conversation creation or retrieval
-    current_conversation_id = conversation_id
+    # Decide on conversation creation or retrieval
+    convo_create = None
     if len(chat_history) == 1 and not conversation_id:  # New conversation # if only two messages, it means new chat
         # Use provided title, first user message, or timestamp as fallback
         first_message = query[:50] if query else "New Chat"  # Truncate to 50 chars
@@ -375,68 +427,158 @@ async def stream_agent_response(
             conversations=chat_history,
             title=convo_title
         )
-        current_conversation_id = create_conversation(db, convo_create)
-    elif conversation_id:  # Existing conversation
-        conversation = get_conversation(db, conversation_id)
-        if not conversation or conversation.user_id != user_id:
-            return JSONResponse(
-                status_code=404,
-                content={"error": "Conversation not found or access denied"}
-            )
-    else:  # History provided but no conversation_id
+    elif not conversation_id:  # History provided but no conversation_id
         return JSONResponse(
             status_code=400,
             content={"error": "conversation_id required when providing history"}
         )
 
+    # Every completion made for this request is accounted to its conversation, course and user
+    usage_scope = set_usage_scope(conversation_id, course_id, user_id)
+
+    # Identical fresh questions in flight share one answer, a follower skips cache lookup and retrieval
+    flight_key = agents.flights.key(agent_id, query, course_id=course_id, history=chat_history)
+    flight, leading = agents.flights.acquire(flight_key) if flight_key else (None, True)
+
+    def release_flight():
+        # This request returns before reading the shared answer
+        if leading:
+            agents.flights.abort(flight)
+        else:
+            flight.leave()
+
+    # Course context, conversation, cache lookup and knowledge base retrieval run concurrently
+    timer = StageTimer()
+    try:
+        assembled = await assemble_host_agent_context(
+            agents, agent, query, course_id, conversation_id, chat_history, convo_create, timer, retrieve=leading,
+            user_id=user_id
+        )
+    except ConversationAccessDenied:
+        if flight:
+            release_flight()
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Conversation not found or access denied"}
+        )
+    except Exception:
+        if flight:
+            release_flight()
+        raise
+    current_conversation_id = assembled["conversation_id"]
+    usage_scope.conversation_id = current_conversation_id
+    history_summary, summarized_until = None, 0
+    if conversation_id:  # Existing conversation, its owner was checked before the retrieval started
+        conversation = assembled["conversation"]
+        history_summary, summarized_until = conversation["summary"], conversation["summarized_until"]
+
+    def answer_stream(vector_context=None, cached_answer=None, cache_key=None, routing=None):
+        if cached_answer is not None:
+            return agents.replay_stream(cached_answer)
+        course_context = assembled["course_context"]
+        if vector_context:
+            course_context = (course_context or "") + f"\nVector DB Context: {vector_context}"
+        return agents.stream_response(
+            user_input=query,
+            course_id=course_id,
+            agent_id=agent_id,
+            chat_history=chat_history,
+            context=course_context,
+            cache_key=cache_key,
+            history_summary=history_summary,
+            summarized_until=summarized_until,
+            routing=routing,
+        )
+
+    async def follow():
+        try:
+            async for event in flight.subscribe():
+                yield event
+        except FlightAborted:
+            print("INFO: Shared answer aborted by its leader, answering on our own")
+            routing = RoutingSignals()
+            vector_context = await retrieve_context(agents, agent, query, course_id, chat_history, timer, routing)
+            async for event in answer_stream(vector_context, routing=routing):
+                yield event
+
+    def response_stream():
+        if flight is None:
+            return answer_stream(assembled["vector_context"], assembled["cached_answer"], assembled["cache_key"],
+                                 assembled["routing"])
+        return follow()
+
+    if flight and leading:
+        agents.flights.start(flight, answer_stream(
+            assembled["vector_context"], assembled["cached_answer"], assembled["cache_key"], assembled["routing"]
+        ))
+
     # Function to generate streaming events and update conversation
+    def history_with(answer: str, truncated: bool = False) -> List[Dict]:
+        assistant_message = {"role": "assistant", "content": answer}
+        if truncated:
+            assistant_message["truncated"] = True
+        return chat_history + [{"role": "user", "content": query}, assistant_message]
+
+    def save_history(answer: str):
+        updated_history = history_with(answer)
+        update_data = ConversationUpdate(
+            conversations=updated_history,
+            modified_at=datetime.now()
+        )
+        return updated_history, update_conversation(db, current_conversation_id, update_data)
+
     async def event_generator():
+        events = response_stream()
+        if SSE_COALESCE_ENABLED:
+            events = FrameCoalescer().coalesce(events)
+        answer_parts = []
+        saved = False
         try:
-            full_response = ""
-            async for chunk in agents.stream_response(
-                    user_input=query,
-                    course_id=course_id,
-                    agent_id=agent_id,
-                    chat_history=chat_history,
-                    context=course_context,
-            ):
-                # Parse the chunk to get the content
-                try:
-                    chunk_data = json.loads(chunk)
-                    if chunk_data.get("type") == "text":
-                        full_response += chunk_data.get("content", "")
-                    elif chunk_data.get("type") == "end":
-                        continue
-                except json.JSONDecodeError:
-                    full_response += chunk  # Fallback if not JSON
-
-                yield {"data": chunk}
+            async for event in events:
+                if event.type == "text":
+                    if not answer_parts:
+                        timer.mark("first_token")
+                    answer_parts.append(event.content)
+                elif event.type == "end":
+                    continue
+                yield {"data": event.serialize()}
+            full_response = "".join(answer_parts)
 
             # Update conversation with new message
-            updated_history = chat_history + [
-                {"role": "user", "content": query},
-                {"role": "assistant", "content": full_response}
-            ]
-            update_data = ConversationUpdate(
-                conversations=updated_history,
-                modified_at=datetime.now()
-            )
-            updated_conversation = update_conversation(db, current_conversation_id, update_data)
+            updated_history, updated_conversation = save_history(full_response)
+            saved = True
             print("Updated history")
             # Include conversation_id in the final message
             # Include conversation metadata in the final message
-            yield {"data": json.dumps({
-                "type": "metadata",
-                "conversation_id": str(current_conversation_id),
-                "title": updated_conversation.title,
-                "created_at": updated_conversation.created_at.isoformat(),
-                "modified_at": updated_conversation.modified_at.isoformat()
-            })}
+            yield {"data": StreamEvent(
+                "metadata",
+                conversation_id=str(current_conversation_id),
+                title=updated_conversation.title,
+                created_at=updated_conversation.created_at.isoformat(),
+                modified_at=updated_conversation.modified_at.isoformat(),
+                timings=timer.timings
+            ).serialize()}
+            # The client closes the stream on "end", the summary of the overflow is folded after it
+            schedule_history_summary(agents, current_conversation_id, updated_history, history_summary,
+                                     summarized_until, agent_id)
+        except (asyncio.CancelledError, GeneratorExit):
+            # The client disconnected: closing the stream cancels the upstream completion (unless other
+            # requests still follow it), what the student already saw is kept as a truncated answer. The write
+            # runs in a thread with its own session, a burst of closed tabs must not stall the loop
+            with anyio.CancelScope(shield=True):
+                await events.aclose()
+                if not saved:
+                    try:
+                        await asyncio.to_thread(save_conversation_history, current_conversation_id,
+                                                history_with("".join(answer_parts), truncated=True))
+                        print(f"Client disconnected, truncated answer saved to conversation {current_conversation_id}")
+                    except Exception as e:
+                        print(f"Failed to save the truncated answer: {e}")
+            raise
         except Exception as e:
             error_message = f"Error generating response: {str(e)}"
             print(error_message)
-            yield {"data": json.dumps({"type": "error", "content": error_message})}
-        finally:
-            yield {"data": json.dumps({"type": "end"})}
+            yield {"data": StreamEvent.error(error_message).serialize()}
+        yield {"data": StreamEvent.end().serialize()}
 
     return EventSourceResponse(event_generator())
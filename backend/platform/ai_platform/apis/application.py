@@ -3,7 +3,10 @@ from importlib import metadata
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import UJSONResponse
+from ai_platform.agents.usage import usage_recorder
+from ai_platform.apis.monitoring.loop_monitor import loop_monitor
 from ai_platform.apis.router import api_router
+from ai_platform.llm.providers import startup_providers, shutdown_providers
 
 
 def get_app() -> FastAPI:
@@ -33,7 +36,12 @@ def get_app() -> FastAPI:
     )
 
     # Adds startup and shutdown events.
-
+    app.router.add_event_handler("startup", loop_monitor.start)
+    app.router.add_event_handler("shutdown", loop_monitor.stop)
+    app.router.add_event_handler("startup", usage_recorder.start)
+    app.router.add_event_handler("shutdown", usage_recorder.stop)
+    app.router.add_event_handler("startup", startup_providers)
+    app.router.add_event_handler("shutdown", shutdown_providers)
 
     # Main router for the API.
     app.include_router(router=api_router, prefix="/api")
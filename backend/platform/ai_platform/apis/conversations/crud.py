@@ -31,6 +31,17 @@ def update_conversation(db: Session, conversation_id: uuid.UUID, update_data: Co
     return db_convo
 
 
+def update_conversation_summary(db: Session, conversation_id: uuid.UUID, summary: str, summarized_until: int):
+    db_convo = get_conversation(db, conversation_id)
+    if not db_convo:
+        return None  # Error: Not Found
+
+    db_convo.summary = summary
+    db_convo.summarized_until = summarized_until
+    db.commit()
+    return db_convo
+
+
 def delete_conversation(db: Session, conversation_id: uuid.UUID):
     db_convo = get_conversation(db, conversation_id)
     if not db_convo:
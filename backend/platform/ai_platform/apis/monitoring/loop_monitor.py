@@ -0,0 +1,59 @@
+import asyncio
+from collections import deque
+from typing import Dict, Optional
+
+from ai_platform.settings import LOOP_MONITOR_INTERVAL_MS
+
+
+class EventLoopMonitor:
+    """
+    Measures event loop lag: a task sleeps `interval_ms` and records how late it wakes up.
+    Lag means blocking work on the loop (sync DB calls, CPU heavy code) delaying every other request.
+    """
+
+    def __init__(self, interval_ms: float = LOOP_MONITOR_INTERVAL_MS, window: int = 600):
+        self.interval = interval_ms / 1000
+        self.samples = deque(maxlen=window)  # lag in ms of the last `window` wake ups
+        self.max_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(loop.time() - expected, 0) * 1000
+            self.samples.append(lag_ms)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        samples = sorted(self.samples)
+
+        def percentile(p: float) -> float:
+            return round(samples[min(int(len(samples) * p), len(samples) - 1)], 2) if samples else 0.0
+
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_ms": self.interval * 1000,
+            "samples": len(samples),
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+            "window_max_ms": round(samples[-1], 2) if samples else 0.0,
+            "max_ms": round(self.max_lag_ms, 2),
+        }
+
+
+loop_monitor = EventLoopMonitor()
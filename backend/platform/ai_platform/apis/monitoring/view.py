@@ -1,8 +1,98 @@
-from fastapi import APIRouter
+from typing import Callable, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from starlette.responses import PlainTextResponse
+
+from ai_platform.agents.metrics import metrics
+from ai_platform.agents.tool_cache import tool_cache
+from ai_platform.agents.usage import usage_recorder
+from ai_platform.agents.runtime import agents
+from ai_platform.apis.monitoring.loop_monitor import loop_monitor
+from ai_platform.llm.governor import llm_governor
+from ai_platform.settings import TOOL_CACHE_ENABLED, LLM_GOVERNOR_ENABLED
+from ai_platform.supafast.database import get_pool_stats
+from ai_platform.vectordb.embedding_cache import embedding_cache
+from ai_platform.vectordb.query_embeddings import query_embeddings
+from ai_platform.vectordb.store_registry import vector_stores
 
 router = APIRouter()
 
 
+def _pipeline_stats():
+    """Scrape time view of the counters kept by the caches, the LLM governor and the monitors"""
+    if agents.response_cache:
+        yield "agent_response_cache_entries", "gauge", "Answers in the semantic response cache", [
+            ({}, agents.response_cache.get_stats()["entries"])
+        ]
+    if TOOL_CACHE_ENABLED:
+        stats = tool_cache.get_stats()
+        yield "agent_tool_cache_lookups_total", "counter", "get_course_content cache lookups", [
+            ({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])
+        ]
+        yield "agent_tool_cache_entries", "gauge", "Tool results in the cache", [({}, stats["entries"])]
+    if agents.flights.enabled:
+        stats = agents.flights.get_stats()
+        yield "agent_singleflight_requests_total", "counter", "Answers generated (leader) or shared (follower)", [
+            ({"role": "leader"}, stats["leaders"]), ({"role": "follower"}, stats["followers"])
+        ]
+        yield "agent_singleflight_in_flight", "gauge", "Shared answers being generated", [({}, stats["in_flight"])]
+    yield "agent_stream_cancellations_total", "counter", "Streams stopped by a client disconnect", [
+        ({}, agents.cancellation_stats["streams"])
+    ]
+    yield "agent_cancelled_completion_tokens_total", "counter", "Tokens generated before a disconnect", [
+        ({}, agents.cancellation_stats["completion_tokens"])
+    ]
+    if LLM_GOVERNOR_ENABLED:
+        stats = llm_governor.get_stats()
+        yield "llm_governor_in_flight", "gauge", "LLM and embedding calls holding a slot", [({}, stats["in_flight"])]
+        yield "llm_governor_streams", "gauge", "Streamed answers holding a grant", [({}, stats["streams"])]
+        classes = stats["classes"].items()
+        yield "llm_governor_queued", "gauge", "Calls waiting for a slot", [
+            ({"priority": name}, values["queued"]) for name, values in classes
+        ]
+        yield "llm_governor_wait_p95_seconds", "gauge", "p95 wait for a slot over the recent calls", [
+            ({"priority": name}, values["p95_wait_ms"] / 1000) for name, values in classes
+        ]
+        yield "llm_governor_timeouts_total", "counter", "Calls that gave up waiting for a slot", [
+            ({"priority": name}, values["timeouts"]) for name, values in classes
+        ]
+    stores = vector_stores.get_stats()
+    yield "vector_store_handles", "gauge", "Collections with a live vector store handle", [
+        ({}, len(stores["collections"]))
+    ]
+    yield "vector_store_builds_total", "counter", "Vector store handles built, first use or after an eviction", [
+        ({}, stores["builds"])
+    ]
+    cache = embedding_cache.get_stats()
+    yield "embedding_cache_lookups_total", "counter", "Ingested chunks looked up in the embedding cache", [
+        ({}, cache["lookups"])
+    ]
+    yield "embedding_cache_hits_total", "counter", "Ingested chunks whose embedding was reused", [({}, cache["hits"])]
+    queries = query_embeddings.get_stats()
+    yield "query_embedding_cache_lookups_total", "counter", "Query embeddings looked up, by the tier that answered", [
+        ({"result": "hit"}, queries["hits"]),
+        ({"result": "shared_hit"}, queries["shared_hits"]),
+        ({"result": "miss"}, queries["misses"]),
+    ]
+    yield "query_embedding_cache_bytes", "gauge", "Memory held by cached query embeddings", [({}, queries["bytes"])]
+    usage = usage_recorder.get_stats()
+    yield "agent_usage_rows_pending", "gauge", "Usage rows buffered until the next flush", [({}, usage["pending"])]
+    yield "agent_usage_rows_dropped_total", "counter", "Usage rows dropped from a full buffer", [
+        ({}, usage["dropped"])
+    ]
+    yield "agent_usage_rows_rejected_total", "counter", "Usage rows dropped after the database rejected them", [
+        ({}, usage["rejected"])
+    ]
+    lag = loop_monitor.get_stats()
+    yield "event_loop_lag_p99_seconds", "gauge", "p99 event loop wake up delay over the recent window", [
+        ({}, lag["p99_ms"] / 1000)
+    ]
+    yield "db_pool_checked_out", "gauge", "Database connections in use", [({}, get_pool_stats()["checked_out"])]
+
+
+metrics.register_collector(_pipeline_stats)
+
+
 @router.get('/health')
 async def health_check():
     """
@@ -17,3 +107,72 @@ async def health_check():
     return {
         "response": "ok"
     }
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    **Prometheus Metrics API**
+
+    Agent pipeline metrics in the Prometheus text format, per `agent_id` and `model`: parser and retrieval
+    latency, time to first token, stream duration, prompt and completion tokens, tool calls and response cache
+    lookups, plus the cache, singleflight, LLM governor, event loop and pool counters.
+
+    **Returns:**
+    - `200 OK`: `text/plain; version=0.0.4`
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _enabled(stats: Optional[Dict]) -> Dict:
+    return {"enabled": False} if stats is None else {"enabled": True, **stats}
+
+
+# Component name -> its counters, served by /stats
+COMPONENT_STATS: Dict[str, Callable[[], Dict]] = {
+    "db_pool": get_pool_stats,
+    "event_loop": loop_monitor.get_stats,
+    "agent_router": lambda: _enabled(agents.router.get_stats() if agents.router else None),
+    "response_cache": lambda: _enabled(agents.response_cache.get_stats() if agents.response_cache else None),
+    "singleflight": lambda: _enabled(agents.flights.get_stats() if agents.flights.enabled else None),
+    "stream_cancellations": lambda: dict(agents.cancellation_stats),
+    "tool_cache": lambda: _enabled(tool_cache.get_stats() if TOOL_CACHE_ENABLED else None),
+    "llm_governor": lambda: _enabled(llm_governor.get_stats() if LLM_GOVERNOR_ENABLED else None),
+    "model_routing": lambda: agents.model_router.get_stats(),
+    "vector_stores": vector_stores.get_stats,
+    "embedding_cache": embedding_cache.get_stats,
+    "query_embeddings": query_embeddings.get_stats,
+    "usage_recorder": usage_recorder.get_stats,
+}
+
+
+@router.get('/stats')
+async def component_stats(
+        component: Optional[List[str]] = Query(None, description="Components to return, all by default")
+):
+    """
+    **Pipeline Stats API**
+
+    Returns the counters of the agent pipeline components of this worker, keyed by component. The counters
+    that matter for alerting are also exported on `/metrics`, this view holds the details (per class queues,
+    recent routing decisions, cached collections, ...) for debugging and the load benchmarks.
+
+    Components: `db_pool` (a `checked_out` count that keeps growing points to a leaked session), `event_loop`
+    (wake up lag, sustained lag means blocking work on the loop), `agent_router`, `response_cache`,
+    `singleflight`, `stream_cancellations`, `tool_cache`, `llm_governor`, `model_routing`, `vector_stores`,
+    `embedding_cache`, `query_embeddings` and `usage_recorder`. Optional components report `{"enabled": false}`
+    when they are turned off.
+
+    **Args:**
+        component (Optional[List[str]]): Components to return, repeat the parameter to select several
+            (`?component=db_pool&component=event_loop`).
+
+    **Returns:**
+    - `200 OK`: `{"db_pool": {"checked_out": int, ...}, "event_loop": {"p99_ms": float, ...}, ...}`
+    - `404 Not Found`: An unknown component was asked for.
+    """
+    names = component or list(COMPONENT_STATS)
+    unknown = [name for name in names if name not in COMPONENT_STATS]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown components: {', '.join(unknown)}")
+    return {name: COMPONENT_STATS[name]() for name in names}
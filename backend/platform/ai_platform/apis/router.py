@@ -1,7 +1,7 @@
 from fastapi.routing import APIRouter
 
 
-from ai_platform.apis import monitoring, agents,auth, courses, students, admin,conversations
+from ai_platform.apis import monitoring, agents,auth, courses, students, admin,conversations, usage
 from ai_platform.apis.students import profile
 from ai_platform.apis.admin import weekwiseOperations
 api_router = APIRouter()
@@ -10,6 +10,7 @@ api_router.include_router(monitoring.router, prefix="/monitoring", tags=["monito
 api_router.include_router(agents.router, prefix="/agent", tags=["Agent APIs"])
 api_router.include_router(auth.router, prefix="/auth", tags=["Auth APIs"])
 api_router.include_router(conversations.router, prefix="/conversation", tags=["Conversation APIs"])
+api_router.include_router(usage.router, prefix="/usage", tags=["Usage APIs"])
 api_router.include_router(courses.router, prefix="/student", tags=["Student Apis"])
 api_router.include_router(profile.router, prefix="/student", tags=["Student Apis"])
 api_router.include_router(students.router, prefix="/student", tags=["Student Apis"])
@@ -0,0 +1,4 @@
+"""API for LLM usage and cost accounting"""
+from ai_platform.apis.usage.view import router
+
+__all__ = ["router"]
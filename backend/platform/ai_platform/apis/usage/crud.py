@@ -0,0 +1,78 @@
+import uuid
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ai_platform.supafast.models.ai_agent import AiAgent
+from ai_platform.supafast.models.llm_usage import LlmUsage
+
+
+def _totals():
+    return (
+        func.count(LlmUsage.id).label("calls"),
+        func.coalesce(func.sum(LlmUsage.prompt_tokens), 0).label("prompt_tokens"),
+        func.coalesce(func.sum(LlmUsage.completion_tokens), 0).label("completion_tokens"),
+        func.coalesce(func.sum(LlmUsage.cost_usd), 0.0).label("cost_usd"),
+        func.avg(LlmUsage.latency_ms).label("avg_latency_ms"),
+    )
+
+
+def _in_range(query, start: date, end: date, agent_id: int = None, course_id: int = None):
+    """Rows created from the start of `start` to the end of `end`, both days included"""
+    query = query.filter(LlmUsage.created_at >= datetime.combine(start, time.min),
+                         LlmUsage.created_at < datetime.combine(end + timedelta(days=1), time.min))
+    if agent_id is not None:
+        query = query.filter(LlmUsage.agent_id == agent_id)
+    if course_id is not None:
+        query = query.filter(LlmUsage.course_id == course_id)
+    return query
+
+
+def _row(row) -> Dict:
+    values = dict(row._mapping)
+    if values["avg_latency_ms"] is not None:
+        values["avg_latency_ms"] = round(float(values["avg_latency_ms"]), 1)
+    return values
+
+
+def usage_by_day(db: Session, start: date, end: date, agent_id: int = None, course_id: int = None) -> List[Dict]:
+    day = func.date(LlmUsage.created_at).label("day")
+    query = _in_range(db.query(day, *_totals()), start, end, agent_id, course_id)
+    return [_row(row) for row in query.group_by(day).order_by(day).all()]
+
+
+def usage_by_agent(db: Session, start: date, end: date, course_id: int = None) -> List[Dict]:
+    query = db.query(LlmUsage.agent_id, AiAgent.name.label("agent_name"), *_totals()) \
+        .outerjoin(AiAgent, AiAgent.id == LlmUsage.agent_id)
+    query = _in_range(query, start, end, course_id=course_id)
+    rows = query.group_by(LlmUsage.agent_id, AiAgent.name).order_by(func.sum(LlmUsage.cost_usd).desc()).all()
+    return [_row(row) for row in rows]
+
+
+def usage_by_course(db: Session, start: date, end: date, agent_id: int = None) -> List[Dict]:
+    query = _in_range(db.query(LlmUsage.course_id, *_totals()), start, end, agent_id=agent_id)
+    rows = query.group_by(LlmUsage.course_id).order_by(func.sum(LlmUsage.cost_usd).desc()).all()
+    return [_row(row) for row in rows]
+
+
+def conversation_usage(db: Session, conversation_id: uuid.UUID) -> Dict:
+    """Totals of a conversation and their split per kind of call, None when nothing was accounted to it"""
+    rows = db.query(LlmUsage.kind, *_totals()).filter(LlmUsage.conversation_id == conversation_id) \
+        .group_by(LlmUsage.kind).order_by(LlmUsage.kind).all()
+    if not rows:
+        return None
+    kinds = [_row(row) for row in rows]
+    calls = sum(kind["calls"] for kind in kinds)
+    latency_total = sum(kind["avg_latency_ms"] * kind["calls"] for kind in kinds if kind["avg_latency_ms"] is not None)
+    timed_calls = sum(kind["calls"] for kind in kinds if kind["avg_latency_ms"] is not None)
+    return {
+        "conversation_id": conversation_id,
+        "calls": calls,
+        "prompt_tokens": sum(kind["prompt_tokens"] for kind in kinds),
+        "completion_tokens": sum(kind["completion_tokens"] for kind in kinds),
+        "cost_usd": sum(kind["cost_usd"] for kind in kinds),
+        "avg_latency_ms": round(latency_total / timed_calls, 1) if timed_calls else None,
+        "kinds": kinds,
+    }
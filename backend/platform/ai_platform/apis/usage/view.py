@@ -0,0 +1,67 @@
+import uuid
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from ai_platform.apis.usage import crud
+from ai_platform.schemas.usage import DailyUsage, AgentUsage, CourseUsage, ConversationUsage
+from ai_platform.supafast.database import get_db
+
+router = APIRouter()
+
+
+def _date_range(start: Optional[date], end: Optional[date]):
+    """Defaults to the last 30 days, today included"""
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return start, end
+
+
+@router.get("/daily", response_model=List[DailyUsage])
+def daily_usage(
+        start: Optional[date] = Query(None, description="First day, defaults to 30 days ago"),
+        end: Optional[date] = Query(None, description="Last day, defaults to today (UTC)"),
+        agent_id: Optional[int] = None,
+        course_id: Optional[int] = None,
+        db: Session = Depends(get_db)
+):
+    """Calls, tokens and cost of the LLM completions per day"""
+    start, end = _date_range(start, end)
+    return crud.usage_by_day(db, start, end, agent_id=agent_id, course_id=course_id)
+
+
+@router.get("/agents", response_model=List[AgentUsage])
+def usage_per_agent(
+        start: Optional[date] = Query(None, description="First day, defaults to 30 days ago"),
+        end: Optional[date] = Query(None, description="Last day, defaults to today (UTC)"),
+        course_id: Optional[int] = None,
+        db: Session = Depends(get_db)
+):
+    """Calls, tokens and cost of the LLM completions per agent, most expensive first"""
+    start, end = _date_range(start, end)
+    return crud.usage_by_agent(db, start, end, course_id=course_id)
+
+
+@router.get("/courses", response_model=List[CourseUsage])
+def usage_per_course(
+        start: Optional[date] = Query(None, description="First day, defaults to 30 days ago"),
+        end: Optional[date] = Query(None, description="Last day, defaults to today (UTC)"),
+        agent_id: Optional[int] = None,
+        db: Session = Depends(get_db)
+):
+    """Calls, tokens and cost of the LLM completions per course, most expensive first"""
+    start, end = _date_range(start, end)
+    return crud.usage_by_course(db, start, end, agent_id=agent_id)
+
+
+@router.get("/conversation/{conversation_id}", response_model=ConversationUsage)
+def usage_of_conversation(conversation_id: uuid.UUID, db: Session = Depends(get_db)):
+    """Calls, tokens and cost of a conversation, split into answers, tool follow ups, parser calls and summaries"""
+    usage = crud.conversation_usage(db, conversation_id)
+    if not usage:
+        raise HTTPException(status_code=404, detail="No usage recorded for this conversation")
+    return usage
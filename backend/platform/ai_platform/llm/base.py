@@ -0,0 +1,80 @@
+import inspect
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, AsyncIterator, Iterator, List
+
+import anyio
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from ai_platform.settings import EMBEDDING_MODEL
+
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+
+
+class LLMProvider(ABC):
+    """
+    Chat, streaming chat (with tool calls) and embeddings behind one interface.
+
+    Chat params are the OpenAI chat completion params (messages, model, tools, tool_choice, temperature,
+    max_tokens, response_format, ...) and results are the OpenAI SDK types, so callers parse the responses
+    of every provider the same way. Sync variants exist for the code that isn't async yet.
+    A provider implements every abstract method, an incomplete one fails when it is instantiated.
+    """
+    name = "base"
+
+    @abstractmethod
+    async def chat(self, **params) -> ChatCompletion:
+        ...
+
+    @abstractmethod
+    async def stream_chat(self, **params) -> AsyncIterator[ChatCompletionChunk]:
+        """
+        Start a streamed completion, errors of the request itself are raised here rather than mid-stream.
+        A caller that stops reading early closes the stream with `close_stream`.
+        """
+
+    @abstractmethod
+    async def embed(self, texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
+        ...
+
+    @abstractmethod
+    def chat_sync(self, **params) -> ChatCompletion:
+        ...
+
+    @abstractmethod
+    def stream_chat_sync(self, **params) -> Iterator[ChatCompletionChunk]:
+        ...
+
+    @abstractmethod
+    def embed_sync(self, texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
+        ...
+
+    def langchain_embeddings(self, model: str = EMBEDDING_MODEL) -> "Embeddings":
+        """Embeddings for the langchain vector stores (PgvectorDB), built on first use and shared by every store"""
+        cache = self.__dict__.setdefault("_langchain_embeddings", {})
+        if model not in cache:
+            from ai_platform.llm.embeddings import ProviderEmbeddings
+
+            cache[model] = ProviderEmbeddings(self, model)
+        return cache[model]
+
+    def preload(self) -> None:
+        """Build what is otherwise built on first use, see LLM_PRELOAD"""
+        self.langchain_embeddings()
+
+    async def aclose(self) -> None:
+        """Release the HTTP clients of the provider, called on shutdown"""
+
+
+async def close_stream(stream) -> None:
+    """
+    Close a chat stream that wasn't read to the end, the provider stops generating once its HTTP response is closed.
+    Shielded from cancellation, it typically runs while the request that read the stream is being cancelled.
+    """
+    close = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+    if close is None:
+        return
+    with anyio.CancelScope(shield=True):
+        result = close()
+        if inspect.isawaitable(result):
+            await result
@@ -0,0 +1,71 @@
+"""
+Langchain Embeddings adapters of the providers, used by the vector stores.
+Imported on the first `langchain_embeddings()` call, workers that never touch a vector store don't load langchain.
+"""
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from ai_platform.agents.tokens import count_tokens
+from ai_platform.llm.base import LLMProvider
+from ai_platform.llm.governor import LLMGovernor
+from ai_platform.settings import EMBEDDING_MODEL, LLM_EMBED_BATCH_SIZE
+
+
+class ProviderEmbeddings(Embeddings):
+    """Langchain Embeddings adapter over a provider's embed calls"""
+
+    def __init__(self, provider: LLMProvider, model: str = EMBEDDING_MODEL):
+        self.provider = provider
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.provider.embed_sync(texts, model=self.model)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.provider.embed_sync([text], model=self.model)[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.provider.embed(texts, model=self.model)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.provider.embed([text], model=self.model))[0]
+
+
+class GovernedEmbeddings(Embeddings):
+    """
+    Langchain embeddings through the governor. Documents are embedded in batches of `batch_size`, each batch
+    queues on its own so a large ingestion can't hold the limits while interactive queries wait.
+    """
+
+    def __init__(self, embeddings: Embeddings, governor: LLMGovernor, batch_size: int = LLM_EMBED_BATCH_SIZE):
+        self.embeddings = embeddings
+        self.governor = governor
+        self.batch_size = batch_size
+
+    def _batches(self, texts: List[str]):
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            yield batch, sum(count_tokens(text) for text in batch)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for batch, tokens in self._batches(texts):
+            with self.governor.slot_sync(tokens):
+                vectors.extend(self.embeddings.embed_documents(batch))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.governor.slot_sync(count_tokens(text)):
+            return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for batch, tokens in self._batches(texts):
+            async with self.governor.slot(tokens):
+                vectors.extend(await self.embeddings.aembed_documents(batch))
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async with self.governor.slot(count_tokens(text)):
+            return await self.embeddings.aembed_query(text)
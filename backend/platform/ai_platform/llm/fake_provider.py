@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from itertools import count
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ChatCompletionMessage, \
+    ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_chunk import Choice as ChunkChoice, ChoiceDelta, ChoiceDeltaToolCall, \
+    ChoiceDeltaToolCallFunction
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+from ai_platform.agents.tokens import count_tokens
+from ai_platform.agents.vector_math import normalize
+from ai_platform.llm.base import LLMProvider
+from ai_platform.settings import EMBEDDING_MODEL, FAKE_LLM_LATENCY_MS, FAKE_LLM_TOKENS_PER_SEC, \
+    FAKE_LLM_REPLY_TOKENS, FAKE_LLM_TOOL_SCRIPT
+
+WORD_PATTERN = re.compile(r"\w+")
+VOCABULARY = (
+    "course week lecture assignment data model students learn practice concept example review "
+    "module topic question answer guide notes video summary deadline graded quiz project"
+).split()
+DEFAULT_JSON_REPLY = {"vector_index": "general", "agent": "general_agent"}
+
+
+class FakeProvider(LLMProvider):
+    """
+    Deterministic in-process stand-in for the OpenAI API, for load tests and CI.
+
+    - The reply to a request is derived from a hash of its messages, the same request always gets the same answer.
+    - `latency_ms` passes before the first streamed token (or before a whole completion), then streamed tokens
+      are released at `tokens_per_sec` (0 = no delay).
+    - `tool_script` is a list of model turns replayed by position: the n-th model turn after the last user
+      message plays `tool_script[n]`, either {"tool_calls": [{"name": ..., "arguments": {...}}]} or
+      {"content": "..."}. Turns past the end of the script, or with tool_choice "none", answer with text.
+    - `response_format` json_object requests get `json_reply`.
+    - Embeddings are hashed bags of words, texts sharing words are similar so caches and routers behave realistically.
+    """
+    name = "fake"
+
+    def __init__(self, latency_ms: float = FAKE_LLM_LATENCY_MS, tokens_per_sec: float = FAKE_LLM_TOKENS_PER_SEC,
+                 reply_tokens: int = FAKE_LLM_REPLY_TOKENS, tool_script: Optional[List[Dict]] = None,
+                 json_reply: Optional[Dict] = None, embedding_dim: int = 256, embed_latency_ms: float = None):
+        self.latency = latency_ms / 1000
+        self.token_delay = 1 / tokens_per_sec if tokens_per_sec else 0
+        self.reply_tokens = reply_tokens
+        self.tool_script = tool_script or []
+        self.json_reply = json_reply or DEFAULT_JSON_REPLY
+        self.embedding_dim = embedding_dim
+        self.embed_latency = (latency_ms / 10 if embed_latency_ms is None else embed_latency_ms) / 1000
+        self.requests: List[Dict] = []  # params of every chat request, for assertions in tests
+        self._ids = count(1)
+
+    @classmethod
+    def from_settings(cls) -> "FakeProvider":
+        return cls(tool_script=json.loads(FAKE_LLM_TOOL_SCRIPT) if FAKE_LLM_TOOL_SCRIPT else None)
+
+    # Turn planning
+
+    def _plan(self, params: Dict) -> Dict:
+        """What the model says for this request: {"content": str} or {"tool_calls": [...]}"""
+        self.requests.append(params)
+        messages = params.get("messages") or []
+        if (params.get("response_format") or {}).get("type") == "json_object":
+            return {"content": json.dumps(self.json_reply)}
+
+        last_user = max((i for i, msg in enumerate(messages) if msg.get("role") == "user"), default=-1)
+        turn = sum(1 for msg in messages[last_user + 1:] if msg.get("role") == "assistant")
+        tools_allowed = params.get("tools") and params.get("tool_choice") != "none"
+        if turn < len(self.tool_script):
+            step = self.tool_script[turn]
+            if "tool_calls" not in step:
+                return {"content": step["content"]}
+            if tools_allowed:
+                return {"tool_calls": step["tool_calls"]}
+        return {"content": self._reply_text(messages, params.get("model"))}
+
+    def _reply_text(self, messages: List[Dict], model: str) -> str:
+        seed = hashlib.sha256(json.dumps([model, messages], sort_keys=True, default=str).encode()).digest()
+        rng = random.Random(seed)
+        return " ".join(rng.choice(VOCABULARY) for _ in range(self.reply_tokens)) + "."
+
+    @staticmethod
+    def _usage(params: Dict, completion_tokens: int) -> CompletionUsage:
+        prompt_tokens = sum(4 + count_tokens(str(msg.get("content") or "")) for msg in params.get("messages") or [])
+        return CompletionUsage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                               total_tokens=prompt_tokens + completion_tokens)
+
+    def _tool_call_id(self) -> str:
+        return f"call_fake_{next(self._ids)}"
+
+    # Non-streamed completions
+
+    def _completion(self, params: Dict) -> ChatCompletion:
+        plan = self._plan(params)
+        tool_calls = None
+        if "tool_calls" in plan:
+            tool_calls = [
+                ChatCompletionMessageToolCall(id=self._tool_call_id(), type="function", function=Function(
+                    name=call["name"], arguments=json.dumps(call.get("arguments", {}))))
+                for call in plan["tool_calls"]
+            ]
+        content = plan.get("content")
+        return ChatCompletion(
+            id=f"chatcmpl-fake-{next(self._ids)}",
+            object="chat.completion",
+            created=int(time.time()),
+            model=params.get("model") or "fake",
+            choices=[Choice(index=0, finish_reason="tool_calls" if tool_calls else "stop",
+                            message=ChatCompletionMessage(role="assistant", content=content, tool_calls=tool_calls))],
+            usage=self._usage(params, count_tokens(content) if content else 10 * len(tool_calls)),
+        )
+
+    async def chat(self, **params) -> ChatCompletion:
+        await asyncio.sleep(self.latency)
+        return self._completion(params)
+
+    def chat_sync(self, **params) -> ChatCompletion:
+        time.sleep(self.latency)
+        return self._completion(params)
+
+    # Streamed completions, yields (delay before the chunk, chunk)
+
+    def _chunks(self, params: Dict) -> Iterator[tuple]:
+        plan = self._plan(params)
+        chunk_id, model = f"chatcmpl-fake-{next(self._ids)}", params.get("model") or "fake"
+
+        def chunk(delta: ChoiceDelta = None, finish_reason: str = None, usage: CompletionUsage = None):
+            choices = [] if delta is None else [ChunkChoice(index=0, delta=delta, finish_reason=finish_reason)]
+            return ChatCompletionChunk(id=chunk_id, object="chat.completion.chunk", created=int(time.time()),
+                                       model=model, choices=choices, usage=usage)
+
+        completion_tokens = 0
+        if "tool_calls" in plan:
+            for index, call in enumerate(plan["tool_calls"]):
+                arguments = json.dumps(call.get("arguments", {}))
+                middle = len(arguments) // 2
+                # Name first, then the arguments in two fragments, like the real stream
+                yield self.latency if index == 0 else 0, chunk(ChoiceDelta(tool_calls=[ChoiceDeltaToolCall(
+                    index=index, id=self._tool_call_id(), type="function",
+                    function=ChoiceDeltaToolCallFunction(name=call["name"], arguments=""))]))
+                for fragment in (arguments[:middle], arguments[middle:]):
+                    yield 0, chunk(ChoiceDelta(tool_calls=[ChoiceDeltaToolCall(
+                        index=index, function=ChoiceDeltaToolCallFunction(arguments=fragment))]))
+                completion_tokens += 10
+            yield 0, chunk(ChoiceDelta(), finish_reason="tool_calls")
+        else:
+            words = plan["content"].split(" ")
+            for index, word in enumerate(words):
+                text = word if index == 0 else " " + word
+                yield self.latency if index == 0 else self.token_delay, chunk(ChoiceDelta(content=text))
+            completion_tokens = len(words)
+            yield 0, chunk(ChoiceDelta(), finish_reason="stop")
+        if (params.get("stream_options") or {}).get("include_usage"):
+            yield 0, chunk(usage=self._usage(params, completion_tokens))
+
+    async def stream_chat(self, **params) -> AsyncIterator[ChatCompletionChunk]:
+        chunks = self._chunks(params)
+
+        async def stream():
+            for delay, chunk in chunks:
+                if delay:
+                    await asyncio.sleep(delay)
+                yield chunk
+
+        return stream()
+
+    def stream_chat_sync(self, **params) -> Iterator[ChatCompletionChunk]:
+        for delay, chunk in self._chunks(params):
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+    # Embeddings
+
+    def _embed_text(self, text: str) -> List[float]:
+        vector = [0.0] * self.embedding_dim
+        for word in WORD_PATTERN.findall(text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "big")
+            vector[digest % self.embedding_dim] += 1.0 if digest >> 63 else -1.0
+        if not any(vector):
+            vector[0] = 1.0
+        return normalize(vector)
+
+    async def embed(self, texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
+        await asyncio.sleep(self.embed_latency)
+        return [self._embed_text(text) for text in texts]
+
+    def embed_sync(self, texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
+        time.sleep(self.embed_latency)
+        return [self._embed_text(text) for text in texts]
@@ -0,0 +1,457 @@
+import asyncio
+import bisect
+import contextvars
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from itertools import count
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from ai_platform.agents.tokens import count_tokens
+from ai_platform.llm.base import LLMProvider, close_stream
+from ai_platform.settings import EMBEDDING_MODEL, LLM_MAX_CONCURRENT, LLM_MAX_STREAMS, LLM_REQUESTS_PER_MIN, \
+    LLM_TOKENS_PER_MIN, LLM_QUEUE_TIMEOUT_SEC, LLM_BACKGROUND_QUEUE_TIMEOUT_SEC, LLM_INGESTION_QUEUE_TIMEOUT_SEC, \
+    LLM_COMPLETION_TOKENS_ESTIMATE
+
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+
+# Priority classes, lower is served first
+INTERACTIVE, BACKGROUND, INGESTION = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background", INGESTION: "ingestion"}
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """
+    Run the LLM calls of the block with `priority`.
+    The priority is a context variable, it follows the calls into tasks and `asyncio.to_thread` workers.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class LLMQueueTimeout(Exception):
+    """An LLM call waited longer than its priority class allows for a slot"""
+
+
+class TokenBucket:
+    """Refills `per_minute` units a minute up to one minute worth, `per_minute <= 0` is unlimited"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken, a request larger than the bucket waits for a full bucket"""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if not self.unlimited:
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        """Charge (or refund, negative) the difference between the reserved and the actual usage"""
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level - amount)
+
+
+class Grant:
+    """A slot handed out by the governor, `used_tokens` is set by the caller when the usage is known"""
+    __slots__ = ("tokens", "used_tokens", "priority", "stream", "released")
+
+    def __init__(self, tokens: int, priority: int, stream: bool = False):
+        self.tokens = tokens
+        self.used_tokens: Optional[int] = None
+        self.priority = priority
+        self.stream = stream
+        self.released = False
+
+
+class _Waiter:
+    __slots__ = ("order", "tokens", "priority", "stream", "deadline", "enqueued", "wake", "granted")
+
+    def __init__(self, order, tokens: int, priority: int, stream: bool, timeout: float, wake: Callable[[], None]):
+        self.order = order
+        self.tokens = tokens
+        self.priority = priority
+        self.stream = stream
+        self.enqueued = time.monotonic()
+        self.deadline = self.enqueued + timeout
+        self.wake = wake
+        self.granted = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return self.order < other.order
+
+
+class LLMGovernor:
+    """
+    Process wide limits on outbound LLM and embedding calls: concurrent calls, requests per minute and
+    tokens per minute (token buckets, estimated up front and corrected with the reported usage).
+
+    Streamed answers are not counted against `max_concurrent`, a stream stays open for the whole answer and
+    would otherwise turn it into a cap on simultaneous chats. They take from the rate buckets like any call
+    and have their own `max_streams` limit (0, the default, leaves them limited by the rate buckets only).
+
+    Callers queue by priority class and then arrival, only the head of the queue is granted a slot so
+    interactive chat overtakes queued background work and ingestion. A call waits at most its class's
+    queue timeout and then fails with LLMQueueTimeout instead of piling up behind a provider rate limit.
+    Async and sync (worker thread) callers share one queue.
+    """
+
+    def __init__(self, max_concurrent: int = LLM_MAX_CONCURRENT, requests_per_min: float = LLM_REQUESTS_PER_MIN,
+                 tokens_per_min: float = LLM_TOKENS_PER_MIN, queue_timeouts: Dict[int, float] = None,
+                 max_streams: int = LLM_MAX_STREAMS):
+        self.max_concurrent = max_concurrent
+        self.max_streams = max_streams
+        self.requests = TokenBucket(requests_per_min)
+        self.tokens = TokenBucket(tokens_per_min)
+        self.queue_timeouts = queue_timeouts or {
+            INTERACTIVE: LLM_QUEUE_TIMEOUT_SEC,
+            BACKGROUND: LLM_BACKGROUND_QUEUE_TIMEOUT_SEC,
+            INGESTION: LLM_INGESTION_QUEUE_TIMEOUT_SEC,
+        }
+        self.in_flight = 0
+        self.streams = 0
+        self._queue: List[_Waiter] = []  # sorted by (priority, arrival)
+        self._seq = count()
+        self._lock = threading.Lock()
+        self._waits = {priority: deque(maxlen=500) for priority in PRIORITY_NAMES}
+        self.stats = {name: {"granted": 0, "timeouts": 0} for name in PRIORITY_NAMES.values()}
+
+    def _enqueue(self, tokens: int, priority: Optional[int], stream: bool, wake: Callable[[], None]) -> _Waiter:
+        priority = _priority.get() if priority is None else priority
+        with self._lock:
+            waiter = _Waiter((priority, next(self._seq)), tokens, priority, stream, self.queue_timeouts[priority],
+                             wake)
+            bisect.insort(self._queue, waiter)
+        return waiter
+
+    def _attempt(self, waiter: _Waiter) -> Optional[float]:
+        """0 when the slot was granted, else seconds until a bucket refills or None to wait for a release"""
+        with self._lock:
+            if self._queue[0] is not waiter:
+                return None
+            if waiter.stream and 0 < self.max_streams <= self.streams:
+                return None
+            if not waiter.stream and 0 < self.max_concurrent <= self.in_flight:
+                return None
+            now = time.monotonic()
+            delay = max(self.requests.wait_time(1, now), self.tokens.wait_time(waiter.tokens, now))
+            if delay > 0:
+                return delay
+            self.requests.take(1)
+            self.tokens.take(waiter.tokens)
+            if waiter.stream:
+                self.streams += 1
+            else:
+                self.in_flight += 1
+            self._queue.pop(0)
+            waiter.granted = True
+            self._waits[waiter.priority].append(now - waiter.enqueued)
+            self.stats[PRIORITY_NAMES[waiter.priority]]["granted"] += 1
+        self._wake_head()
+        return 0.0
+
+    def _leave(self, waiter: _Waiter) -> None:
+        with self._lock:
+            index = bisect.bisect_left(self._queue, waiter)
+            if index < len(self._queue) and self._queue[index] is waiter:
+                self._queue.pop(index)
+        self._wake_head()
+
+    def _wake_head(self) -> None:
+        with self._lock:
+            head = self._queue[0] if self._queue else None
+        if head:
+            head.wake()
+
+    def _timed_out(self, waiter: _Waiter) -> LLMQueueTimeout:
+        with self._lock:
+            self.stats[PRIORITY_NAMES[waiter.priority]]["timeouts"] += 1
+        return LLMQueueTimeout(
+            f"No LLM slot within {self.queue_timeouts[waiter.priority]}s ({PRIORITY_NAMES[waiter.priority]})"
+        )
+
+    async def acquire(self, tokens: int, priority: int = None, stream: bool = False) -> Grant:
+        """A slot for one call, `stream` for a streamed answer (see the class docstring)"""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # loop closed
+                pass
+
+        waiter = self._enqueue(tokens, priority, stream, wake)
+        try:
+            while True:
+                event.clear()
+                delay = self._attempt(waiter)
+                if delay == 0:
+                    return Grant(tokens, waiter.priority, stream)
+                remaining = waiter.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._timed_out(waiter)
+                try:
+                    await asyncio.wait_for(event.wait(), remaining if delay is None else min(delay, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if not waiter.granted:
+                self._leave(waiter)
+
+    def acquire_sync(self, tokens: int, priority: int = None, stream: bool = False) -> Grant:
+        """Blocking variant for worker threads, never call it on the event loop"""
+        event = threading.Event()
+        waiter = self._enqueue(tokens, priority, stream, event.set)
+        try:
+            while True:
+                event.clear()
+                delay = self._attempt(waiter)
+                if delay == 0:
+                    return Grant(tokens, waiter.priority, stream)
+                remaining = waiter.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._timed_out(waiter)
+                event.wait(remaining if delay is None else min(delay, remaining))
+        finally:
+            if not waiter.granted:
+                self._leave(waiter)
+
+    def release(self, grant: Grant) -> None:
+        """Give the slot back, releasing a grant again is a no-op"""
+        with self._lock:
+            if grant.released:
+                return
+            grant.released = True
+            if grant.stream:
+                self.streams -= 1
+            else:
+                self.in_flight -= 1
+            if grant.used_tokens is not None:
+                self.tokens.adjust(grant.used_tokens - grant.tokens)
+        self._wake_head()
+
+    @asynccontextmanager
+    async def slot(self, tokens: int, priority: int = None):
+        grant = await self.acquire(tokens, priority)
+        try:
+            yield grant
+        finally:
+            self.release(grant)
+
+    @contextmanager
+    def slot_sync(self, tokens: int, priority: int = None):
+        grant = self.acquire_sync(tokens, priority)
+        try:
+            yield grant
+        finally:
+            self.release(grant)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for waiter in self._queue:
+                depth[PRIORITY_NAMES[waiter.priority]] += 1
+            classes = {}
+            for priority, name in PRIORITY_NAMES.items():
+                waits = sorted(self._waits[priority])
+                classes[name] = {
+                    **self.stats[name],
+                    "queued": depth[name],
+                    "avg_wait_ms": round(sum(waits) / len(waits) * 1000, 2) if waits else 0.0,
+                    "p95_wait_ms": round(waits[int(len(waits) * 0.95)] * 1000, 2) if waits else 0.0,
+                }
+            return {
+                "in_flight": self.in_flight,
+                "max_concurrent": self.max_concurrent,
+                "streams": self.streams,
+                "max_streams": self.max_streams,
+                "queued": len(self._queue),
+                "requests_available": None if self.requests.unlimited else int(self.requests.level),
+                "tokens_available": None if self.tokens.unlimited else int(self.tokens.level),
+                "classes": classes,
+            }
+
+
+def estimate_chat_tokens(params: Dict) -> int:
+    """Prompt tokens plus the completion budget, reserved before the call and corrected with the usage"""
+    prompt = sum(4 + count_tokens(str(message.get("content") or "")) for message in params.get("messages") or [])
+    return prompt + (params.get("max_tokens") or LLM_COMPLETION_TOKENS_ESTIMATE)
+
+
+def _usage_tokens(result) -> Optional[int]:
+    usage = getattr(result, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage else None
+
+
+class GovernedStream:
+    """
+    A provider stream holding a governor grant, returned by `GovernedProvider.stream_chat`.
+
+    The grant is released once, when the stream ends, fails or is closed, and closing works whether or not the
+    stream was iterated: a request cancelled before its first chunk calls `aclose` (via `close_stream`) like one
+    cancelled mid-answer. A stream dropped without being closed releases its grant when it is garbage collected.
+    """
+
+    def __init__(self, stream: AsyncIterator[ChatCompletionChunk], governor: LLMGovernor, grant: Grant):
+        self.stream = stream
+        self.grant = grant
+        self._iterator = None
+        self._closed = False
+        self._release = weakref.finalize(self, governor.release, grant)
+
+    def __aiter__(self) -> "GovernedStream":
+        return self
+
+    async def __anext__(self) -> ChatCompletionChunk:
+        if self._closed:
+            raise StopAsyncIteration
+        if self._iterator is None:
+            self._iterator = self.stream.__aiter__()
+        try:
+            chunk = await self._iterator.__anext__()
+        except BaseException:
+            await self.aclose()
+            raise
+        self.grant.used_tokens = _usage_tokens(chunk) or self.grant.used_tokens
+        return chunk
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await close_stream(self.stream)
+        finally:
+            self._release()
+
+
+class GovernedSyncStream:
+    """Blocking counterpart of GovernedStream, for `stream_chat_sync`"""
+
+    def __init__(self, stream: Iterator[ChatCompletionChunk], governor: LLMGovernor, grant: Grant):
+        self.stream = stream
+        self.grant = grant
+        self._iterator = None
+        self._closed = False
+        self._release = weakref.finalize(self, governor.release, grant)
+
+    def __iter__(self) -> "GovernedSyncStream":
+        return self
+
+    def __next__(self) -> ChatCompletionChunk:
+        if self._closed:
+            raise StopIteration
+        if self._iterator is None:
+            self._iterator = iter(self.stream)
+        try:
+            chunk = next(self._iterator)
+        except BaseException:
+            self.close()
+            raise
+        self.grant.used_tokens = _usage_tokens(chunk) or self.grant.used_tokens
+        return chunk
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if hasattr(self.stream, "close"):
+                self.stream.close()
+        finally:
+            self._release()
+
+
+class GovernedProvider(LLMProvider):
+    """Routes every call of a provider through the governor, a stream holds its grant until it ends or is closed"""
+
+    def __init__(self, provider: LLMProvider, governor: LLMGovernor):
+        self.provider = provider
+        self.governor = governor
+        self.name = provider.name
+        self._langchain_embeddings = {}
+
+    async def chat(self, **params) -> ChatCompletion:
+        async with self.governor.slot(estimate_chat_tokens(params)) as grant:
+            completion = await self.provider.chat(**params)
+            grant.used_tokens = _usage_tokens(completion)
+            return completion
+
+    async def stream_chat(self, **params) -> AsyncIterator[ChatCompletionChunk]:
+        grant = await self.governor.acquire(estimate_chat_tokens(params), stream=True)
+        try:
+            stream = await self.provider.stream_chat(**params)
+        except BaseException:
+            self.governor.release(grant)
+            raise
+        return GovernedStream(stream, self.governor, grant)
+
+    async def embed(self, texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
+        async with self.governor.slot(sum(count_tokens(text) for text in texts)):
+            return await self.provider.embed(texts, model=model)
+
+    def chat_sync(self, **params) -> ChatCompletion:
+        with self.governor.slot_sync(estimate_chat_tokens(params)) as grant:
+            completion = self.provider.chat_sync(**params)
+            grant.used_tokens = _usage_tokens(completion)
+            return completion
+
+    def stream_chat_sync(self, **params) -> Iterator[ChatCompletionChunk]:
+        grant = self.governor.acquire_sync(estimate_chat_tokens(params), stream=True)
+        try:
+            stream = self.provider.stream_chat_sync(**params)
+        except BaseException:
+            self.governor.release(grant)
+            raise
+        return GovernedSyncStream(stream, self.governor, grant)
+
+    def embed_sync(self, texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
+        with self.governor.slot_sync(sum(count_tokens(text) for text in texts)):
+            return self.provider.embed_sync(texts, model=model)
+
+    def langchain_embeddings(self, model: str = EMBEDDING_MODEL) -> "Embeddings":
+        if model not in self._langchain_embeddings:
+            from ai_platform.llm.embeddings import GovernedEmbeddings
+
+            self._langchain_embeddings[model] = GovernedEmbeddings(
+                self.provider.langchain_embeddings(model), self.governor
+            )
+        return self._langchain_embeddings[model]
+
+    def preload(self) -> None:
+        self.provider.preload()
+        self.langchain_embeddings()
+
+    async def aclose(self) -> None:
+        await self.provider.aclose()
+
+
+llm_governor = LLMGovernor()
@@ -0,0 +1,88 @@
+import os
+import threading
+from typing import TYPE_CHECKING, AsyncIterator, Iterator, List
+
+from openai import AsyncOpenAI, OpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from ai_platform.llm.base import LLMProvider
+from ai_platform.settings import EMBEDDING_MODEL
+
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+
+
+class OpenAIProvider(LLMProvider):
+    """
+    The OpenAI API, one async and one sync client shared by every caller.
+    The clients (and the langchain embeddings) are built on first use, a worker only pays for what it calls.
+    """
+    name = "openai"
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self._async_client = None
+        self._sync_client = None
+        self._lock = threading.Lock()
+        self._langchain_embeddings = {}
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = AsyncOpenAI(api_key=self.api_key)
+        return self._async_client
+
+    @property
+    def sync_client(self) -> OpenAI:
+        if self._sync_client is None:
+            with self._lock:
+                if self._sync_client is None:
+                    self._sync_client = OpenAI(api_key=self.api_key)
+        return self._sync_client
+
+    async def chat(self, **params) -> ChatCompletion:
+        return await self.async_client.chat.completions.create(**params)
+
+    async def stream_chat(self, **params) -> AsyncIterator[ChatCompletionChunk]:
+        return await self.async_client.chat.completions.create(stream=True, **params)
+
+    async def embed(self, texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
+        response = await self.async_client.embeddings.create(model=model, input=texts)
+        return [item.embedding for item in response.data]
+
+    def chat_sync(self, **params) -> ChatCompletion:
+        return self.sync_client.chat.completions.create(**params)
+
+    def stream_chat_sync(self, **params) -> Iterator[ChatCompletionChunk]:
+        return self.sync_client.chat.completions.create(stream=True, **params)
+
+    def embed_sync(self, texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
+        response = self.sync_client.embeddings.create(model=model, input=texts)
+        return [item.embedding for item in response.data]
+
+    def langchain_embeddings(self, model: str = EMBEDDING_MODEL) -> "Embeddings":
+        # langchain's own client batches and retries large ingestions, keep using it for the vector stores
+        if model not in self._langchain_embeddings:
+            from langchain_openai import OpenAIEmbeddings
+
+            self._langchain_embeddings[model] = OpenAIEmbeddings(openai_api_key=self.api_key, model=model)
+        return self._langchain_embeddings[model]
+
+    def _build_clients(self) -> None:
+        # The properties build the clients on first access
+        _ = self.async_client
+        _ = self.sync_client
+
+    def preload(self) -> None:
+        self._build_clients()
+        super().preload()
+
+    async def aclose(self) -> None:
+        async_client, sync_client = self._async_client, self._sync_client
+        self._async_client = self._sync_client = None
+        if async_client is not None:
+            await async_client.close()
+        if sync_client is not None:
+            sync_client.close()
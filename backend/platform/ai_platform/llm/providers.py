@@ -0,0 +1,63 @@
+import asyncio
+import threading
+from typing import Dict
+
+from ai_platform.llm.base import LLMProvider
+from ai_platform.settings import LLM_PROVIDER, LLM_GOVERNOR_ENABLED, LLM_PRELOAD
+
+_providers: Dict[str, LLMProvider] = {}
+_lock = threading.Lock()
+
+
+def _create_provider(name: str) -> LLMProvider:
+    if name == "openai":
+        from ai_platform.llm.openai_provider import OpenAIProvider
+
+        return OpenAIProvider()
+    if name == "fake":
+        from ai_platform.llm.fake_provider import FakeProvider
+
+        print("WARNING: LLM_PROVIDER=fake, answers come from the offline stand-in model")
+        return FakeProvider.from_settings()
+    raise ValueError(f"Unknown LLM provider '{name}', expected 'openai' or 'fake'")
+
+
+def get_provider(name: str = None) -> LLMProvider:
+    """
+    The process wide provider selected by LLM_PROVIDER (or `name`), created on first use.
+    Its calls go through the LLM governor unless LLM_GOVERNOR_ENABLED is off.
+    """
+    name = (name or LLM_PROVIDER).lower()
+    with _lock:
+        if name not in _providers:
+            provider = _create_provider(name)
+            if LLM_GOVERNOR_ENABLED:
+                from ai_platform.llm.governor import GovernedProvider, llm_governor
+
+                provider = GovernedProvider(provider, llm_governor)
+            _providers[name] = provider
+        return _providers[name]
+
+
+async def startup_providers() -> None:
+    """
+    Nothing is built at import, the provider, its clients and the langchain embeddings come with the first
+    request that uses them. LLM_PRELOAD moves that cost to startup for workers that should answer at full speed.
+    """
+    if not LLM_PRELOAD:
+        return
+    provider = get_provider()
+    await asyncio.to_thread(provider.preload)
+    print(f"INFO: LLM provider {provider.name} preloaded")
+
+
+async def shutdown_providers() -> None:
+    """Close the HTTP clients of the providers built by this process"""
+    with _lock:
+        providers = list(_providers.values())
+        _providers.clear()
+    for provider in providers:
+        try:
+            await provider.aclose()
+        except Exception as e:
+            print(f"WARNING: Failed to close LLM provider {provider.name}: {e}")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 import uuid
 
 
@@ -13,6 +13,8 @@ class AiAgentBase(BaseModel):
     response_token_limit: int
     temperature: float
     description: Optional[str] = None
+    fast_model_name: Optional[str] = None
+    routing_policy: Optional[Dict[str, Any]] = None
 
 
 class AiAgentCreate(AiAgentBase):
@@ -25,6 +27,7 @@ class AiAgentUpdate(AiAgentBase):
 
 class AiAgentInDB(AiAgentBase):
     id: int
+    config_version: Optional[int] = None
 
     class Config:
         orm_mode = True
@@ -57,4 +60,8 @@ class CreateKnowledgeBaseRequest(BaseModel):
 class CreateKnowledgeBaseResponse(BaseModel):
     status: bool = Field(..., description="Indicates if the operation was successful")
     document_inserted_count: int = Field(..., description="Number of documents inserted")
+    embedded_count: int = Field(0, description="Inserted documents embedded by the model")
+    reused_count: int = Field(0, description="Inserted documents whose embedding came from the embedding cache")
+    skipped_count: int = Field(0, description="Documents repeated in the upload or already in the index")
+    failed_count: int = Field(0, description="Documents dropped after their batch failed every retry")
     vector_index: str = Field(..., description="Name of the created vector index")
@@ -0,0 +1,35 @@
+import uuid
+from datetime import date
+
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+class UsageTotals(BaseModel):
+    calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: float
+    avg_latency_ms: Optional[float] = None
+
+
+class DailyUsage(UsageTotals):
+    day: date
+
+
+class AgentUsage(UsageTotals):
+    agent_id: Optional[int] = None
+    agent_name: Optional[str] = None
+
+
+class CourseUsage(UsageTotals):
+    course_id: Optional[int] = None
+
+
+class KindUsage(UsageTotals):
+    kind: str
+
+
+class ConversationUsage(UsageTotals):
+    conversation_id: uuid.UUID
+    kinds: List[KindUsage]
@@ -1,3 +1,103 @@
 import os
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
\ No newline at end of file
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Agent runtime
+AGENT_MAX_TOOL_ROUNDS = int(os.getenv("AGENT_MAX_TOOL_ROUNDS", 3))  # tool call rounds before forcing an answer
+AGENT_TOOL_TIMEOUT_SEC = float(os.getenv("AGENT_TOOL_TIMEOUT_SEC", 10))  # per tool call timeout
+AGENT_REGISTRY_TTL_SEC = float(os.getenv("AGENT_REGISTRY_TTL_SEC", 5))  # how often agent configs are checked for edits
+
+# Embeddings
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"  # reuse chunk embeddings
+QUERY_EMBEDDING_CACHE_ENABLED = os.getenv("QUERY_EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+QUERY_EMBEDDING_CACHE_MB = int(os.getenv("QUERY_EMBEDDING_CACHE_MB", 32))  # ~5000 text-embedding-3-small vectors
+# Also share query embeddings between workers through the embedding_cache table
+QUERY_EMBEDDING_SHARED_CACHE = os.getenv("QUERY_EMBEDDING_SHARED_CACHE", "false").lower() == "true"
+
+# Knowledge base ingestion, chunks are embedded in bounded batches, a few at a time, and inserted per batch
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 100))  # chunks per embedding request
+INGEST_BATCH_TOKENS = int(os.getenv("INGEST_BATCH_TOKENS", 50000))  # tokens per request, the API allows 300k
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", 4))  # batches embedded at once per upload
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", 3))  # retries of a failed batch before it is dropped
+
+# Vector stores, one PgvectorDB handle per collection is kept for the process, least recently used dropped first
+VECTOR_STORE_MAX_COLLECTIONS = int(os.getenv("VECTOR_STORE_MAX_COLLECTIONS", 32))
+
+# Embedding router, routes host-agent queries to a knowledge base without the parser agent LLM call
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+ROUTER_MIN_SCORE = float(os.getenv("ROUTER_MIN_SCORE", 0.45))  # min cosine similarity to route directly
+ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", 0.05))  # min lead over the runner up collection
+ROUTER_REFRESH_SEC = float(os.getenv("ROUTER_REFRESH_SEC", 600))  # how often collection descriptions are re-embedded
+
+# Semantic response cache for repeated questions
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", 0.95))  # min cosine similarity for a hit
+RESPONSE_CACHE_TTL_SEC = float(os.getenv("RESPONSE_CACHE_TTL_SEC", 3600))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 2000))
+
+# Singleflight, identical questions asked while an answer is being generated subscribe to that answer
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+
+# Model routing, an agent with a fast_model_name answers simple questions with it and the rest with model_name
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+MODEL_ROUTING_MAX_QUERY_TOKENS = int(os.getenv("MODEL_ROUTING_MAX_QUERY_TOKENS", 40))  # longer queries go strong
+MODEL_ROUTING_MAX_RETRIEVAL_DISTANCE = float(os.getenv("MODEL_ROUTING_MAX_RETRIEVAL_DISTANCE", 0.45))  # of best chunk
+MODEL_ROUTING_FAST_WITH_TOOLS = os.getenv("MODEL_ROUTING_FAST_WITH_TOOLS", "true").lower() == "true"
+
+# Chat history windowing, older turns are folded into a rolling summary stored on the conversation
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 3000))  # tokens of history kept verbatim in the prompt
+HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4o-mini")
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", 400))
+
+# Tool result cache for get_course_content, invalidated by the weekwise content and course writes
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+TOOL_CACHE_TTL_SEC = float(os.getenv("TOOL_CACHE_TTL_SEC", 900))
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", 5000))
+
+# Lecture transcripts, the tool returns the segments relevant to the query instead of the whole transcript
+TRANSCRIPT_COLLECTION = os.getenv("TRANSCRIPT_COLLECTION", "lecture_transcripts")
+TRANSCRIPT_CHUNK_CHARS = int(os.getenv("TRANSCRIPT_CHUNK_CHARS", 1200))
+TRANSCRIPT_CHUNK_OVERLAP = int(os.getenv("TRANSCRIPT_CHUNK_OVERLAP", 150))
+TRANSCRIPT_TOP_K = int(os.getenv("TRANSCRIPT_TOP_K", 4))
+TRANSCRIPT_MAX_TOKENS = int(os.getenv("TRANSCRIPT_MAX_TOKENS", 1200))  # cap on the segments returned per tool call
+
+# SSE streaming, text deltas are coalesced into frames before they are sent to the browser
+SSE_COALESCE_ENABLED = os.getenv("SSE_COALESCE_ENABLED", "true").lower() == "true"
+SSE_FLUSH_INTERVAL_MS = float(os.getenv("SSE_FLUSH_INTERVAL_MS", 40))  # max time a delta waits in a frame
+SSE_FLUSH_BYTES = int(os.getenv("SSE_FLUSH_BYTES", 512))  # a frame is sent as soon as it holds this much text
+SSE_DEMO_TOKENS_PER_SEC = float(os.getenv("SSE_DEMO_TOKENS_PER_SEC", 0))  # pacing of /agent/openai_streaming, 0 = none
+
+# LLM provider, "openai" or "fake" (in-process stand-in for load tests and CI, no network needed)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai").lower()
+# Build the provider clients and the embeddings at startup instead of on the first request that needs them
+LLM_PRELOAD = os.getenv("LLM_PRELOAD", "false").lower() == "true"
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", 300))  # time to first token / to a full completion
+FAKE_LLM_TOKENS_PER_SEC = float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", 50))  # streamed token rate, 0 = no delay
+FAKE_LLM_REPLY_TOKENS = int(os.getenv("FAKE_LLM_REPLY_TOKENS", 120))
+FAKE_LLM_TOOL_SCRIPT = os.getenv("FAKE_LLM_TOOL_SCRIPT", "")  # JSON list of turns, see ai_platform/llm/fake_provider.py
+
+# Outbound LLM governor, process wide limits on LLM and embedding calls, 0 = unlimited
+LLM_GOVERNOR_ENABLED = os.getenv("LLM_GOVERNOR_ENABLED", "true").lower() == "true"
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", 64))  # non-streamed calls and embeddings
+LLM_MAX_STREAMS = int(os.getenv("LLM_MAX_STREAMS", 0))  # open streamed answers, 0 = rate limits only
+LLM_REQUESTS_PER_MIN = float(os.getenv("LLM_REQUESTS_PER_MIN", 5000))  # keep below the account's rate limits
+LLM_TOKENS_PER_MIN = float(os.getenv("LLM_TOKENS_PER_MIN", 2000000))
+LLM_QUEUE_TIMEOUT_SEC = float(os.getenv("LLM_QUEUE_TIMEOUT_SEC", 20))  # max wait of interactive chat for a slot
+LLM_BACKGROUND_QUEUE_TIMEOUT_SEC = float(os.getenv("LLM_BACKGROUND_QUEUE_TIMEOUT_SEC", 120))  # history summaries
+LLM_INGESTION_QUEUE_TIMEOUT_SEC = float(os.getenv("LLM_INGESTION_QUEUE_TIMEOUT_SEC", 900))  # knowledge base uploads
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", 600))  # reserved without max_tokens
+LLM_EMBED_BATCH_SIZE = int(os.getenv("LLM_EMBED_BATCH_SIZE", 100))  # texts per governed embedding request
+
+# Prometheus metrics of the agent pipeline served on /api/monitoring/metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Persistent token and cost accounting, usage rows are buffered and written in batches by a background task
+USAGE_ACCOUNTING_ENABLED = os.getenv("USAGE_ACCOUNTING_ENABLED", "true").lower() == "true"
+USAGE_FLUSH_INTERVAL_SEC = float(os.getenv("USAGE_FLUSH_INTERVAL_SEC", 5))
+USAGE_FLUSH_BATCH_SIZE = int(os.getenv("USAGE_FLUSH_BATCH_SIZE", 200))  # a full batch is written without waiting
+USAGE_MAX_BUFFER = int(os.getenv("USAGE_MAX_BUFFER", 10000))  # rows kept while the database is unreachable
+USAGE_MODEL_PRICES = os.getenv("USAGE_MODEL_PRICES", "")  # JSON {"model": [input, output]} in USD per 1M tokens
+
+# Event loop lag monitor, a slow loop delays every open stream of the worker
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", 100))
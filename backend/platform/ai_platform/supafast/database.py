@@ -1,6 +1,10 @@
-from sqlalchemy import create_engine
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 import os
 from dotenv import load_dotenv
 
@@ -13,6 +17,44 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Pool checkout/checkin counters, used to prove that long SSE streams do not leak connections
+_pool_stats_lock = threading.Lock()
+pool_stats = {"connects": 0, "checkouts": 0, "checkins": 0, "max_checked_out": 0}
+
+
+@event.listens_for(engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    with _pool_stats_lock:
+        pool_stats["connects"] += 1
+
+
+@event.listens_for(engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    with _pool_stats_lock:
+        pool_stats["checkouts"] += 1
+        checked_out = pool_stats["checkouts"] - pool_stats["checkins"]
+        pool_stats["max_checked_out"] = max(pool_stats["max_checked_out"], checked_out)
+
+
+@event.listens_for(engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    with _pool_stats_lock:
+        pool_stats["checkins"] += 1
+
+
+def get_pool_stats() -> dict:
+    """Snapshot of the connection pool usage"""
+    with _pool_stats_lock:
+        stats = dict(pool_stats)
+    stats["checked_out"] = stats["checkouts"] - stats["checkins"]
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        stats["pool_size"] = pool.size()
+        stats["pool_overflow"] = pool.overflow()
+        stats["pool_idle"] = pool.checkedin()
+        stats["pool_capacity"] = pool.size() + max(pool._max_overflow, 0)
+    return stats
+
 
 def get_db():
     db = SessionLocal()
@@ -20,3 +62,17 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+@contextmanager
+def read_only_session():
+    """
+    Session for read only work outside of a request (e.g. agent tool calls).
+    Nothing is ever committed and the connection goes back to the pool as soon as the block exits.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.rollback()
+        db.close()
@@ -22,6 +22,12 @@ class AiAgent(Base):
     response_token_limit = Column(Integer)
     temperature = Column(Float)
     description = Column(String, nullable=True)
+    fast_model_name = Column(String, nullable=True,
+                             doc="Cheaper model for simple questions, model_name answers the rest. None = no routing")
+    routing_policy = Column(JSON, nullable=True,
+                            doc="Overrides of the model routing thresholds, see agents/model_routing.py")
+    config_version = Column(Integer, nullable=False, default=1, server_default="1",
+                            doc="Bumped on every config change so workers can detect stale agent caches")
 
     conversations = relationship("Conversation", back_populates="agent")
 
@@ -34,6 +40,9 @@ class Conversation(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     title = Column(String, nullable=True, server_default="No title.")
     conversations = Column(JSONB)
+    summary = Column(String, nullable=True, doc="Rolling summary of the messages that left the prompt window")
+    summarized_until = Column(Integer, nullable=False, default=0, server_default="0",
+                              doc="Number of leading messages already folded into the summary")
     created_at = Column(DateTime, default=datetime.utcnow)
     modified_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+
+from ai_platform.supafast.database import Base
+
+
+class EmbeddingCacheEntry(Base):
+    """The embedding of one chunk text, shared by every collection and upload that contains the same text"""
+    __tablename__ = "embedding_cache"
+
+    content_hash = Column(String(64), primary_key=True,
+                          doc="sha256 of the model, the dimensions and the normalized text")
+    model = Column(String, nullable=False)
+    dimensions = Column(Integer, nullable=False)
+    embedding = Column(LargeBinary, nullable=False, doc="float32 values, the precision pgvector stores them with")
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,52 +1,87 @@
 import json
+import uuid
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Set, Tuple
+
 import sqlalchemy
-from langchain_openai import OpenAIEmbeddings
 from langchain_postgres.vectorstores import PGVector
 import os
 from langchain_community.document_loaders import DataFrameLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-try:
-    from dotenv import load_dotenv
+from ai_platform.llm.providers import get_provider
+from ai_platform.settings import EMBEDDING_MODEL
+from ai_platform.vectordb.embedding_cache import content_hash, embedding_cache
+from ai_platform.vectordb.query_embeddings import query_embeddings
+
+
+class CollectionPGVector(PGVector):
+    """
+    PGVector that looks its collection row up once instead of on every search and insert.
+    Only the uuid and name of the row are kept, a deleted collection needs a new instance.
+    """
+
+    _collection = None
 
-    load_dotenv(override=True)
-except Exception as e:
-    print(e)
+    def get_collection(self, session):
+        if self._collection is None:
+            collection = super().get_collection(session)
+            if collection is None:
+                return None
+            self._collection = SimpleNamespace(uuid=collection.uuid, name=collection.name)
+        return self._collection
+
+    def delete_collection(self) -> None:
+        self._collection = None
+        with self._make_sync_session() as session:
+            collection = PGVector.get_collection(self, session)
+            if collection is not None:
+                session.delete(collection)
+                session.commit()
 
 
 class PgvectorDB:
-    def __init__(self, collection_name, connection_str,
-                 embedding_fn=OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"),
-                                               model="text-embedding-3-small")):
-        self.vectorstore = PGVector(
+    def __init__(self, collection_name, connection_str=None, embedding_fn=None, engine=None,
+                 embedding_model=EMBEDDING_MODEL):
+        """
+        `engine` shares an existing SQLAlchemy engine and its pool, otherwise one is built from `connection_str`.
+        `embedding_model` names the model behind `embedding_fn`, it is part of the embedding cache key.
+        """
+        # Embeddings of the configured LLM provider (OpenAI unless LLM_PROVIDER says otherwise)
+        embedding_fn = embedding_fn or get_provider().langchain_embeddings()
+        self.vectorstore = CollectionPGVector(
             embeddings=embedding_fn,
             collection_name=collection_name,
-            connection=connection_str,
+            connection=engine if engine is not None else connection_str,
             use_jsonb=True,
             create_extension=False
         )
         self.collection = collection_name
         self.embedding_fn = embedding_fn
+        self.embedding_model = embedding_model
+        self.embedding_cache = embedding_cache
+        self.query_embeddings = query_embeddings
 
     def upsert_with_metadata(self, docs):
         """Takes ithe langchain docs and insert into the vector_db in specified collection"""
-        self.vectorstore.add_documents(docs)
-        print(f"INFO: Vectors created successfully on index: {self.collection}")
+        self.create_embeddings(docs, deduplicate=False)
 
     def insert_from_df(self, df, page_content_column, duplicate_insertion=True):
+        """`duplicate_insertion=False` skips the rows whose text is already in the collection"""
         loader = DataFrameLoader(df, page_content_column=page_content_column)
         docs = loader.load()
         #TODO: Handle try and error
-        self.upsert_with_metadata(docs)
-        print(f"INFO: Vectors created successfully on index: {self.collection}")
+        self.create_embeddings(docs, deduplicate=not duplicate_insertion)
         return "success"
 
-    def query_with_score(self, query: str, k=6):
+    def query_with_score(self, query: str, k=6, filter=None):
         """Takes the user query and get the relavent context to provide GPT"""
+        # Repeated queries skip the embedding request, only the similarity search runs
+        embedding = self.query_embeddings.embed_query(query, self.embedding_fn.embed_query, self.embedding_model)
         try:
-            result = self.vectorstore.similarity_search_with_score(query, k=k)
+            result = self.vectorstore.similarity_search_with_score_by_vector(embedding, k=k, filter=filter)
         except sqlalchemy.exc.OperationalError as e:
-            result = self.vectorstore.similarity_search_with_score(query, k=k)
+            result = self.vectorstore.similarity_search_with_score_by_vector(embedding, k=k, filter=filter)
         return result
 
     def get_context_for_query(self, query, top_k=6, include_metadata=True, exclude_content=False):
@@ -86,7 +121,59 @@ class PgvectorDB:
         docs = text_splitter.create_documents(texts)
         return docs
 
-    def create_embeddings(self, docs) -> None:
-        """Creates the embedding from the langchain docs"""
-        self.vectorstore.add_documents(docs)
-        print(f"INFO: Vectors created successfully on index: {self.collection}")
+    def _content_id(self, chunk_hash: str) -> str:
+        # Row ids are unique across collections, the same text gets one row per collection
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{self.collection}/{chunk_hash}"))
+
+    def _existing_ids(self, ids: List[str]) -> Set[str]:
+        store = self.vectorstore.EmbeddingStore
+        existing = set()
+        with self.vectorstore._make_sync_session() as session:
+            collection = self.vectorstore.get_collection(session)
+            if collection is None:
+                return existing
+            for start in range(0, len(ids), 500):
+                rows = session.query(store.id).filter(store.collection_id == collection.uuid,
+                                                      store.id.in_(ids[start:start + 500]))
+                existing.update(row.id for row in rows)
+        return existing
+
+    def plan_ingestion(self, docs, deduplicate: bool = True) -> Tuple[List, List[str], Optional[List[str]], Dict]:
+        """
+        The docs left to insert with their content hashes and row ids, and the counts of what was skipped.
+        With `deduplicate` a chunk's row id is derived from its text, chunks repeated in `docs` or already in the
+        collection are skipped. Without it the ids are None and every doc gets a new row.
+        """
+        hashes = [content_hash(doc.page_content, self.embedding_model) for doc in docs]
+        report = {"chunks": len(docs), "duplicates": 0, "existing": 0}
+        if not deduplicate:
+            return docs, hashes, None, report
+        unique = {}
+        for doc, chunk_hash in zip(docs, hashes):
+            unique.setdefault(chunk_hash, doc)
+        report["duplicates"] = len(docs) - len(unique)
+        existing = self._existing_ids([self._content_id(chunk_hash) for chunk_hash in unique])
+        report["existing"] = len(existing)
+        hashes = [chunk_hash for chunk_hash in unique if self._content_id(chunk_hash) not in existing]
+        return [unique[chunk_hash] for chunk_hash in hashes], hashes, [self._content_id(h) for h in hashes], report
+
+    def insert_embeddings(self, docs, vectors: List[List[float]], ids: Optional[List[str]] = None) -> None:
+        """Insert embedded docs in one multi-row statement, rows with the same id are updated"""
+        if docs:
+            self.vectorstore.add_embeddings([doc.page_content for doc in docs], vectors,
+                                            metadatas=[doc.metadata for doc in docs], ids=ids)
+
+    def create_embeddings(self, docs, deduplicate: bool = True) -> Dict:
+        """
+        Creates the embedding from the langchain docs, see `plan_ingestion` for the deduplication.
+        Embeddings come from the embedding cache when the same text was embedded before, only the others are
+        sent to the model. Returns the counts of the ingestion. Blocking, large uploads from the API go through
+        the batched IngestionPipeline instead.
+        """
+        docs, hashes, ids, report = self.plan_ingestion(docs, deduplicate)
+        texts = [doc.page_content for doc in docs]
+        vectors, cached = self.embedding_cache.embed_documents(texts, self.embedding_fn, self.embedding_model, hashes)
+        self.insert_embeddings(docs, vectors, ids)
+        report.update(cached, inserted=len(texts))
+        print(f"INFO: Vectors created successfully on index: {self.collection}, {report}")
+        return report
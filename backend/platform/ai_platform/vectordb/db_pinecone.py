@@ -2,16 +2,16 @@ import json
 
 from langchain_pinecone import PineconeVectorStore
 from langchain.schema import Document
-from langchain_openai import OpenAIEmbeddings
 import os
 from langchain_community.document_loaders import DataFrameLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from dotenv import load_dotenv
-load_dotenv(override=True)
+
+from ai_platform.llm.providers import get_provider
+
 
 class PineconeVectorDb:
-    def __init__(self, index_name, embedding_fn=OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"),
-        model="text-embedding-3-small")):
+    def __init__(self, index_name, embedding_fn=None):
+        embedding_fn = embedding_fn or get_provider().langchain_embeddings()
         self.vectorstore = PineconeVectorStore(index_name=index_name, embedding=embedding_fn)
         self.index = index_name
         self.embedding_fn = embedding_fn
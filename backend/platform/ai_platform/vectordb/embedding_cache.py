@@ -0,0 +1,122 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ai_platform.settings import EMBEDDING_CACHE_ENABLED
+from ai_platform.supafast.database import SessionLocal
+from ai_platform.supafast.models.embedding_cache import EmbeddingCacheEntry
+
+_WHITESPACE = re.compile(r"\s+")
+# Rows per lookup or insert statement, keeps the IN lists and the insert parameters bounded on large uploads
+_STATEMENT_ROWS = 500
+
+
+def normalize_text(text: str) -> str:
+    """Unicode NFC with whitespace runs collapsed, the PDF extractors differ mostly in spacing and line breaks"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def content_hash(text: str, model: str, dimensions: Optional[int] = None) -> str:
+    """Cache key of a chunk, `dimensions` is None for the native size of the model"""
+    key = f"{model}\n{dimensions or 'native'}\n{normalize_text(text)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _pack(vector: Sequence[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(data: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """
+    Persistent embeddings of chunk texts, keyed by `content_hash`.
+
+    Ingestion looks every chunk up first and only sends the misses to the embedding model, re-uploading a
+    document or uploading an edited version embeds the changed chunks only. A cache that can't be read or
+    written never fails the ingestion, the chunks are embedded as if it was empty.
+    """
+
+    def __init__(self, enabled: bool = EMBEDDING_CACHE_ENABLED, session_factory=SessionLocal):
+        self.enabled = enabled
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "embedded": 0, "errors": 0}
+
+    def _count(self, **increments) -> None:
+        with self._lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def lookup(self, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        if not self.enabled or not hashes:
+            return {}
+        found = {}
+        try:
+            with self.session_factory() as db:
+                for start in range(0, len(hashes), _STATEMENT_ROWS):
+                    rows = db.execute(select(EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.embedding).where(
+                        EmbeddingCacheEntry.content_hash.in_(hashes[start:start + _STATEMENT_ROWS])
+                    ))
+                    found.update((row.content_hash, _unpack(row.embedding)) for row in rows)
+        except Exception as e:
+            self._count(errors=1)
+            print(f"WARNING: Embedding cache lookup failed, embedding every chunk: {e}")
+            return {}
+        return found
+
+    def store(self, model: str, embeddings: Dict[str, List[float]]) -> None:
+        if not self.enabled or not embeddings:
+            return
+        rows = [{"content_hash": key, "model": model, "dimensions": len(vector), "embedding": _pack(vector)}
+                for key, vector in embeddings.items()]
+        try:
+            with self.session_factory() as db:
+                # Concurrent uploads of the same document race on the same hashes, the first writer wins
+                insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else pg_insert
+                for start in range(0, len(rows), _STATEMENT_ROWS):
+                    db.execute(insert(EmbeddingCacheEntry).on_conflict_do_nothing(index_elements=["content_hash"]),
+                               rows[start:start + _STATEMENT_ROWS])
+                db.commit()
+        except Exception as e:
+            self._count(errors=1)
+            print(f"WARNING: Failed to write {len(rows)} embeddings to the cache: {e}")
+
+    def embed_documents(self, texts: List[str], embedding_fn, model: str, hashes: List[str] = None,
+                        dimensions: Optional[int] = None) -> Tuple[List[List[float]], Dict]:
+        """
+        Embeddings of `texts` in order, cached ones are reused and the rest embedded with `embedding_fn` in one
+        call. Returns the vectors and {"embedded": int, "reused": int}.
+        """
+        hashes = hashes or [content_hash(text, model, dimensions) for text in texts]
+        vectors = self.lookup(list(dict.fromkeys(hashes)))
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        if missing:
+            embedded = embedding_fn.embed_documents(list(missing.values()))
+            new = dict(zip(missing, embedded))
+            self.store(model, new)
+            vectors.update(new)
+        reused = len(texts) - len(missing)
+        self._count(lookups=len(texts), hits=reused, embedded=len(missing))
+        return [vectors[key] for key in hashes], {"embedded": len(missing), "reused": reused}
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats["lookups"]
+        return {**self.stats, "enabled": self.enabled, "hit_rate": self.stats["hits"] / lookups if lookups else 0.0}
+
+
+embedding_cache = EmbeddingCache()
@@ -1,7 +1,12 @@
 import os
 
-from ai_platform.settings import BASE_DIR
-from ai_platform.vectordb.db_pinecone import PineconeVectorDb
+from dotenv import load_dotenv
+
+# The keys have to be in the environment before the settings and the vector store are imported
+load_dotenv(override=True)
+
+from ai_platform.settings import BASE_DIR  # noqa: E402
+from ai_platform.vectordb.db_pinecone import PineconeVectorDb  # noqa: E402
 
 filename = input(
     "Enter the filename of the data to ingest. The data must be present under ai_platform/embedding_data dir\n")
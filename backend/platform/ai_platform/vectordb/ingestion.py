@@ -0,0 +1,137 @@
+import asyncio
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from ai_platform.agents.stream_events import StreamEvent
+from ai_platform.agents.tokens import count_tokens
+from ai_platform.llm.governor import llm_priority, INGESTION
+from ai_platform.settings import INGEST_BATCH_SIZE, INGEST_BATCH_TOKENS, INGEST_CONCURRENCY, INGEST_MAX_RETRIES
+
+
+class IngestionBatch:
+    """Docs embedded and inserted together, `vectors` is already set for docs found in the embedding cache"""
+
+    def __init__(self, index: int, docs: List, hashes: List[str], ids: Optional[List[str]],
+                 vectors: Optional[List[List[float]]] = None):
+        self.index = index
+        self.docs = docs
+        self.hashes = hashes
+        self.ids = ids
+        self.vectors = vectors
+        self.reused = vectors is not None
+
+
+class IngestionPipeline:
+    """
+    Embeds and inserts the chunks of a knowledge base upload in bounded batches.
+
+    A batch holds at most `batch_size` chunks and `batch_tokens` tokens, far below the request limits of the
+    embedding API. Up to `concurrency` batches are embedded at once through the async embeddings (queued by the
+    governor behind interactive chat) and each one is inserted in one multi-row statement from a worker thread
+    as soon as it is embedded. A failed batch is retried on its own with backoff, the others are not affected,
+    and a batch that keeps failing is reported instead of failing the upload.
+    `run` yields progress events, the SSE endpoint forwards them and `ingest` only returns the final counts.
+    """
+
+    def __init__(self, store, batch_size: int = INGEST_BATCH_SIZE, batch_tokens: int = INGEST_BATCH_TOKENS,
+                 concurrency: int = INGEST_CONCURRENCY, max_retries: int = INGEST_MAX_RETRIES,
+                 retry_delay: float = 1.0):
+        self.store = store
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def _batches(self, docs: List, hashes: List[str], ids: Optional[List[str]],
+                 cached: Dict[str, List[float]]) -> List[IngestionBatch]:
+        batches = []
+
+        def add(indexes: List[int], reused: bool) -> None:
+            batches.append(IngestionBatch(
+                len(batches), [docs[i] for i in indexes], [hashes[i] for i in indexes],
+                [ids[i] for i in indexes] if ids else None,
+                [cached[hashes[i]] for i in indexes] if reused else None
+            ))
+
+        # Cached chunks only need the insert, they are grouped by count alone
+        reused = [i for i, chunk_hash in enumerate(hashes) if chunk_hash in cached]
+        for start in range(0, len(reused), self.batch_size):
+            add(reused[start:start + self.batch_size], True)
+
+        current, tokens = [], 0
+        for i, chunk_hash in enumerate(hashes):
+            if chunk_hash in cached:
+                continue
+            doc_tokens = count_tokens(docs[i].page_content)
+            if current and (len(current) == self.batch_size or tokens + doc_tokens > self.batch_tokens):
+                add(current, False)
+                current, tokens = [], 0
+            current.append(i)
+            tokens += doc_tokens
+        if current:
+            add(current, False)
+        return batches
+
+    async def _process(self, batch: IngestionBatch,
+                       semaphore: asyncio.Semaphore) -> Tuple[IngestionBatch, Optional[Exception]]:
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    if batch.vectors is None:
+                        with llm_priority(INGESTION):
+                            vectors = await self.store.embedding_fn.aembed_documents(
+                                [doc.page_content for doc in batch.docs]
+                            )
+                        await asyncio.to_thread(self.store.embedding_cache.store, self.store.embedding_model,
+                                                dict(zip(batch.hashes, vectors)))
+                        # An insert that fails next is retried without embedding the batch again
+                        batch.vectors = vectors
+                    await asyncio.to_thread(self.store.insert_embeddings, batch.docs, batch.vectors, batch.ids)
+                    return batch, None
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        return batch, e
+                    print(f"WARNING: Ingestion batch {batch.index} of {self.store.collection} failed "
+                          f"(attempt {attempt + 1}), retrying: {e}")
+                    await asyncio.sleep(self.retry_delay * 2 ** attempt)
+
+    async def run(self, docs: List, deduplicate: bool = True) -> AsyncIterator[StreamEvent]:
+        """Ingest `docs`, yields "progress" events and a final "result" event with the counts"""
+        started = time.perf_counter()
+        docs, hashes, ids, report = await asyncio.to_thread(self.store.plan_ingestion, docs, deduplicate)
+        cached = await asyncio.to_thread(self.store.embedding_cache.lookup, list(dict.fromkeys(hashes)))
+        batches = self._batches(docs, hashes, ids, cached)
+        report.update(embedded=0, reused=0, inserted=0, failed=0, batches=len(batches))
+        yield StreamEvent("progress", stage="planned", to_insert=len(docs),
+                          to_embed=sum(len(b.docs) for b in batches if not b.reused), **report)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [asyncio.ensure_future(self._process(batch, semaphore)) for batch in batches]
+        try:
+            for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+                batch, error = await task
+                if error is None:
+                    report["reused" if batch.reused else "embedded"] += len(batch.docs)
+                    report["inserted"] += len(batch.docs)
+                else:
+                    report["failed"] += len(batch.docs)
+                    print(f"WARNING: Ingestion batch {batch.index} of {self.store.collection} dropped: {error}")
+                yield StreamEvent("progress", stage="batch", batch=batch.index, size=len(batch.docs),
+                                  error=str(error) if error else None, completed_batches=done,
+                                  inserted=report["inserted"], failed=report["failed"])
+        finally:
+            # The client went away or the upload failed, batches not started yet are dropped
+            for task in tasks:
+                task.cancel()
+        report["duration_ms"] = round((time.perf_counter() - started) * 1000)
+        print(f"INFO: Vectors created successfully on index: {self.store.collection}, {report}")
+        yield StreamEvent("result", **report)
+
+    async def ingest(self, docs: List, deduplicate: bool = True) -> Dict:
+        """Run the pipeline without progress events, returns the final counts"""
+        report = {}
+        async for event in self.run(docs, deduplicate):
+            if event.type == "result":
+                report = event.fields
+        return report
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from ai_platform.settings import QUERY_EMBEDDING_CACHE_ENABLED, QUERY_EMBEDDING_CACHE_MB, \
+    QUERY_EMBEDDING_SHARED_CACHE
+from ai_platform.vectordb.embedding_cache import EmbeddingCache, content_hash, embedding_cache
+
+# Bookkeeping of one entry on top of its vector and key: the OrderedDict node, the array header and the key string
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+class QueryEmbeddingCache:
+    """
+    In-process LRU of query embeddings, keyed like the embedding cache by (model, normalized text).
+
+    The host agent embeds the same question for the response cache, the embedding router and the vector search,
+    and popular questions come back from many students. Vectors are kept as float32 arrays and the least recently
+    used ones are dropped once they take more than `max_bytes`.
+    With a `shared` tier (the embedding_cache table) a miss is looked up there before the model is called and
+    new embeddings are written to it, the workers of a deployment then embed a question once between them.
+    """
+
+    def __init__(self, enabled: bool = QUERY_EMBEDDING_CACHE_ENABLED, max_bytes: int = QUERY_EMBEDDING_CACHE_MB << 20,
+                 shared: Optional[EmbeddingCache] = None):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _size(key: str, vector: array) -> int:
+        return vector.itemsize * len(vector) + len(key) + _ENTRY_OVERHEAD_BYTES
+
+    def _get_local(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return vector.tolist()
+
+    def _put_local(self, key: str, vector: List[float]) -> None:
+        packed = array("f", vector)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= self._size(key, previous)
+            self._entries[key] = packed
+            self._bytes += self._size(key, packed)
+            while self._bytes > self.max_bytes and self._entries:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted_key, evicted)
+                self.stats["evictions"] += 1
+
+    def _count(self, key: str, found: int) -> None:
+        with self._lock:
+            self.stats[key] += found
+
+    def embed_query(self, text: str, embed_fn: Callable[[str], List[float]], model: str) -> List[float]:
+        """The embedding of `text`, `embed_fn` is called on a miss. Blocking, the shared tier is a database read"""
+        if not self.enabled:
+            return embed_fn(text)
+        key = content_hash(text, model)
+        vector = self._get_local(key)
+        if vector is not None:
+            return vector
+        if self.shared is not None:
+            vector = self.shared.lookup([key]).get(key)
+            if vector is not None:
+                self._count("shared_hits", 1)
+                self._put_local(key, vector)
+                return vector
+        self._count("misses", 1)
+        vector = embed_fn(text)
+        self._put_local(key, vector)
+        if self.shared is not None:
+            self.shared.store(model, {key: vector})
+        return vector
+
+    async def aembed_texts(self, texts: List[str], embed_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+                           model: str) -> List[List[float]]:
+        """Embeddings of `texts` in order, the misses are embedded in one `embed_fn` call"""
+        if not self.enabled:
+            return await embed_fn(texts)
+        keys = [content_hash(text, model) for text in texts]
+        vectors = {key: vector for key in set(keys) if (vector := self._get_local(key)) is not None}
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing and self.shared is not None:
+            shared = await asyncio.to_thread(self.shared.lookup, list(missing))
+            self._count("shared_hits", len(shared))
+            for key, vector in shared.items():
+                del missing[key]
+                self._put_local(key, vector)
+            vectors.update(shared)
+        if missing:
+            self._count("misses", len(missing))
+            embedded = dict(zip(missing, await embed_fn(list(missing.values()))))
+            for key, vector in embedded.items():
+                self._put_local(key, vector)
+            vectors.update(embedded)
+            if self.shared is not None:
+                await asyncio.to_thread(self.shared.store, model, embedded)
+        return [vectors[key] for key in keys]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats["hits"] + self.stats["shared_hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "shared": self.shared is not None,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hit_rate": (self.stats["hits"] + self.stats["shared_hits"]) / lookups if lookups else 0.0,
+        }
+
+
+query_embeddings = QueryEmbeddingCache(shared=embedding_cache if QUERY_EMBEDDING_SHARED_CACHE else None)
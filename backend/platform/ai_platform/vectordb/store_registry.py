@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict
+
+from ai_platform.settings import VECTOR_STORE_MAX_COLLECTIONS
+
+
+def _default_factory(collection_name: str):
+    from ai_platform.supafast.database import engine
+    from ai_platform.vectordb.db_pgvector import PgvectorDB
+
+    # Every collection runs on the application's engine, vector searches share its connection pool
+    return PgvectorDB(collection_name=collection_name, engine=engine)
+
+
+class VectorStoreRegistry:
+    """
+    Process-wide PgvectorDB handles keyed by collection name.
+
+    Building a handle creates the langchain tables if needed and resolves the collection row, that happens
+    once per collection instead of once per request. Handles are built lazily and the least recently used
+    one is dropped once more than `max_collections` are held, course collections that are rarely asked about
+    do not stay in memory. A collection is built by one thread at a time, concurrent first requests wait for
+    it instead of building their own.
+    """
+
+    def __init__(self, factory: Callable = _default_factory, max_collections: int = VECTOR_STORE_MAX_COLLECTIONS):
+        self.factory = factory
+        self.max_collections = max_collections
+        self._stores: OrderedDict = OrderedDict()
+        self._building: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "builds": 0, "evictions": 0, "build_sec_total": 0.0}
+
+    def _cached(self, collection_name: str):
+        store = self._stores.get(collection_name)
+        if store is not None:
+            self._stores.move_to_end(collection_name)
+            self.stats["hits"] += 1
+        return store
+
+    def get(self, collection_name: str):
+        """The handle of a collection, built on first use. Blocking, call it from a worker thread"""
+        with self._lock:
+            store = self._cached(collection_name)
+            if store is not None:
+                return store
+            building = self._building.setdefault(collection_name, threading.Lock())
+        with building:
+            with self._lock:
+                store = self._cached(collection_name)
+                if store is not None:
+                    return store
+            started = time.perf_counter()
+            store = self.factory(collection_name)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._stores[collection_name] = store
+                self._building.pop(collection_name, None)
+                self.stats["builds"] += 1
+                self.stats["build_sec_total"] += elapsed
+                while len(self._stores) > self.max_collections:
+                    evicted, _ = self._stores.popitem(last=False)
+                    self.stats["evictions"] += 1
+                    print(f"INFO: Vector store of {evicted} evicted, least recently used")
+        print(f"INFO: Vector store of {collection_name} ready in {elapsed * 1000:.0f} ms")
+        return store
+
+    def invalidate(self, collection_name: str = None) -> None:
+        """Drop the handle of a collection (all when None), e.g. after the collection was deleted"""
+        with self._lock:
+            if collection_name is None:
+                self._stores.clear()
+            else:
+                self._stores.pop(collection_name, None)
+
+    def get_stats(self) -> Dict:
+        builds = self.stats["builds"]
+        lookups = self.stats["hits"] + builds
+        return {
+            **self.stats,
+            "collections": list(self._stores),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            "avg_build_ms": self.stats["build_sec_total"] * 1000 / builds if builds else 0.0,
+        }
+
+
+vector_stores = VectorStoreRegistry()
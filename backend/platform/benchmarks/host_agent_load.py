@@ -0,0 +1,269 @@
+"""
+Load test of the agent streaming endpoint, GET /api/agent/host_agent.
+
+Drives N concurrent SSE clients against a running server and reports time to first token, inter token latency
+percentiles, error rate, DB pool saturation and event loop lag (sampled from /api/monitoring during the run).
+The report is written as JSON so runs of different commits can be compared with --compare.
+
+See benchmarks/README.md for the server setup (local Postgres, LLM_PROVIDER=fake).
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+STATS_PATH = "/api/monitoring/stats"
+DEFAULT_QUERIES = [
+    "What is covered in week 2 of this course?",
+    "Can you explain the main idea of lecture 1?",
+    "Help me prepare for the graded assignment of week 3",
+    "Which topics should I revise before the quiz?",
+    "Summarize the practice assignment of week 1",
+    "How is this course graded?",
+]
+# Metrics compared by --compare, lower is better for all of them
+COMPARED_METRICS = [
+    ("ttft_ms", "p50"), ("ttft_ms", "p95"), ("inter_token_ms", "p50"), ("inter_token_ms", "p99"),
+    ("total_ms", "p95"), ("error_rate", None), ("db_pool", "peak_utilization"), ("event_loop_lag_ms", "max"),
+]
+
+
+def percentiles(values: List[float]) -> Dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def at(p: float) -> float:
+        return round(values[min(int(len(values) * p), len(values) - 1)], 2)
+
+    return {"count": len(values), "mean": round(sum(values) / len(values), 2), "p50": at(0.5), "p90": at(0.9),
+            "p95": at(0.95), "p99": at(0.99), "max": round(values[-1], 2)}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run_stream(client: httpx.AsyncClient, args, query: str) -> Dict:
+    """One chat turn on a new conversation, timings are taken when the SSE events arrive"""
+    params = {
+        "query": query,
+        "user_id": args.user_id,
+        "agent_id": args.agent_id,
+        "history": json.dumps([{"role": "user", "content": query}]),
+    }
+    if args.course_id:
+        params["course_id"] = args.course_id
+    result = {"ttft_ms": None, "total_ms": None, "text_events": 0, "chars": 0, "inter_token_ms": [], "error": None}
+    started = time.perf_counter()
+    last_text_at = None
+    try:
+        async with client.stream("GET", "/api/agent/host_agent", params=params) as response:
+            if response.status_code != 200:
+                await response.aread()
+                result["error"] = f"HTTP {response.status_code}: {response.text[:200]}"
+                return result
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue  # event separators and keep-alive comments
+                event = json.loads(line[len("data:"):].strip())
+                now = time.perf_counter()
+                if event["type"] == "text":
+                    if last_text_at is None:
+                        result["ttft_ms"] = (now - started) * 1000
+                    else:
+                        # A frame may carry several tokens (SSE coalescing), spread its gap over them
+                        tokens = max(len(event.get("content", "")) // 4, 1)
+                        result["inter_token_ms"].extend([(now - last_text_at) * 1000 / tokens] * tokens)
+                    last_text_at = now
+                    result["text_events"] += 1
+                    result["chars"] += len(event.get("content", ""))
+                elif event["type"] == "error":
+                    result["error"] = event.get("content")
+                elif event["type"] == "end":
+                    break
+        if result["ttft_ms"] is None and not result["error"]:
+            result["error"] = "stream ended without text"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        result["total_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+async def sample_server(client: httpx.AsyncClient, interval: float, samples: List[Dict], stop: asyncio.Event):
+    """Poll the monitoring stats, their round trip time is itself a measure of worker responsiveness"""
+    while not stop.is_set():
+        sample = {"t": time.time()}
+        try:
+            started = time.perf_counter()
+            stats = (await client.get(STATS_PATH, params={"component": ["db_pool", "event_loop"]})).json()
+            pool, loop = stats["db_pool"], stats["event_loop"]
+            sample.update({
+                "monitor_rtt_ms": (time.perf_counter() - started) * 1000,
+                "checked_out": pool.get("checked_out"),
+                "pool_capacity": pool.get("pool_capacity"),
+                "loop_lag_window_max_ms": loop.get("window_max_ms"),
+                "loop_lag_p99_ms": loop.get("p99_ms"),
+            })
+        except Exception as e:
+            sample["error"] = str(e)
+        samples.append(sample)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run(args) -> Dict:
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    timeout = httpx.Timeout(args.timeout, connect=10)
+    limits = httpx.Limits(max_connections=args.concurrency + 4, max_keepalive_connections=args.concurrency + 4)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout, limits=limits) as client:
+        for i in range(args.warmup):
+            await run_stream(client, args, f"warmup {i}: {queries[i % len(queries)]}")
+
+        run_id = uuid.uuid4().hex[:8]
+        counter = iter(range(args.requests))
+        results: List[Dict] = []
+        deadline = time.perf_counter() + args.duration if args.duration else None
+
+        async def worker(worker_no: int):
+            await asyncio.sleep(args.ramp_up * worker_no / max(args.concurrency, 1))
+            for request_no in counter:
+                if deadline and time.perf_counter() > deadline:
+                    return
+                query = queries[request_no % len(queries)]
+                if not args.allow_cache_hits:
+                    # Unique per run and request, defeats the semantic response cache
+                    query = f"{query} (run {run_id} request {request_no})"
+                results.append(await run_stream(client, args, query))
+
+        samples: List[Dict] = []
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_server(client, args.sample_interval, samples, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sampler
+        final_loop = (await client.get(STATS_PATH, params={"component": "event_loop"})).json()["event_loop"]
+
+    return build_report(args, results, samples, final_loop, elapsed)
+
+
+def build_report(args, results: List[Dict], samples: List[Dict], final_loop: Dict, elapsed: float) -> Dict:
+    ok = [r for r in results if not r["error"]]
+    errors = [r["error"] for r in results if r["error"]]
+    checked_out = [s["checked_out"] for s in samples if s.get("checked_out") is not None]
+    capacity = next((s["pool_capacity"] for s in samples if s.get("pool_capacity")), None)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "label": args.label,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "requests": len(results),
+            "duration_sec": round(elapsed, 2),
+        },
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0,
+        "error_rate": round(len(errors) / len(results), 4) if results else 0,
+        "errors": sorted(set(errors))[:20],
+        "ttft_ms": percentiles([r["ttft_ms"] for r in ok]),
+        "inter_token_ms": percentiles([gap for r in ok for gap in r["inter_token_ms"]]),
+        "total_ms": percentiles([r["total_ms"] for r in ok]),
+        "text_events_per_stream": percentiles([r["text_events"] for r in ok]),
+        "db_pool": {
+            "capacity": capacity,
+            "peak_checked_out": max(checked_out, default=None),
+            "mean_checked_out": round(sum(checked_out) / len(checked_out), 2) if checked_out else None,
+            "peak_utilization": round(max(checked_out) / capacity, 3) if checked_out and capacity else None,
+        },
+        "event_loop_lag_ms": {
+            "sampled": percentiles([s["loop_lag_window_max_ms"] for s in samples
+                                    if s.get("loop_lag_window_max_ms") is not None]),
+            "p99": final_loop.get("p99_ms"),
+            "max": final_loop.get("window_max_ms"),
+        },
+        "monitor_rtt_ms": percentiles([s["monitor_rtt_ms"] for s in samples if "monitor_rtt_ms" in s]),
+        "samples": samples,
+    }
+
+
+def metric(report: Dict, name: str, key: Optional[str]):
+    value = report.get(name)
+    return value.get(key) if key and isinstance(value, dict) else value
+
+
+def compare(report: Dict, baseline: Dict, threshold_pct: float) -> bool:
+    """Print the change of the key metrics against a baseline report, returns False on a regression"""
+    print(f"\n{'metric':<32}{'baseline':>12}{'current':>12}{'change':>10}")
+    regressed = False
+    for name, key in COMPARED_METRICS:
+        before, after = metric(baseline, name, key), metric(report, name, key)
+        label = f"{name}.{key}" if key else name
+        if before is None or after is None:
+            print(f"{label:<32}{str(before):>12}{str(after):>12}{'n/a':>10}")
+            continue
+        change = (after - before) / before * 100 if before else (0.0 if after == before else float("inf"))
+        flag = " !" if change > threshold_pct else ""
+        regressed = regressed or bool(flag)
+        print(f"{label:<32}{before:>12}{after:>12}{change:>9.1f}%{flag}")
+    return not regressed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent SSE clients")
+    parser.add_argument("--requests", type=int, default=200, help="total chat turns")
+    parser.add_argument("--duration", type=float, default=0, help="stop starting new turns after this many seconds")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="seconds over which clients are started")
+    parser.add_argument("--warmup", type=int, default=2, help="sequential turns before measuring")
+    parser.add_argument("--timeout", type=float, default=120, help="per stream read timeout in seconds")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="seconds between monitoring samples")
+    parser.add_argument("--agent-id", type=int, default=8)
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--course-id", type=int, default=1)
+    parser.add_argument("--queries", help="file with one query per line")
+    parser.add_argument("--allow-cache-hits", action="store_true", help="repeat queries verbatim")
+    parser.add_argument("--label", help="free text stored in the report, e.g. the change being measured")
+    parser.add_argument("--output", default="host_agent_load.json")
+    parser.add_argument("--compare", help="baseline report to compare with")
+    parser.add_argument("--regression-threshold", type=float, default=10.0,
+                        help="percent worsening of a compared metric that fails the run")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    summary = {key: report[key] for key in ("throughput_rps", "error_rate", "ttft_ms", "inter_token_ms",
+                                            "db_pool", "event_loop_lag_ms")}
+    print(json.dumps(summary, indent=2))
+    print(f"Report written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            return 0 if compare(report, json.load(f), args.regression_threshold) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,22 @@
 import pytest
-from fastapi import HTTPException
+from fastapi import FastAPI, HTTPException
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
+from ai_platform.agents.stream_events import StreamEvent
 from ai_platform.apis.agents.view import router, extract_text_from_file, agents
 from ai_platform.schemas.ai_agent import AiAgentCreate, AiAgentUpdate
+from ai_platform.supafast.database import get_db
 from ai_platform.supafast.models.ai_agent import AiAgent
-from ai_platform.vectordb.db_pgvector import PgvectorDB
 from unittest.mock import Mock, patch, AsyncMock
 import uuid
 from datetime import datetime
 import json
 from io import BytesIO
 
-# Create a test client for the router
-client = TestClient(router)
+# Create a test client for the router, mounted where the API router mounts it
+app = FastAPI()
+app.include_router(router, prefix="/agent")
+client = TestClient(app)
 
 # Mock data
 mock_agent = AiAgent(id=1, name="Test Agent", description="Test Description")
@@ -23,17 +26,34 @@ mock_conversation_id = uuid.uuid4()
 @pytest.fixture
 def mock_db():
     """Fixture to mock database session"""
-    return Mock(spec=Session)
+    db = Mock(spec=Session)
+    app.dependency_overrides[get_db] = lambda: db
+    yield db
+    app.dependency_overrides.clear()
 
 
 @pytest.fixture
 def mock_vectorstore():
-    """Fixture to mock PgvectorDB"""
-    with patch("ai_platform.apis.agents.view.PgvectorDB") as mock:
-        instance = mock.return_value
-        instance.create_docs_from_text.return_value = ["doc1", "doc2"]
-        instance.create_embeddings.return_value = None
-        yield mock
+    """Fixture to mock the vector store registry and the ingestion pipeline"""
+    report = {"inserted": 2, "embedded": 2, "reused": 0, "duplicates": 0, "existing": 0, "failed": 0}
+    with patch("ai_platform.apis.agents.view.vector_stores") as stores, \
+            patch("ai_platform.apis.agents.view.IngestionPipeline") as pipeline:
+        stores.get.return_value.create_docs_from_text.return_value = ["doc1", "doc2"]
+        pipeline.return_value.ingest = AsyncMock(return_value=report)
+        pipeline.return_value.run = Mock(side_effect=lambda docs: ingestion_events(report))
+        yield stores
+
+
+async def ingestion_events(report):
+    yield StreamEvent("progress", stage="planned", to_insert=2)
+    yield StreamEvent("result", **report)
+
+
+@pytest.fixture
+def no_cache_lookup():
+    """The response cache lookup embeds the query, skip it"""
+    with patch.object(agents, "cache_lookup", new=AsyncMock(return_value=(None, None))):
+        yield
 
 
 def test_extract_text_from_file_pdf():
@@ -68,6 +88,20 @@ def test_create_knowledge_base_with_content(mock_vectorstore):
     assert response.json()["status"] == True
     assert response.json()["document_inserted_count"] == 2
     assert response.json()["vector_index"] == "test_index"
+    mock_vectorstore.get.assert_called_once_with("test_index")
+
+
+def test_create_knowledge_base_stream(mock_vectorstore):
+    """Test the streamed variant reports the ingestion progress and result"""
+    response = client.post(
+        "/agent/create_knowledgebase/stream",
+        data={"vector_index": "test_index", "content": "Test content"}
+    )
+
+    assert response.status_code == 200
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert [event["type"] for event in events] == ["progress", "result", "end"]
+    assert events[1]["inserted"] == 2
 
 
 def test_create_knowledge_base_no_input():
@@ -145,17 +179,18 @@ def test_delete_agent_success(mock_db):
     assert response.json()["id"] == 1
 
 
-def test_stream_agent_response_new_conversation(mock_db):
+def test_stream_agent_response_new_conversation(mock_db, no_cache_lookup):
     """Test streaming agent response with new conversation"""
     with patch("ai_platform.apis.agents.view.get_agent", return_value=mock_agent), \
-            patch("ai_platform.apis.agents.view.create_conversation", return_value=mock_conversation_id), \
-            patch("ai_platform.apis.agents.view.update_conversation", return_value=Mock(title="Test Chat")):
+            patch("ai_platform.apis.agents.pipeline.create_conversation", return_value=mock_conversation_id), \
+            patch("ai_platform.apis.agents.view.update_conversation",
+                  return_value=Mock(title="Test Chat", created_at=datetime.now(), modified_at=datetime.now())):
         # Mock the async stream_response method
         async def mock_stream_response(*args, **kwargs):
-            yield json.dumps({"type": "text", "content": "Hello"})
-            yield json.dumps({"type": "end"})
+            yield StreamEvent.text("Hello")
+            yield StreamEvent.end()
 
-        with patch.object(agents, "stream_response", new=AsyncMock(side_effect=mock_stream_response)):
+        with patch.object(agents, "stream_response", new=mock_stream_response):
             response = client.get(
                 "/agent/host_agent",
                 params={
@@ -171,18 +206,19 @@ def test_stream_agent_response_new_conversation(mock_db):
     assert any("data: {\"type\":\"end\"}" in line for line in content)
 
 
-def test_stream_agent_response_existing_conversation(mock_db):
+def test_stream_agent_response_existing_conversation(mock_db, no_cache_lookup):
     """Test streaming agent response with existing conversation"""
-    mock_conversation = Mock(user_id=1, title="Existing Chat")
+    mock_conversation = Mock(user_id=1, title="Existing Chat", summary=None, summarized_until=0,
+                             created_at=datetime.now(), modified_at=datetime.now())
 
     with patch("ai_platform.apis.agents.view.get_agent", return_value=mock_agent), \
-            patch("ai_platform.apis.agents.view.get_conversation", return_value=mock_conversation), \
+            patch("ai_platform.apis.agents.pipeline.get_conversation", return_value=mock_conversation), \
             patch("ai_platform.apis.agents.view.update_conversation", return_value=mock_conversation):
         async def mock_stream_response(*args, **kwargs):
-            yield json.dumps({"type": "text", "content": "Response"})
-            yield json.dumps({"type": "end"})
+            yield StreamEvent.text("Response")
+            yield StreamEvent.end()
 
-        with patch.object(agents, "stream_response", new=AsyncMock(side_effect=mock_stream_response)):
+        with patch.object(agents, "stream_response", new=mock_stream_response):
             response = client.get(
                 "/agent/host_agent",
                 params={
@@ -198,6 +234,29 @@ def test_stream_agent_response_existing_conversation(mock_db):
     assert any("data: {\"type\":\"text\",\"content\":\"Response\"}" in line for line in content)
 
 
+def test_stream_agent_response_conversation_of_another_user(mock_db):
+    """Test the conversation owner is checked before the query is looked up or routed"""
+    mock_conversation = Mock(user_id=2, summary=None, summarized_until=0)
+    cache_lookup = AsyncMock(return_value=(None, None))
+
+    with patch("ai_platform.apis.agents.view.get_agent", return_value=mock_agent), \
+            patch("ai_platform.apis.agents.pipeline.get_conversation", return_value=mock_conversation), \
+            patch.object(agents, "cache_lookup", new=cache_lookup):
+        response = client.get(
+            "/agent/host_agent",
+            params={
+                "query": "Hello",
+                "user_id": 1,
+                "conversation_id": str(mock_conversation_id),
+                "history": json.dumps([{"role": "user", "content": "Previous"}])
+            }
+        )
+
+    assert response.status_code == 404
+    assert response.json()["error"] == "Conversation not found or access denied"
+    cache_lookup.assert_not_called()
+
+
 def test_stream_agent_response_invalid_history(mock_db):
     """Test streaming with invalid history format"""
     with patch("ai_platform.apis.agents.view.get_agent", return_value=mock_agent):
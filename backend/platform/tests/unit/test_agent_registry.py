@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ai_platform.agents.agent_registry import AgentRegistry
+from ai_platform.supafast.models.ai_agent import AiAgent
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+AiAgent.__table__.create(engine)
+TestSession = sessionmaker(bind=engine)
+
+
+def add_agent(**kwargs):
+    db = TestSession()
+    db.add(AiAgent(**kwargs))
+    db.commit()
+    db.close()
+
+
+def test_registry_reloads_on_version_change():
+    add_agent(id=1, name="host agent", model_name="gpt-4o-mini")
+    registry = AgentRegistry(session_factory=TestSession, ttl=0)
+    assert registry.get(1).model_name == "gpt-4o-mini"
+
+    # Simulate an edit made by another worker
+    db = TestSession()
+    agent = db.get(AiAgent, 1)
+    agent.model_name = "gpt-4o"
+    agent.config_version += 1
+    db.commit()
+    db.close()
+
+    registry.refresh()
+    assert registry.get(1).model_name == "gpt-4o"
+
+
+@pytest.mark.asyncio
+async def test_registry_keeps_snapshot_within_ttl():
+    add_agent(id=2, name="parser agent")
+    registry = AgentRegistry(session_factory=TestSession, ttl=3600)
+    assert registry.get(2) is not None
+
+    add_agent(id=3, name="course agent")
+    registry.refresh()
+    assert registry.get(3) is None
+
+    # A lookup after invalidate() serves the previous snapshot instead of querying the database on the loop
+    registry.invalidate()
+    assert registry.get(3) is None and registry.get(2) is not None
+    await registry.refresh_if_stale()
+    assert registry.get(3).name == "course agent"
+
+
+def test_lookups_after_invalidate_never_query_the_database():
+    registry = AgentRegistry(session_factory=TestSession, ttl=3600)
+    assert registry.all().get(2) is not None
+
+    def unreachable():
+        raise AssertionError("the snapshot was reloaded by a lookup")
+
+    registry.session_factory = unreachable
+    registry.invalidate()  # e.g. a CRUD write on a threadpool worker
+    assert registry.all().get(2) is not None
@@ -0,0 +1,88 @@
+import uuid
+
+from langchain_core.documents import Document
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ai_platform.supafast.models.embedding_cache import EmbeddingCacheEntry
+from ai_platform.vectordb.db_pgvector import PgvectorDB
+from ai_platform.vectordb.embedding_cache import EmbeddingCache, content_hash
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+EmbeddingCacheEntry.__table__.create(engine)
+TestSession = sessionmaker(bind=engine)
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+
+class MemoryPgvectorDB(PgvectorDB):
+    """PgvectorDB whose collection is a dict, the ingestion logic runs unchanged"""
+
+    def __init__(self, collection_name, cache):
+        self.collection = collection_name
+        self.embedding_fn = CountingEmbeddings()
+        self.embedding_model = "text-embedding-3-small"
+        self.embedding_cache = cache
+        self.vectorstore = self
+        self.rows = {}
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        for text, embedding, id in zip(texts, embeddings, ids or [str(uuid.uuid4()) for _ in texts]):
+            self.rows[id] = (text, embedding)
+
+    def _existing_ids(self, ids):
+        return set(ids) & set(self.rows)
+
+
+def docs(*texts):
+    return [Document(page_content=text, metadata={"n": i}) for i, text in enumerate(texts)]
+
+
+def test_key_covers_model_dimensions_and_normalized_text():
+    key = content_hash("Week 1:  linear\nregression ", "text-embedding-3-small")
+    assert key == content_hash("Week 1: linear regression", "text-embedding-3-small")
+    assert key != content_hash("Week 1: linear regression", "text-embedding-3-large")
+    assert key != content_hash("Week 1: linear regression", "text-embedding-3-small", dimensions=512)
+
+
+def test_reupload_reuses_the_cache_and_skips_the_chunks_already_indexed():
+    cache = EmbeddingCache(session_factory=TestSession)
+    store = MemoryPgvectorDB("kb_ml", cache)
+
+    first = store.create_embeddings(docs("intro", "gradient descent", "intro"))
+    assert (first["inserted"], first["duplicates"], first["embedded"], first["reused"]) == (2, 1, 2, 0)
+
+    again = store.create_embeddings(docs("intro", "gradient descent", "regularization"))
+    assert (again["existing"], again["inserted"], again["embedded"]) == (2, 1, 1)
+    assert store.embedding_fn.embedded == ["intro", "gradient descent", "regularization"]
+
+    # Another collection gets its own rows, the embeddings come from the cache
+    other = MemoryPgvectorDB("kb_stats", cache)
+    report = other.create_embeddings(docs("gradient descent", "regularization"))
+    assert (report["inserted"], report["reused"], report["embedded"]) == (2, 2, 0)
+    assert other.embedding_fn.embedded == []
+    assert sorted(text for text, _ in other.rows.values()) == ["gradient descent", "regularization"]
+    assert other.rows[other._content_id(content_hash("regularization", other.embedding_model))][1] == [14.0, 1.0, 0.5]
+    assert cache.get_stats()["hits"] == 2
+
+
+def test_duplicate_insertion_keeps_repeated_rows_and_a_broken_cache_only_costs_embeddings():
+    store = MemoryPgvectorDB("kb_ml", EmbeddingCache(session_factory=TestSession))
+    report = store.create_embeddings(docs("intro", "intro"), deduplicate=False)
+    assert (report["inserted"], len(store.rows)) == (2, 2)
+
+    def broken_session():
+        raise RuntimeError("db down")
+
+    offline = MemoryPgvectorDB("kb_ml", EmbeddingCache(session_factory=broken_session))
+    report = offline.create_embeddings(docs("intro", "syllabus"))
+    assert (report["inserted"], report["embedded"]) == (2, 2)
+    assert offline.embedding_cache.get_stats()["errors"] == 2
@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ai_platform.agents import framework_agentic
+from ai_platform.agents.agent_registry import AgentRegistry
+from ai_platform.agents.framework_agentic import Agents
+from ai_platform.agents.vector_math import dot
+from ai_platform.llm.fake_provider import FakeProvider
+from ai_platform.llm.governor import LLMGovernor, GovernedProvider
+from ai_platform.supafast.models.ai_agent import AiAgent
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+AiAgent.__table__.create(engine)
+TestSession = sessionmaker(bind=engine)
+
+db = TestSession()
+db.add(AiAgent(id=8, name="host agent", model_name="gpt-4o-mini", system_prompt="You help students."))
+db.commit()
+db.close()
+
+TOOL_SCRIPT = [{"tool_calls": [{"name": "get_course_content", "arguments": {"course_id": 1, "week_no": 2}}]}]
+
+
+def make_agents(**kwargs):
+    llm = FakeProvider(latency_ms=0, tokens_per_sec=0, reply_tokens=12, **kwargs)
+    agents = Agents(llm=llm)
+    agents.registry = AgentRegistry(session_factory=TestSession, ttl=3600)
+    agents.router, agents.response_cache = None, None
+    return agents, llm
+
+
+@pytest.mark.asyncio
+async def test_fake_stream_is_deterministic():
+    llm = FakeProvider(latency_ms=0, tokens_per_sec=0, reply_tokens=8)
+    params = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "What is in week 2?"}]}
+
+    async def answer():
+        stream = await llm.stream_chat(**params, stream_options={"include_usage": True})
+        chunks = [chunk async for chunk in stream]
+        return "".join(c.choices[0].delta.content or "" for c in chunks if c.choices), chunks[-1].usage
+
+    (first, usage), (second, _) = await answer(), await answer()
+    assert first == second
+    assert usage.completion_tokens == 8
+    assert (await llm.chat(**params)).choices[0].message.content == first
+
+
+@pytest.mark.asyncio
+async def test_stream_response_runs_scripted_tool_calls(monkeypatch):
+    agents, llm = make_agents(tool_script=TOOL_SCRIPT)
+    tool_args = []
+    monkeypatch.setitem(framework_agentic.AVAILABLE_TOOLS, "get_course_content",
+                        lambda db, **args: tool_args.append(args) or {"content": {"course_title": "BDM"}})
+
+    events = [event async for event in agents.stream_response("What is in week 2?", agent_id=8, course_id=1)]
+
+    assert tool_args == [{"course_id": 1, "week_no": 2}]
+    assert events[-1].type == "end"
+    assert "".join(event.content for event in events if event.type == "text")
+    # Second request carries the tool result, the model then answers with text
+    assert len(llm.requests) == 2
+    assert llm.requests[1]["messages"][-1]["role"] == "tool"
+
+
+@pytest.mark.asyncio
+async def test_fake_embeddings_similarity():
+    llm = FakeProvider(latency_ms=0)
+    query, paraphrase, other = await llm.embed(["week 2 lectures of bdm", "bdm lectures of week 2", "python loops"])
+    assert dot(query, paraphrase) > 0.99
+    assert dot(query, other) < 0.5
+
+
+@pytest.mark.asyncio
+async def test_closing_stream_response_stops_the_completion():
+    governor = LLMGovernor(max_concurrent=4, requests_per_min=0, tokens_per_min=0)
+    llm = GovernedProvider(FakeProvider(latency_ms=0, tokens_per_sec=200, reply_tokens=100), governor)
+    agents = Agents(llm=llm)
+    agents.registry = AgentRegistry(session_factory=TestSession, ttl=3600)
+    agents.router, agents.response_cache = None, None
+
+    stream = agents.stream_response("What is in week 2?", agent_id=8)
+    received = [await stream.__anext__() for _ in range(3)]
+    await stream.aclose()
+
+    assert all(event.type == "text" for event in received)
+    assert governor.in_flight == 0
+    assert agents.cancellation_stats["streams"] == 1
+    assert 0 < agents.cancellation_stats["completion_tokens"] < 100
@@ -15,20 +15,21 @@ def test_load_agents_from_db():
         print(value.__dict__)
 
 
-def test_execute_agent_sync():
-    response = agents._execute_agent_sync(agent_id=8,
-                                          user_query="How many weeks there are in course id 1")
+@pytest.mark.asyncio
+async def test_execute_agent():
+    response = await agents._execute_agent(agent_id=8,
+                                           user_query="How many weeks there are in course id 1")
     print(response)
 
 
 @pytest.mark.asyncio
 async def test_stream_response():
     """
-    Test the stream_response method with the same query as test_execute_agent_sync
+    Test the stream_response method with the same query as test_execute_agent
     """
 
 
-    # Using the same parameters as in test_execute_agent_sync
+    # Using the same parameters as in test_execute_agent
     user_input = "How many weeks there are in course id 1"
     agent_id = 8
     course_id = 1
@@ -54,9 +55,9 @@ async def test_stream_response():
                 print("Empty chunk received, skipping...")
                 continue
 
-            # Try to parse JSON, but handle errors
+            # Events are typed objects, read them as dicts
             try:
-                chunk_data = json.loads(chunk)
+                chunk_data = chunk.to_dict()
                 print(f"Parsed chunk type: {chunk_data.get('type', 'unknown')}")
 
                 # For text chunks, print a preview of the content
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from ai_platform.agents.history_budget import HistoryBudgeter
+from ai_platform.agents.tokens import count_message_tokens
+from ai_platform.apis.agents import pipeline
+
+HISTORY = [
+    {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " * 20}
+    for i in range(10)
+]
+
+
+def test_newest_messages_fit_in_budget():
+    budget = count_message_tokens(HISTORY[-1]) * 3
+    budgeter = HistoryBudgeter(budget_tokens=budget)
+    overflow, recent = budgeter.split(HISTORY)
+
+    assert recent == HISTORY[-3:]
+    assert overflow == HISTORY[:-3]
+
+
+def test_split_skips_already_summarized_messages():
+    budgeter = HistoryBudgeter(budget_tokens=count_message_tokens(HISTORY[-1]) * 3)
+    overflow, recent = budgeter.split(HISTORY, summarized_until=6)
+
+    assert overflow == HISTORY[6:7]
+    assert recent == HISTORY[-3:]
+
+
+def test_newest_message_is_always_kept():
+    budgeter = HistoryBudgeter(budget_tokens=1)
+    overflow, recent = budgeter.split(HISTORY)
+
+    assert recent == HISTORY[-1:]
+    assert len(overflow) == len(HISTORY) - 1
+
+
+@pytest.mark.asyncio
+async def test_summary_is_folded_after_the_stream_in_its_own_task(monkeypatch):
+    saved = []
+    monkeypatch.setattr(pipeline, "_save_summary", lambda *args: saved.append(args))
+    release = asyncio.Event()
+
+    class SlowSummaries:
+        async def summarize_history(self, history, history_summary, summarized_until, agent_id=None):
+            await release.wait()  # e.g. queued behind interactive calls in the governor
+            return "summary", summarized_until + 4
+
+    task = pipeline.schedule_history_summary(SlowSummaries(), "conversation", [], None, 2, agent_id=8)
+    await asyncio.sleep(0)
+    assert not task.done() and saved == []
+    release.set()
+    await task
+    assert saved == [("conversation", "summary", 6)]
+
+
+def test_overflow_stays_in_the_prompt_until_a_summary_covers_it():
+    from ai_platform.agents.framework_agentic import Agents
+    from ai_platform.llm.fake_provider import FakeProvider
+
+    agents = Agents(llm=FakeProvider())
+    agents.history_budgeter = HistoryBudgeter(budget_tokens=count_message_tokens(HISTORY[-1]) * 3)
+
+    before_fold = agents._history_messages(HISTORY, "summary of 0-3", summarized_until=4, keep_overflow=True)
+    assert [msg["content"] for msg in before_fold[1:]] == [msg["content"] for msg in HISTORY[4:]]
+
+    after_fold = agents._history_messages(HISTORY, "summary of 0-6", summarized_until=7, keep_overflow=True)
+    assert [msg["content"] for msg in after_fold[1:]] == [msg["content"] for msg in HISTORY[7:]]
+
+
+@pytest.mark.asyncio
+async def test_a_conversation_is_folded_once_at_a_time(monkeypatch):
+    monkeypatch.setattr(pipeline, "_save_summary", lambda *args: None)
+    release = asyncio.Event()
+    calls = []
+
+    class SlowSummaries:
+        async def summarize_history(self, history, history_summary, summarized_until, agent_id=None):
+            calls.append(summarized_until)
+            await release.wait()
+            return "summary", summarized_until + 4
+
+    first = pipeline.schedule_history_summary(SlowSummaries(), "conversation", [], None, 2, agent_id=8)
+    assert pipeline.schedule_history_summary(SlowSummaries(), "conversation", [], None, 2, agent_id=8) is None
+    release.set()
+    await first
+    await asyncio.sleep(0)
+    assert calls == [2]
+    assert pipeline.schedule_history_summary(SlowSummaries(), "conversation", [], "summary", 6, agent_id=8) is not None
+    await asyncio.sleep(0)
+    assert calls == [2, 6]
@@ -0,0 +1,41 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from ai_platform.apis.agents import pipeline
+
+
+class RecordingAgents:
+    """Records the stages that cost an embedding or an LLM call"""
+
+    def __init__(self):
+        self.calls = []
+        self.router = None
+        self.response_cache = None
+
+    async def cache_lookup(self, agent_id, course_id, query, history, version=None):
+        self.calls.append("cache_lookup")
+        return [1.0], None
+
+    async def parser_route(self, query, context=None, history=None):
+        self.calls.append("parser")
+        return None
+
+
+@pytest.mark.asyncio
+async def test_conversation_of_another_user_is_rejected_before_anything_is_billed(monkeypatch):
+    conversation = {"user_id": 7, "summary": None, "summarized_until": 0}
+    monkeypatch.setattr(pipeline, "_load_conversation", lambda conversation_id: conversation)
+    agents = RecordingAgents()
+    agent = SimpleNamespace(id=8, name="host agent", model_name="gpt-4o-mini")
+
+    with pytest.raises(pipeline.ConversationAccessDenied):
+        await pipeline.assemble_host_agent_context(agents, agent, "What is in week 2?", None, uuid.uuid4(), [],
+                                                   None, pipeline.StageTimer(), user_id=9)
+    assert agents.calls == []
+
+    assembled = await pipeline.assemble_host_agent_context(agents, agent, "What is in week 2?", None, uuid.uuid4(),
+                                                           [], None, pipeline.StageTimer(), user_id=7)
+    assert assembled["conversation"] == conversation
+    assert sorted(agents.calls) == ["cache_lookup", "parser"]
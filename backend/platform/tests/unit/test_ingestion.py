@@ -0,0 +1,106 @@
+import asyncio
+import uuid
+
+import pytest
+from langchain_core.documents import Document
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ai_platform.supafast.models.embedding_cache import EmbeddingCacheEntry
+from ai_platform.vectordb.db_pgvector import PgvectorDB
+from ai_platform.vectordb.embedding_cache import EmbeddingCache
+from ai_platform.vectordb.ingestion import IngestionPipeline
+
+
+class SlowEmbeddings:
+    """Async embeddings that take a moment per request and fail the first requests containing `flaky`"""
+
+    def __init__(self, flaky: str = None, failures: int = 0):
+        self.requests = []
+        self.in_flight = self.max_in_flight = 0
+        self.flaky, self.failures = flaky, failures
+
+    async def aembed_documents(self, texts):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            self.requests.append(list(texts))
+            if self.flaky in texts and self.failures:
+                self.failures -= 1
+                raise RuntimeError("rate limited")
+            return [[float(len(text)), 0.5] for text in texts]
+        finally:
+            self.in_flight -= 1
+
+
+class MemoryPgvectorDB(PgvectorDB):
+    def __init__(self, embedding_fn):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        EmbeddingCacheEntry.__table__.create(engine)
+        self.collection = "kb_ml"
+        self.embedding_fn = embedding_fn
+        self.embedding_model = "text-embedding-3-small"
+        self.embedding_cache = EmbeddingCache(session_factory=sessionmaker(bind=engine))
+        self.vectorstore = self
+        self.rows, self.inserts = {}, []
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        self.inserts.append(len(texts))
+        for text, embedding, id in zip(texts, embeddings, ids or [str(uuid.uuid4()) for _ in texts]):
+            self.rows[id] = (text, embedding)
+
+    def _existing_ids(self, ids):
+        return set(ids) & set(self.rows)
+
+
+def chunks(count, prefix="chunk"):
+    return [Document(page_content=f"{prefix} {i} " + "word " * 20, metadata={"i": i}) for i in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_batches_are_bounded_concurrent_and_inserted_one_statement_each():
+    embeddings = SlowEmbeddings()
+    store = MemoryPgvectorDB(embeddings)
+    pipeline = IngestionPipeline(store, batch_size=10, batch_tokens=60, concurrency=3, max_retries=0)
+
+    events = [event async for event in pipeline.run(chunks(25))]
+    assert events[0].fields["stage"] == "planned" and events[0].fields["to_embed"] == 25
+    result = events[-1].fields
+    assert (result["inserted"], result["embedded"], result["failed"]) == (25, 25, 0)
+    # ~25 tokens a chunk, the token bound cuts the batches before the size bound does
+    assert all(len(request) == 2 for request in embeddings.requests[:-1])
+    assert embeddings.max_in_flight == 3
+    assert sorted(store.inserts) == sorted(len(request) for request in embeddings.requests)
+    assert [event.fields["completed_batches"] for event in events[1:-1]] == list(range(1, result["batches"] + 1))
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_alone_and_cached_chunks_skip_the_model():
+    docs = chunks(6)
+    embeddings = SlowEmbeddings(flaky=docs[4].page_content, failures=1)
+    store = MemoryPgvectorDB(embeddings)
+    pipeline = IngestionPipeline(store, batch_size=2, concurrency=2, retry_delay=0)
+
+    report = await pipeline.ingest(docs)
+    assert (report["inserted"], report["failed"]) == (6, 0)
+    assert len(embeddings.requests) == 4  # three batches, the failed one sent twice
+    assert embeddings.requests.count([docs[4].page_content, docs[5].page_content]) == 2
+
+    # Another collection: every chunk comes from the embedding cache
+    other = MemoryPgvectorDB(SlowEmbeddings())
+    other.embedding_cache = store.embedding_cache
+    other.collection = "kb_stats"
+    report = await IngestionPipeline(other, batch_size=4).ingest(docs + chunks(2, prefix="new"))
+    assert (report["reused"], report["embedded"], report["inserted"]) == (6, 2, 8)
+    assert other.embedding_fn.requests == [[doc.page_content for doc in chunks(2, prefix="new")]]
+
+
+@pytest.mark.asyncio
+async def test_batch_failing_every_retry_is_reported_and_the_rest_inserted():
+    docs = chunks(4)
+    store = MemoryPgvectorDB(SlowEmbeddings(flaky=docs[0].page_content, failures=5))
+    report = await IngestionPipeline(store, batch_size=2, max_retries=1, retry_delay=0).ingest(docs)
+    assert (report["inserted"], report["failed"]) == (2, 2)
+    assert sorted(text for text, _ in store.rows.values()) == [docs[2].page_content, docs[3].page_content]
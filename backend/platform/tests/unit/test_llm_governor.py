@@ -0,0 +1,138 @@
+import asyncio
+import gc
+import threading
+import time
+
+import pytest
+
+from ai_platform.llm.base import close_stream
+from ai_platform.llm.fake_provider import FakeProvider
+from ai_platform.llm.governor import LLMGovernor, GovernedProvider, LLMQueueTimeout, llm_priority, \
+    INTERACTIVE, BACKGROUND, INGESTION
+
+
+def make_governor(**kwargs):
+    params = {"max_concurrent": 1, "requests_per_min": 0, "tokens_per_min": 0,
+              "queue_timeouts": {INTERACTIVE: 5, BACKGROUND: 5, INGESTION: 5}}
+    return LLMGovernor(**{**params, **kwargs})
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_overtake_queued_ingestion():
+    governor = make_governor()
+    held = await governor.acquire(10)
+    order = []
+
+    async def call(name, priority):
+        async with governor.slot(10, priority=priority):
+            order.append(name)
+
+    waiting = [asyncio.create_task(call("ingestion", INGESTION)), asyncio.create_task(call("summary", BACKGROUND))]
+    await asyncio.sleep(0.01)
+    with llm_priority(INTERACTIVE):
+        waiting.append(asyncio.create_task(call("chat", None)))
+    await asyncio.sleep(0.01)
+    assert governor.get_stats()["queued"] == 3
+
+    governor.release(held)
+    await asyncio.gather(*waiting)
+    assert order == ["chat", "summary", "ingestion"]
+    assert governor.get_stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_delays_calls_over_the_minute_budget():
+    governor = make_governor(max_concurrent=0, tokens_per_min=6000)  # 100 tokens a second
+    async with governor.slot(6000):
+        pass
+    started = time.monotonic()
+    async with governor.slot(30):
+        pass
+    assert 0.2 < time.monotonic() - started < 1.0
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_fails_the_call_and_leaves_the_queue():
+    governor = make_governor(queue_timeouts={INTERACTIVE: 0.05, BACKGROUND: 5, INGESTION: 5})
+    held = await governor.acquire(10)
+    with pytest.raises(LLMQueueTimeout):
+        await governor.acquire(10)
+    stats = governor.get_stats()
+    assert stats["queued"] == 0
+    assert stats["classes"]["interactive"]["timeouts"] == 1
+    governor.release(held)
+
+
+@pytest.mark.asyncio
+async def test_worker_threads_share_the_queue():
+    governor = make_governor()
+    held = await governor.acquire(10)
+    granted = threading.Event()
+
+    def worker():
+        with governor.slot_sync(10, priority=INGESTION):
+            granted.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    await asyncio.sleep(0.05)
+    assert not granted.is_set()
+    governor.release(held)
+    await asyncio.to_thread(thread.join, 2)
+    assert granted.is_set()
+
+
+@pytest.mark.asyncio
+async def test_stream_holds_a_stream_grant_and_reports_usage():
+    governor = make_governor(max_concurrent=1, tokens_per_min=100000)
+    llm = GovernedProvider(FakeProvider(latency_ms=0, tokens_per_sec=0, reply_tokens=10), governor)
+
+    stream = await llm.stream_chat(model="gpt-4o-mini", messages=[{"role": "user", "content": "Hi"}],
+                                   max_tokens=500, stream_options={"include_usage": True})
+    # An open stream doesn't take one of the concurrent call slots
+    assert governor.streams == 1 and governor.in_flight == 0
+    completion = await llm.chat(model="gpt-4o-mini", messages=[{"role": "user", "content": "Hi"}])
+    chunks = [chunk async for chunk in stream]
+    assert governor.streams == 0
+    # The reserved completion budget is refunded down to the reported usage
+    used = chunks[-1].usage.total_tokens + completion.usage.total_tokens
+    assert governor.tokens.level > 100000 - used - 5
+    assert governor.get_stats()["classes"]["interactive"]["granted"] == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_closed_before_its_first_chunk_releases_its_grant():
+    governor = make_governor(max_streams=1)
+    llm = GovernedProvider(FakeProvider(latency_ms=0, tokens_per_sec=0, reply_tokens=10), governor)
+    params = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "Hi"}]}
+
+    stream = await llm.stream_chat(**params)
+    assert governor.streams == 1
+    await close_stream(stream)
+    await close_stream(stream)
+    assert governor.streams == 0
+    assert [chunk async for chunk in stream] == []
+
+    # A stream dropped without being closed gives its grant back when it is collected
+    stream = await llm.stream_chat(**params)
+    del stream
+    gc.collect()
+    assert governor.streams == 0
+    stream = await asyncio.wait_for(llm.stream_chat(**params), 1)
+    assert [chunk async for chunk in stream]
+    assert governor.streams == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_limit_is_separate_from_the_call_limit():
+    governor = make_governor(max_concurrent=1, max_streams=1,
+                             queue_timeouts={INTERACTIVE: 0.1, BACKGROUND: 0.1, INGESTION: 0.1})
+    llm = GovernedProvider(FakeProvider(latency_ms=0, tokens_per_sec=0, reply_tokens=10), governor)
+    params = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "Hi"}]}
+
+    stream = await llm.stream_chat(**params)
+    with pytest.raises(LLMQueueTimeout):
+        await llm.stream_chat(**params)
+    async with governor.slot(10):
+        assert governor.in_flight == 1 and governor.streams == 1
+    await stream.aclose()
@@ -0,0 +1,22 @@
+import asyncio
+import time
+
+import pytest
+
+from ai_platform.apis.monitoring.loop_monitor import EventLoopMonitor
+
+
+@pytest.mark.asyncio
+async def test_loop_monitor_detects_blocking_work():
+    monitor = EventLoopMonitor(interval_ms=10)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    time.sleep(0.2)  # blocks the loop like a sync DB call would
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+
+    stats = monitor.get_stats()
+    assert not stats["running"]
+    assert stats["samples"] >= 3
+    assert stats["max_ms"] >= 150
+    assert stats["p50_ms"] < 50
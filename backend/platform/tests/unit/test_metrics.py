@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ai_platform.agents import framework_agentic
+from ai_platform.agents.agent_registry import AgentRegistry
+from ai_platform.agents.framework_agentic import Agents
+from ai_platform.agents.metrics import MetricsRegistry, metrics, TIME_TO_FIRST_TOKEN, STREAM_DURATION, \
+    PROMPT_TOKENS, COMPLETION_TOKENS, TOOL_CALLS
+from ai_platform.llm.fake_provider import FakeProvider
+from ai_platform.supafast.models.ai_agent import AiAgent
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+AiAgent.__table__.create(engine)
+TestSession = sessionmaker(bind=engine)
+
+db = TestSession()
+db.add(AiAgent(id=21, name="host agent", model_name="gpt-4o-mini", system_prompt="You help students."))
+db.commit()
+db.close()
+
+
+def test_histogram_and_counter_text_format():
+    registry = MetricsRegistry()
+    latency = registry.histogram("stage_seconds", "Stage latency", ("agent_id", "model"), buckets=(0.1, 1))
+    calls = registry.counter("calls_total", "Calls", ("tool",))
+    latency.observe(0.05, 8, "gpt-4o")
+    latency.observe(0.5, 8, "gpt-4o")
+    calls.inc('say "hi"')
+    registry.register_collector(lambda: [("queue_depth", "gauge", "Queued calls", [({"priority": "chat"}, 3)])])
+
+    lines = registry.render().splitlines()
+    assert "# TYPE stage_seconds histogram" in lines
+    assert 'stage_seconds_bucket{agent_id="8",model="gpt-4o",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{agent_id="8",model="gpt-4o",le="1"} 2' in lines
+    assert 'stage_seconds_bucket{agent_id="8",model="gpt-4o",le="+Inf"} 2' in lines
+    assert 'stage_seconds_count{agent_id="8",model="gpt-4o"} 2' in lines
+    assert 'calls_total{tool="say \\"hi\\""} 1' in lines
+    assert 'queue_depth{priority="chat"} 3' in lines
+
+
+@pytest.mark.asyncio
+async def test_stream_response_records_latency_tokens_and_tool_calls(monkeypatch):
+    script = [{"tool_calls": [{"name": "get_course_content", "arguments": {"course_id": 1}}]}]
+    llm = FakeProvider(latency_ms=0, tokens_per_sec=0, reply_tokens=12, tool_script=script)
+    agents = Agents(llm=llm)
+    agents.registry = AgentRegistry(session_factory=TestSession, ttl=3600)
+    agents.router, agents.response_cache = None, None
+    monkeypatch.setitem(framework_agentic.AVAILABLE_TOOLS, "get_course_content", lambda db, **args: {"content": {}})
+
+    [event async for event in agents.stream_response("What is in week 2?", agent_id=21, course_id=1)]
+
+    labels = (21, "gpt-4o-mini")
+    assert TIME_TO_FIRST_TOKEN.count(*labels) == 1
+    assert STREAM_DURATION.count(*labels) == 1
+    assert TOOL_CALLS.value(*labels, "get_course_content") == 1
+    # Both rounds report their usage in the last chunk of the stream
+    assert all(request["stream_options"] == {"include_usage": True} for request in llm.requests)
+    assert COMPLETION_TOKENS.value(*labels) >= 12
+    assert PROMPT_TOKENS.value(*labels) > 0
+    assert 'agent_stream_duration_seconds_count{agent_id="21",model="gpt-4o-mini"} 1' in metrics.render()
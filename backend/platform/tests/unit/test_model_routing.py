@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ai_platform.agents.agent_registry import AgentRegistry
+from ai_platform.agents.framework_agentic import Agents
+from ai_platform.agents.model_routing import ModelRouter, RoutingSignals, FAST, STRONG
+from ai_platform.llm.fake_provider import FakeProvider
+from ai_platform.supafast.models.ai_agent import AiAgent
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+AiAgent.__table__.create(engine)
+TestSession = sessionmaker(bind=engine)
+
+db = TestSession()
+db.add(AiAgent(id=41, name="host agent", model_name="gpt-4o", fast_model_name="gpt-4o-mini",
+               system_prompt="You help students."))
+db.add(AiAgent(id=42, name="course agent", model_name="gpt-4o", system_prompt="You help students."))
+db.commit()
+db.close()
+
+
+def agent(**config):
+    return AiAgent(id=41, name="host agent", model_name="gpt-4o", fast_model_name="gpt-4o-mini", **config)
+
+
+def signals(knowledge_base=None, retrieval_distance=None):
+    routing = RoutingSignals()
+    routing.knowledge_base, routing.retrieval_distance = knowledge_base, retrieval_distance
+    return routing
+
+
+@pytest.mark.parametrize("query, routing, tier, reason", [
+    ("When does the term start?", None, FAST, "simple"),
+    ("Why does gradient descent converge here?", None, STRONG, "reasoning"),
+    ("I " + "really " * 60 + "need the fee structure", None, STRONG, "long_query"),
+    ("What is covered in week 3?", signals("kb_ml", 0.21), FAST, "grounded"),
+    ("What is covered in week 3?", signals("kb_ml", 0.72), STRONG, "weak_retrieval"),
+    ("What is covered in week 3?", signals("general"), FAST, "tool_use"),
+])
+def test_cheap_signals_pick_the_tier(query, routing, tier, reason):
+    decision = ModelRouter().choose(agent(), query, signals=routing)
+    assert (decision.tier, decision.reason) == (tier, reason)
+    assert decision.model == ("gpt-4o-mini" if tier == FAST else "gpt-4o")
+
+
+def test_agent_policy_overrides_the_default_thresholds():
+    router = ModelRouter()
+    strict = agent(routing_policy={"max_retrieval_distance": 0.1, "fast_with_tools": False})
+    grounded = router.choose(strict, "What is covered in week 3?", signals=signals("kb_ml", 0.21))
+    assert grounded.reason == "weak_retrieval"
+    assert router.choose(strict, "What is covered in week 3?").tier == STRONG
+    # No fast model, no routing
+    assert router.choose(AiAgent(id=42, model_name="gpt-4o"), "When does the term start?") is None
+    assert ModelRouter(enabled=False).choose(agent(), "When does the term start?") is None
+
+
+@pytest.mark.asyncio
+async def test_stream_uses_the_routed_model_and_records_the_outcome():
+    llm = FakeProvider(latency_ms=0, tokens_per_sec=0, reply_tokens=8)
+    agents = Agents(llm=llm)
+    agents.registry = AgentRegistry(session_factory=TestSession, ttl=3600)
+    agents.router, agents.response_cache = None, None
+    agents.model_router = ModelRouter()
+
+    [event async for event in agents.stream_response("When does the term start?", agent_id=41)]
+    [event async for event in agents.stream_response("Explain the bias variance trade-off", agent_id=41)]
+    [event async for event in agents.stream_response("When does the term start?", agent_id=42)]
+
+    assert [request["model"] for request in llm.requests] == ["gpt-4o-mini", "gpt-4o", "gpt-4o"]
+    routes = {(route["tier"], route["reason"]): route for route in agents.model_router.get_stats()["routes"]}
+    assert set(routes) == {(FAST, "simple"), (STRONG, "reasoning")}
+    assert routes[(FAST, "simple")]["answers"] == 1
+    assert routes[(FAST, "simple")]["avg_completion_tokens"] == 8
+    assert routes[(FAST, "simple")]["avg_ttft_ms"] is not None
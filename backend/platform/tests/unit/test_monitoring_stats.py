@@ -0,0 +1,26 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ai_platform.apis.monitoring.view import router, COMPONENT_STATS
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(router, prefix="/monitoring")
+    return TestClient(app)
+
+
+def test_stats_serves_every_component_or_the_requested_ones():
+    client = _client()
+
+    everything = client.get("/monitoring/stats")
+    assert everything.status_code == 200
+    assert set(everything.json()) == set(COMPONENT_STATS)
+
+    some = client.get("/monitoring/stats", params={"component": ["response_cache", "llm_governor"]})
+    assert set(some.json()) == {"response_cache", "llm_governor"}
+    assert "hit_rate" in some.json()["response_cache"]
+
+    unknown = client.get("/monitoring/stats", params={"component": ["response_cache", "nope"]})
+    assert unknown.status_code == 404
+    assert "nope" in unknown.json()["detail"]
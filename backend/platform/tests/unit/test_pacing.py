@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import pytest
+
+from ai_platform.agents import pacing
+from ai_platform.agents.pacing import PacingPolicy, NO_PACING
+from ai_platform.agents.streaming_services import OpenAIStreaming
+
+
+class ByteEncoding:
+    """One token per byte, so multi-byte characters are split across tokens"""
+
+    def encode(self, text, disallowed_special=()):
+        return list(text.encode("utf-8"))
+
+    def decode_bytes(self, tokens):
+        return bytes(tokens)
+
+
+def test_frames_keep_multibyte_characters(monkeypatch):
+    monkeypatch.setattr(pacing, "get_encoding", lambda: ByteEncoding())
+    text = "naïve café 📊 " * 20
+    frames = list(PacingPolicy(frame_tokens=3).frames(text))
+    assert "".join(frames) == text
+    assert all("�" not in frame for frame in frames)
+
+
+def test_frames_without_encoding(monkeypatch):
+    monkeypatch.setattr(pacing, "get_encoding", lambda: None)
+    text = "Sample Streaming Data " * 50
+    assert "".join(PacingPolicy(frame_tokens=8).frames(text)) == text
+
+
+@pytest.mark.asyncio
+async def test_unpaced_string_stream_is_immediate():
+    started = time.perf_counter()
+    chunks = [chunk async for chunk in OpenAIStreaming().stream_string("Sample Streaming Data " * 500)]
+    assert time.perf_counter() - started < 0.5
+    assert "".join(chunk[len("data: "):-2] for chunk in chunks) == "Sample Streaming Data " * 500
+    assert not NO_PACING.enabled
+
+
+@pytest.mark.asyncio
+async def test_paced_string_stream_follows_rate(monkeypatch):
+    monkeypatch.setattr(pacing, "get_encoding", lambda: ByteEncoding())
+    policy = PacingPolicy(tokens_per_sec=400)  # 20 tokens per frame
+    started = asyncio.get_running_loop().time()
+    chunks = [chunk async for chunk in OpenAIStreaming().stream_string("x" * 100, pacing=policy)]
+    elapsed = asyncio.get_running_loop().time() - started
+    assert len(chunks) == 5
+    # 5 frames of 20 tokens, the first one is sent right away
+    assert 0.18 < elapsed < 0.4
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from ai_platform.llm import providers
+from ai_platform.llm.base import LLMProvider
+from ai_platform.llm.fake_provider import FakeProvider
+from ai_platform.llm.governor import GovernedProvider, LLMGovernor
+from ai_platform.llm.openai_provider import OpenAIProvider
+
+
+def test_importing_the_providers_loads_no_langchain():
+    code = ("import sys; import ai_platform.llm.providers, ai_platform.llm.openai_provider, ai_platform.llm.governor; "
+            "print([name for name in sys.modules if name.startswith('langchain')])")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            env={**os.environ, "OPENAI_API_KEY": "sk-test"})
+    assert result.stdout.strip() == "[]"
+
+
+def test_incomplete_provider_fails_when_instantiated():
+    class ChatOnlyProvider(LLMProvider):
+        async def chat(self, **params):
+            return None
+
+    with pytest.raises(TypeError, match="embed"):
+        ChatOnlyProvider()
+
+
+@pytest.mark.asyncio
+async def test_clients_are_built_on_first_use_and_closed_once():
+    provider = OpenAIProvider(api_key="sk-test")
+    assert (provider._async_client, provider._sync_client) == (None, None)
+
+    client = provider.async_client
+    assert provider.async_client is client and provider._sync_client is None
+    await provider.aclose()
+    assert client.is_closed() and provider._async_client is None
+    await provider.aclose()
+
+
+@pytest.mark.asyncio
+async def test_embeddings_are_shared_and_providers_closed_on_shutdown(monkeypatch):
+    governed = GovernedProvider(FakeProvider(latency_ms=0, tokens_per_sec=0), LLMGovernor())
+    assert governed.langchain_embeddings() is governed.langchain_embeddings()
+
+    closed = []
+
+    async def aclose():
+        closed.append(governed.name)
+
+    monkeypatch.setattr(governed, "aclose", aclose)
+    monkeypatch.setitem(providers._providers, "fake", governed)
+    await providers.shutdown_providers()
+    assert closed == ["fake"] and providers._providers == {}
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ai_platform.supafast.models.embedding_cache import EmbeddingCacheEntry
+from ai_platform.vectordb.embedding_cache import EmbeddingCache
+from ai_platform.vectordb.query_embeddings import QueryEmbeddingCache
+
+MODEL = "text-embedding-3-small"
+
+
+class CountingEmbedder:
+    def __init__(self, dimensions=4):
+        self.calls = []
+        self.dimensions = dimensions
+
+    def vector(self, text):
+        return [float(len(text))] + [0.5] * (self.dimensions - 1)
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return self.vector(text)
+
+    async def embed_texts(self, texts):
+        self.calls.append(list(texts))
+        return [self.vector(text) for text in texts]
+
+
+def test_repeated_queries_are_embedded_once():
+    cache, embedder = QueryEmbeddingCache(max_bytes=1 << 20), CountingEmbedder()
+    first = cache.embed_query("What is in week 2?", embedder.embed_query, MODEL)
+    again = cache.embed_query("what is in  week 2?".replace("what", "What"), embedder.embed_query, MODEL)
+    assert first == again == [18.0, 0.5, 0.5, 0.5]
+    assert len(embedder.calls) == 1
+    cache.embed_query("What is in week 2?", embedder.embed_query, "text-embedding-3-large")
+    assert len(embedder.calls) == 2
+    assert cache.get_stats()["hit_rate"] == pytest.approx(1 / 3)
+
+
+def test_memory_bound_drops_the_least_recently_used():
+    embedder = CountingEmbedder(dimensions=256)
+    cache = QueryEmbeddingCache(max_bytes=3 * 1400)
+    for query in ("q1", "q2", "q3"):
+        cache.embed_query(query, embedder.embed_query, MODEL)
+    cache.embed_query("q1", embedder.embed_query, MODEL)
+    cache.embed_query("q4", embedder.embed_query, MODEL)
+    stats = cache.get_stats()
+    assert (stats["entries"], stats["evictions"]) == (3, 1)
+    assert stats["bytes"] <= cache.max_bytes
+    # q1 was used after q2, q2 is the one that had to go
+    cache.embed_query("q1", embedder.embed_query, MODEL)
+    cache.embed_query("q2", embedder.embed_query, MODEL)
+    assert [call[0] for call in embedder.calls] == ["q1", "q2", "q3", "q4", "q2"]
+
+
+@pytest.mark.asyncio
+async def test_batch_embeds_only_the_misses_and_the_shared_tier_serves_other_workers():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    EmbeddingCacheEntry.__table__.create(engine)
+    shared = EmbeddingCache(session_factory=sessionmaker(bind=engine))
+
+    worker_a, embedder = QueryEmbeddingCache(shared=shared), CountingEmbedder()
+    await worker_a.aembed_texts(["week 2", "grading"], embedder.embed_texts, MODEL)
+    vectors = await worker_a.aembed_texts(["grading", "week 2", "quiz"], embedder.embed_texts, MODEL)
+    assert embedder.calls == [["week 2", "grading"], ["quiz"]]
+    assert vectors[0] == embedder.vector("grading")
+
+    worker_b = QueryEmbeddingCache(shared=shared)
+    assert await worker_b.aembed_texts(["quiz"], embedder.embed_texts, MODEL) == [embedder.vector("quiz")]
+    assert len(embedder.calls) == 2
+    assert worker_b.get_stats()["shared_hits"] == 1
@@ -0,0 +1,54 @@
+from unittest.mock import patch
+
+import pytest
+
+from ai_platform.agents.query_router import EmbeddingRouter, course_vector_index, GENERAL_ROUTE
+
+CANDIDATES = [
+    {**GENERAL_ROUTE, "description": "general"},
+    {"vector_index": "kb_bdm", "agent": "course_agent", "description": "bdm"},
+    {"vector_index": "kb_ba", "agent": "course_agent", "description": "ba"},
+]
+VECTORS = {"general": [1, 0, 0], "bdm": [0, 1, 0], "ba": [0, 0.8, 0.6]}
+
+
+async def fake_embed(texts):
+    return [VECTORS.get(text, [1, 1, 1]) for text in texts]
+
+
+def make_router(**kwargs):
+    return EmbeddingRouter(fake_embed, **kwargs)
+
+
+def test_course_vector_index():
+    assert course_vector_index("Business Data Management") == "kb_bdm"
+    assert course_vector_index("Business Analytics") == "kb_ba"
+
+
+@pytest.mark.asyncio
+async def test_route_confident_query():
+    router = make_router(min_score=0.9, min_margin=0.05)
+    with patch.object(EmbeddingRouter, "_load_descriptions", staticmethod(lambda: [dict(c) for c in CANDIDATES])):
+        route = await router.route("bdm")
+    assert route["vector_index"] == "kb_bdm"
+    assert router.get_stats()["fallback_rate"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_route_ambiguous_query_falls_back():
+    router = make_router(min_score=0.9, min_margin=0.05)
+    with patch.object(EmbeddingRouter, "_load_descriptions", staticmethod(lambda: [dict(c) for c in CANDIDATES])):
+        route = await router.route("something else")
+    assert route is None
+    assert router.get_stats()["fallbacks"] == 1
+
+
+@pytest.mark.asyncio
+async def test_margin_is_measured_against_another_collection(monkeypatch):
+    # The course description and the description of its agent both describe kb_bdm
+    candidates = CANDIDATES + [{"vector_index": "kb_bdm", "agent": "course_agent", "description": "bdm agent"}]
+    monkeypatch.setitem(VECTORS, "bdm agent", [0, 0.99, 0.14])
+    router = make_router(min_score=0.9, min_margin=0.05)
+    with patch.object(EmbeddingRouter, "_load_descriptions", staticmethod(lambda: [dict(c) for c in candidates])):
+        route = await router.route("bdm")
+    assert route["vector_index"] == "kb_bdm"
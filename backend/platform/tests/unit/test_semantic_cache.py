@@ -0,0 +1,124 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ai_platform.agents.agent_registry import AgentRegistry
+from ai_platform.agents.framework_agentic import Agents
+from ai_platform.agents.semantic_cache import SemanticCache
+from ai_platform.llm.fake_provider import FakeProvider
+from ai_platform.supafast.models.ai_agent import AiAgent
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+AiAgent.__table__.create(engine)
+TestSession = sessionmaker(bind=engine)
+
+db = TestSession()
+db.add(AiAgent(id=8, name="course agent", model_name="gpt-4o-mini", system_prompt="You help students."))
+db.commit()
+db.close()
+
+
+def test_similar_query_hits_cache():
+    cache = SemanticCache(max_entries=10, ttl=60, threshold=0.95)
+    cache.store(agent_id=8, course_id=1, embedding=[1.0, 0.0, 0.1], response="Week 2 covers joins")
+
+    assert cache.lookup(8, 1, [0.99, 0.01, 0.1]) == "Week 2 covers joins"
+    assert cache.lookup(8, 1, [0.0, 1.0, 0.0]) is None
+    # Same question for another agent or course is a different answer
+    assert cache.lookup(9, 1, [1.0, 0.0, 0.1]) is None
+    assert cache.lookup(8, 2, [1.0, 0.0, 0.1]) is None
+
+
+def test_course_invalidation_and_lru_eviction():
+    cache = SemanticCache(max_entries=2, ttl=60, threshold=0.95)
+    cache.store(8, 1, [1.0, 0.0], "course 1")
+    cache.store(8, 2, [1.0, 0.0], "course 2")
+
+    cache.invalidate_course(1)
+    assert cache.lookup(8, 1, [1.0, 0.0]) is None
+    assert cache.lookup(8, 2, [1.0, 0.0]) == "course 2"
+
+    cache.store(8, 3, [1.0, 0.0], "course 3")
+    cache.store(8, 4, [1.0, 0.0], "course 4")
+    assert cache.lookup(8, 2, [1.0, 0.0]) is None
+    assert cache.get_stats()["entries"] == 2
+
+
+def test_expired_entries_are_ignored():
+    cache = SemanticCache(max_entries=10, ttl=-1, threshold=0.95)
+    cache.store(8, 1, [1.0, 0.0], "stale")
+    assert cache.lookup(8, 1, [1.0, 0.0]) is None
+
+
+def test_context_is_part_of_the_key_and_the_best_match_wins():
+    cache = SemanticCache(max_entries=10, ttl=60, threshold=0.9)
+    cache.store(8, 1, [1.0, 0.0, 0.0], "BDM answer", context="BDM course")
+    cache.store(8, 1, [0.9, 0.1, 0.0], "close answer", context="BDM course")
+    cache.store(8, 1, [0.95, 0.05, 0.0], "closer answer", context="BDM course")
+
+    assert cache.lookup(8, 1, [1.0, 0.0, 0.0], context="BDM course") == "BDM answer"
+    assert cache.lookup(8, 1, [0.94, 0.06, 0.0], context="BDM course") == "closer answer"
+    assert cache.lookup(8, 1, [1.0, 0.0, 0.0], context="Python course") is None
+    assert cache.lookup(8, 1, [1.0, 0.0, 0.0]) is None
+    # A vector of another size (the embedding model changed) is a miss, not an error
+    assert cache.lookup(8, 1, [1.0, 0.0], context="BDM course") is None
+
+    # Removing the first row of a bucket keeps the rows and the ids aligned
+    cache._remove(0)
+    assert cache.lookup(8, 1, [1.0, 0.0, 0.0], context="BDM course") == "closer answer"
+    assert cache.lookup(8, 1, [0.9, 0.1, 0.0], context="BDM course") == "close answer"
+
+
+@pytest.mark.asyncio
+async def test_agent_answers_are_cached_in_their_course():
+    llm = FakeProvider(latency_ms=0, tokens_per_sec=0, reply_tokens=10)
+    agents = Agents(llm=llm)
+    agents.registry = AgentRegistry(session_factory=TestSession, ttl=3600)
+    agents.router = None
+    agents.response_cache = SemanticCache(max_entries=10, ttl=60, threshold=0.95)
+
+    async def ask(course_id, context="BDM course"):
+        return [event async for event in agents.agent_response(8, "What is in week 2?", context=context,
+                                                               streaming=True, course_id=course_id)]
+
+    await ask(1)
+    await ask(1)
+    assert len(llm.requests) == 1
+    # The same question in another course or with another context is answered again
+    await ask(2)
+    await ask(1, context="Python course")
+    assert len(llm.requests) == 3
+
+    agents.response_cache.invalidate_course(1)
+    await ask(1)
+    assert len(llm.requests) == 4
+
+
+def test_store_of_an_older_version_is_dropped():
+    cache = SemanticCache(max_entries=10, ttl=60, threshold=0.95)
+    version = cache.version(1)
+    cache.invalidate_course(1)
+
+    assert cache.store(8, 1, [1.0, 0.0], "built from the old week 2", version=version) is False
+    assert cache.lookup(8, 1, [1.0, 0.0]) is None
+    assert cache.store(8, 1, [1.0, 0.0], "built from the new week 2", version=cache.version(1)) is True
+    assert cache.lookup(8, 1, [1.0, 0.0]) == "built from the new week 2"
+
+
+@pytest.mark.asyncio
+async def test_answer_generated_while_the_course_changed_is_not_cached():
+    llm = FakeProvider(latency_ms=0, tokens_per_sec=0, reply_tokens=10)
+    agents = Agents(llm=llm)
+    agents.registry = AgentRegistry(session_factory=TestSession, ttl=3600)
+    agents.router = None
+    agents.response_cache = SemanticCache(max_entries=10, ttl=60, threshold=0.95)
+
+    events = agents.stream_response("What is in week 2?", agent_id=8, course_id=1)
+    await events.__anext__()
+    agents.response_cache.invalidate_course(1)  # weekwise content saved while the answer streams
+    [event async for event in events]
+
+    assert agents.response_cache.get_stats()["stale_stores"] == 1
+    [event async for event in agents.stream_response("What is in week 2?", agent_id=8, course_id=1)]
+    assert len(llm.requests) == 2
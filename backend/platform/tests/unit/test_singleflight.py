@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ai_platform.agents.agent_registry import AgentRegistry
+from ai_platform.agents.framework_agentic import Agents
+from ai_platform.agents.singleflight import SingleFlight, FlightAborted
+from ai_platform.agents.stream_events import StreamEvent
+from ai_platform.llm.fake_provider import FakeProvider
+from ai_platform.supafast.models.ai_agent import AiAgent
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+AiAgent.__table__.create(engine)
+TestSession = sessionmaker(bind=engine)
+
+db = TestSession()
+db.add(AiAgent(id=8, name="host agent", model_name="gpt-4o-mini", system_prompt="You help students."))
+db.commit()
+db.close()
+
+
+async def slow_tokens(tokens, delay=0.02):
+    for token in tokens:
+        await asyncio.sleep(delay)
+        yield StreamEvent.text(token)
+    yield StreamEvent.end()
+
+
+async def collect(events):
+    return [(event.type, event.content) async for event in events]
+
+
+def test_key_normalizes_query_and_skips_follow_ups():
+    flights = SingleFlight()
+    assert flights.key(8, "  What is   in Week 2? ", course_id=1) == flights.key(8, "what is in week 2", course_id=1)
+    assert flights.key(8, "What is in week 2?", course_id=1) != flights.key(8, "What is in week 2?", course_id=2)
+    assert flights.key(8, "Why?", history=[{"role": "assistant", "content": "Because."}]) is None
+    assert SingleFlight(enabled=False).key(8, "What is in week 2?") is None
+
+
+@pytest.mark.asyncio
+async def test_late_joiner_gets_buffered_prefix_then_live_events():
+    flights = SingleFlight()
+    key = flights.key(8, "What is in week 2?", course_id=1)
+    flight, leading = flights.acquire(key)
+    assert leading
+    flights.start(flight, slow_tokens(["a", "b", "c", "d"]))
+    leader = asyncio.create_task(collect(flight.subscribe()))
+
+    await asyncio.sleep(0.05)
+    joined, follower_leads = flights.acquire(key)
+    assert joined is flight and not follower_leads
+    assert len(flight.events) >= 2
+    follower = await collect(joined.subscribe())
+
+    expected = [("text", "a"), ("text", "b"), ("text", "c"), ("text", "d"), ("end", None)]
+    assert await leader == expected
+    assert follower == expected
+    # A completed flight is released, the next request leads a new one
+    assert flights.get_stats()["in_flight"] == 0
+    assert flights.acquire(key)[1]
+
+
+@pytest.mark.asyncio
+async def test_followers_of_an_aborted_flight_are_told_to_answer_themselves():
+    flights = SingleFlight()
+    key = flights.key(8, "What is in week 2?", course_id=1)
+    flight, _ = flights.acquire(key)
+    follower, _ = flights.acquire(key)
+    waiting = asyncio.create_task(collect(follower.subscribe()))
+    await asyncio.sleep(0)
+
+    flights.abort(flight)
+    with pytest.raises(FlightAborted):
+        await waiting
+    assert flights.get_stats()["aborted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_identical_agent_queries_share_one_completion():
+    llm = FakeProvider(latency_ms=50, tokens_per_sec=200, reply_tokens=20)
+    agents = Agents(llm=llm)
+    agents.registry = AgentRegistry(session_factory=TestSession, ttl=3600)
+    agents.router, agents.response_cache = None, None
+
+    queries = ["What is in week 2?", "what is in week 2", "  WHAT is in week 2 ?"]
+    answers = await asyncio.gather(*(
+        collect(agents.agent_response(8, query, context="BDM course", streaming=True)) for query in queries * 3
+    ))
+
+    assert len(llm.requests) == 1
+    assert all(answer == answers[0] for answer in answers)
+    assert answers[0][-1] == ("end", None)
+    assert agents.flights.get_stats()["followers"] == 8
+
+    # Another course context is another question
+    await collect(agents.agent_response(8, queries[0], context="Python course", streaming=True))
+    assert len(llm.requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_upstream_is_cancelled_once_every_member_left():
+    flights = SingleFlight()
+    closed = asyncio.Event()
+
+    async def upstream():
+        try:
+            async for event in slow_tokens(["a"] * 100):
+                yield event
+        finally:
+            closed.set()
+
+    key = flights.key(8, "What is in week 2?", course_id=1)
+    flight, _ = flights.acquire(key)
+    follower, _ = flights.acquire(key)
+    flights.start(flight, upstream())
+    leader_stream, follower_stream = flight.subscribe(), follower.subscribe()
+    await leader_stream.__anext__()
+    await follower_stream.__anext__()
+
+    await leader_stream.aclose()
+    assert not closed.is_set()  # the follower still reads the answer
+    await follower_stream.aclose()
+    await asyncio.sleep(0.01)
+    assert closed.is_set()
+    assert flights.get_stats()["cancelled"] == 1
+    # Nobody joins a cancelled answer
+    assert flights.acquire(key)[1]
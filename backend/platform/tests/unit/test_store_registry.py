@@ -0,0 +1,40 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_platform.vectordb.store_registry import VectorStoreRegistry
+
+
+class SlowStore:
+    built = 0
+    lock = threading.Lock()
+
+    def __init__(self, collection_name):
+        time.sleep(0.05)  # table check and collection lookup
+        with SlowStore.lock:
+            SlowStore.built += 1
+        self.collection = collection_name
+
+
+def test_concurrent_first_requests_build_one_handle():
+    SlowStore.built = 0
+    registry = VectorStoreRegistry(factory=SlowStore)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        stores = list(pool.map(registry.get, ["kb_bdm"] * 8))
+    assert SlowStore.built == 1
+    assert all(store is stores[0] for store in stores)
+    stats = registry.get_stats()
+    assert (stats["builds"], stats["hits"]) == (1, 7)
+
+
+def test_least_recently_used_collection_is_evicted():
+    registry = VectorStoreRegistry(factory=SlowStore, max_collections=2)
+    bdm = registry.get("kb_bdm")
+    registry.get("kb_mlf")
+    assert registry.get("kb_bdm") is bdm  # kb_mlf is now the least recently used
+    registry.get("kb_pds")
+    assert registry.get_stats()["collections"] == ["kb_bdm", "kb_pds"]
+    assert registry.get_stats()["evictions"] == 1
+
+    registry.invalidate("kb_bdm")
+    assert registry.get("kb_bdm") is not bdm
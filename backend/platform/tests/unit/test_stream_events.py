@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from ai_platform.agents.stream_events import StreamEvent, FrameCoalescer
+
+
+async def token_stream(tokens, delay=0.0, pause_after=None, pause=0.0):
+    for i, token in enumerate(tokens):
+        if delay:
+            await asyncio.sleep(delay)
+        yield StreamEvent.text(token)
+        if i == pause_after:
+            await asyncio.sleep(pause)
+    yield StreamEvent.end()
+
+
+async def collect(events):
+    return [event async for event in events]
+
+
+def test_event_serialized_once_compact():
+    event = StreamEvent("metadata", conversation_id="abc", timings={"first_token": 1.5})
+    assert event.serialize() == '{"type":"metadata","conversation_id":"abc","timings":{"first_token":1.5}}'
+    assert event.serialize() is event.serialize()
+    assert StreamEvent.end().serialize() == '{"type":"end"}'
+
+
+@pytest.mark.asyncio
+async def test_coalescer_groups_tokens_and_keeps_order():
+    tokens = [f"tok{i} " for i in range(200)]
+    coalescer = FrameCoalescer(interval_ms=1000, max_bytes=100)
+    frames = await collect(coalescer.coalesce(token_stream(tokens)))
+
+    # The first token is not delayed, the end event closes the stream after the last frame
+    assert frames[0].content == "tok0 "
+    assert frames[-1].type == "end"
+    text_frames = [frame for frame in frames if frame.type == "text"]
+    assert "".join(frame.content for frame in text_frames) == "".join(tokens)
+    assert len(text_frames) < 30
+    assert all(len(frame.content) < 110 for frame in text_frames)
+
+
+@pytest.mark.asyncio
+async def test_coalescer_flushes_on_interval_while_upstream_pauses():
+    coalescer = FrameCoalescer(interval_ms=20, max_bytes=10_000)
+    received = []
+    async for frame in coalescer.coalesce(token_stream(["a", "b", "c", "d"], pause_after=2, pause=0.3)):
+        received.append((asyncio.get_running_loop().time(), frame))
+    start = received[0][0]
+    # "b" and "c" are sent during the pause, not held until "d" arrives
+    assert received[1][1].content == "bc"
+    assert received[1][0] - start < 0.2
+    assert received[2][1].content == "d"
+
+
+@pytest.mark.asyncio
+async def test_cancelling_the_consumer_closes_the_upstream():
+    closed = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield StreamEvent.text("x")
+        finally:
+            closed.set()
+
+    async def consume():
+        async for _ in FrameCoalescer(interval_ms=20, max_bytes=10_000).coalesce(endless()):
+            pass
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.sleep(0.1)
+    consumer.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await consumer
+    assert closed.is_set()
@@ -0,0 +1,87 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ai_platform.agents import tools_implemented
+from ai_platform.agents.tool_cache import ToolResultCache
+from ai_platform.agents.transcript_index import TranscriptIndex
+from ai_platform.supafast.models.courses import Course
+from ai_platform.supafast.models.weekwise_content import WeekwiseContent, VideoLecture, GradedAssignment, \
+    PracticeAssignment
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+for model in (Course, WeekwiseContent, VideoLecture, GradedAssignment, PracticeAssignment):
+    model.__table__.create(engine)
+TestSession = sessionmaker(bind=engine)
+
+statements = []
+event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+
+db = TestSession()
+db.add(Course(id=1, title="Business Data Management", category="Diploma", icon="bdm", description="BDM"))
+db.add_all([WeekwiseContent(course_id=1, week_no=week_no, term="Jan 2025") for week_no in (1, 2)])
+db.add(VideoLecture(course_id=1, week_no=2, lecture_no=1, title="Intro", transcript="hello", duration="10:00",
+                    video_link="https://example.com/v"))
+db.add(GradedAssignment(course_id=1, week_no=2, assignment_no=3, title="GA 3", assignment_content=[], deadline="soon"))
+db.commit()
+db.close()
+
+
+def call(db, monkeypatch, cache, **kwargs):
+    monkeypatch.setattr(tools_implemented, "tool_cache", cache)
+    statements.clear()
+    return tools_implemented.get_course_content(db, **kwargs)
+
+
+def test_course_content_single_query(monkeypatch):
+    db = TestSession()
+    result = call(db, monkeypatch, ToolResultCache(), course_id=1, week_no=2, lecture_no=1,
+                  is_transcript_required=True, graded_assignment_id=3, practice_assignment_id=9)
+    assert len(statements) == 1
+    content = result["content"]
+    assert content["week"]["week_no"] == 2
+    assert content["lecture"]["transcript_segments"][0]["text"] == "hello"
+    assert content["graded_assignment"]["title"] == "GA 3"
+    assert "practice_assignment" not in content
+
+    result = call(db, monkeypatch, ToolResultCache(), course_id=1)
+    assert result["content"]["total_weeks"] == 2
+    assert call(db, monkeypatch, ToolResultCache(), course_id=42) == {"error": "Course with ID 42 not found."}
+    db.close()
+
+
+def test_course_content_cache_hits_and_invalidation(monkeypatch):
+    db = TestSession()
+    cache = ToolResultCache()
+    first = call(db, monkeypatch, cache, course_id=1, week_no=2, lecture_no=1)
+    # Same arguments as sent by the model in another form
+    second = call(db, monkeypatch, cache, course_id="1", week_no="2", lecture_no=1, graded_assignment_id=0)
+    assert second == first
+    assert statements == []
+    assert cache.get_stats()["hits"] == 1
+
+    cache.invalidate_course(1)
+    call(db, monkeypatch, cache, course_id=1, week_no=2, lecture_no=1)
+    assert len(statements) == 1
+    db.close()
+
+
+def test_not_found_is_not_cached(monkeypatch):
+    db = TestSession()
+    cache = ToolResultCache()
+    call(db, monkeypatch, cache, course_id=7)
+    assert cache.get_stats()["entries"] == 0
+    db.close()
+
+
+def test_lexically_ranked_transcript_is_not_cached(monkeypatch):
+    def unreachable_store():
+        raise ConnectionError("database unavailable")
+
+    monkeypatch.setattr(tools_implemented, "transcript_index", TranscriptIndex(store_factory=unreachable_store))
+    db = TestSession()
+    cache = ToolResultCache()
+    result = call(db, monkeypatch, cache, course_id=1, week_no=2, lecture_no=1, is_transcript_required=True,
+                  query="greeting")
+    assert result["content"]["lecture"]["transcript_segments"][0]["text"] == "hello"
+    assert cache.get_stats()["entries"] == 0
@@ -0,0 +1,135 @@
+from types import SimpleNamespace
+
+from ai_platform.agents.tokens import count_tokens
+from ai_platform.agents.transcript_index import LectureTranscript, TranscriptIndex, split_transcript, parse_duration
+
+
+class InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class QueuedExecutor:
+    """Runs the submitted jobs when the test says so"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        self.jobs.append((fn, args))
+
+    def run(self):
+        jobs, self.jobs = self.jobs, []
+        for fn, args in jobs:
+            fn(*args)
+
+
+class FakeVectorStore:
+    """Stands in for PGVector, ranks documents by shared words"""
+
+    def __init__(self):
+        self.docs = {}
+        self.index_calls = 0
+
+    def add_documents(self, docs, ids):
+        self.index_calls += 1
+        self.docs.update(zip(ids, docs))
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.docs.pop(doc_id, None)
+
+
+class FakePgvector:
+    def __init__(self):
+        self.vectorstore = FakeVectorStore()
+
+    def query_with_score(self, query, k=6, filter=None):
+        words = set(query.lower().split())
+        matches = [doc for doc in self.vectorstore.docs.values()
+                   if all(doc.metadata[key] == value for key, value in filter.items())]
+        matches.sort(key=lambda doc: -len(words & set(doc.page_content.lower().split())))
+        return [(doc, 0.0) for doc in matches[:k]]
+
+
+def lecture(transcript, duration="10:00"):
+    return SimpleNamespace(id=1, course_id=1, week_no=2, lecture_no=3, transcript=transcript, duration=duration)
+
+
+def test_split_transcript_timestamps():
+    assert parse_duration("1:02:03") == 3723
+    assert parse_duration("n/a") is None
+
+    text = "[00:00] welcome to the course. " + "filler words here. " * 100 + "[05:30] now normalization of tables."
+    segments = split_transcript(text, "10:00")
+    assert segments[0]["start_sec"] == 0
+    assert segments[-1]["end_sec"] == 330
+
+    # Without markers the times are estimated from the duration
+    segments = split_transcript("plain words. " * 300, "10:00")
+    assert segments[0]["start_sec"] == 0
+    assert 500 < segments[-1]["end_sec"] <= 600
+
+
+def test_relevant_segments_under_token_cap():
+    store = FakePgvector()
+    index = TranscriptIndex(store_factory=lambda: store, top_k=3, max_tokens=400, executor=InlineExecutor())
+    text = "intro talk. " * 150 + "normalization removes redundancy in tables. " * 20 + "outro talk. " * 150
+    index.schedule_index(lecture(text))
+    assert store.vectorstore.index_calls == 1
+
+    segments, ranked_lexically = index.relevant_segments(lecture(text), "what is normalization")
+    assert store.vectorstore.index_calls == 1 and not ranked_lexically
+    assert any("normalization" in segment["text"] for segment in segments)
+    assert sum(count_tokens(segment["text"]) for segment in segments) <= 400
+    assert all(segment["start"] for segment in segments)
+
+    # A single segment over the cap is cut to it
+    segments, _ = index.relevant_segments(lecture(text), "what is normalization", top_k=1, max_tokens=50)
+    assert count_tokens(segments[0]["text"]) <= 50
+
+
+def test_search_never_indexes_inline():
+    store = FakePgvector()
+    executor = QueuedExecutor()
+    index = TranscriptIndex(store_factory=lambda: store, top_k=2, executor=executor)
+    text = "cats. " * 300 + "sql joins explained. " * 10
+
+    # Not indexed yet: the segments are ranked lexically and the indexing is queued once
+    segments, ranked_lexically = index.relevant_segments(lecture(text), "joins")
+    assert any("joins" in segment["text"] for segment in segments) and ranked_lexically
+    index.relevant_segments(lecture(text), "joins")
+    assert store.vectorstore.index_calls == 0 and len(executor.jobs) == 1
+    executor.run()
+    assert store.vectorstore.index_calls == 1
+
+    _, ranked_lexically = index.relevant_segments(lecture(text), "joins")
+    assert not executor.jobs and not ranked_lexically
+
+    # An edited transcript is found stale and re-indexed in the background, the old tail is dropped
+    index.relevant_segments(lecture("short new transcript about joins"), "joins")
+    assert len(executor.jobs) == 1
+    executor.run()
+    assert store.vectorstore.index_calls == 2
+    assert len(store.vectorstore.docs) == 1
+
+
+def test_relevant_segments_falls_back_when_store_fails():
+    def broken_store():
+        raise ConnectionError("database unavailable")
+
+    index = TranscriptIndex(store_factory=broken_store, top_k=1)
+    segments, ranked_lexically = index.relevant_segments(lecture("cats. " * 300 + "sql joins explained. " * 10),
+                                                         "joins")
+    assert "joins" in segments[0]["text"] and ranked_lexically
+
+
+def test_deleted_lecture_segments_are_removed():
+    store = FakePgvector()
+    index = TranscriptIndex(store_factory=lambda: store, executor=InlineExecutor())
+    deleted = LectureTranscript.of(lecture("cats. " * 300 + "sql joins explained. " * 10))
+    index.schedule_index(deleted)
+    assert store.vectorstore.docs
+
+    assert index.schedule_remove(deleted)
+    assert store.vectorstore.docs == {}
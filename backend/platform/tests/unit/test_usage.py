@@ -0,0 +1,154 @@
+import asyncio
+import uuid
+from datetime import date
+
+import pytest
+from openai.types import CompletionUsage
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import ai_platform.supafast.models  # noqa: F401, registers the tables the usage rows reference
+from ai_platform.agents.agent_registry import AgentRegistry
+from ai_platform.agents.framework_agentic import Agents
+from ai_platform.agents.usage import UsageRecorder, completion_cost, set_usage_scope
+from ai_platform.apis.usage import crud
+from ai_platform.llm.fake_provider import FakeProvider
+from ai_platform.supafast.models.ai_agent import AiAgent
+from ai_platform.supafast.models.llm_usage import LlmUsage
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+AiAgent.__table__.create(engine)
+LlmUsage.__table__.create(engine)
+TestSession = sessionmaker(bind=engine)
+
+db = TestSession()
+db.add(AiAgent(id=31, name="host agent", model_name="gpt-4o-mini", system_prompt="You help students."))
+db.add(AiAgent(id=32, name="query parser", model_name="gpt-4o", system_prompt="Pick the knowledge base."))
+db.commit()
+db.close()
+
+
+@pytest.fixture(autouse=True)
+def empty_usage_table():
+    with TestSession() as session:
+        session.query(LlmUsage).delete()
+        session.commit()
+
+
+def usage(prompt_tokens, completion_tokens):
+    return CompletionUsage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           total_tokens=prompt_tokens + completion_tokens)
+
+
+def test_cost_uses_the_price_of_the_base_model():
+    assert completion_cost("gpt-4o-mini", 1_000_000, 1_000_000) == pytest.approx(0.75)
+    assert completion_cost("gpt-4o-mini-2024-07-18", 1_000_000, 0) == pytest.approx(0.15)
+    assert completion_cost("unknown-model", 1000, 1000) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_rows_are_written_in_one_batch_with_the_conversation_known_at_flush():
+    recorder = UsageRecorder(session_factory=TestSession)
+    conversation_id = uuid.uuid4()
+
+    async def request():
+        # A new chat: the parser runs before the conversation is created
+        scope = set_usage_scope(course_id=4, user_id=9)
+        recorder.record(32, "gpt-4o", "parser", usage(300, 20), latency_ms=120)
+        scope.conversation_id = conversation_id
+        recorder.record(31, "gpt-4o-mini", "answer", usage(900, 150), latency_ms=2400)
+
+    await asyncio.create_task(request())
+    recorder.record(31, "gpt-4o-mini", "summary", None)  # a completion without usage is not accounted
+    assert recorder.get_stats()["pending"] == 2
+    with TestSession() as session:
+        assert session.query(LlmUsage).count() == 0  # nothing is written on the request path
+
+    assert recorder.flush() == 2
+    with TestSession() as session:
+        rows = session.query(LlmUsage).order_by(LlmUsage.id).all()
+        assert [(row.kind, row.conversation_id, row.course_id, row.user_id) for row in rows] == [
+            ("parser", conversation_id, 4, 9), ("answer", conversation_id, 4, 9)
+        ]
+        assert rows[1].cost_usd == pytest.approx(completion_cost("gpt-4o-mini", 900, 150))
+
+    by_kind = {kind["kind"]: kind for kind in crud.conversation_usage(TestSession(), conversation_id)["kinds"]}
+    assert by_kind["parser"]["prompt_tokens"] == 300
+    assert by_kind["answer"]["completion_tokens"] == 150
+
+
+def test_failed_flush_keeps_the_rows_for_the_next_one():
+    class DatabaseDown:
+        def execute(self, *args):
+            raise RuntimeError("db down")
+
+        def rollback(self):
+            pass
+
+        def close(self):
+            pass
+
+    recorder = UsageRecorder(session_factory=DatabaseDown, max_buffer=2)
+    for _ in range(3):
+        recorder.record(31, "gpt-4o-mini", "answer", usage(10, 5))
+    assert recorder.flush() == 0
+    stats = recorder.get_stats()
+    assert (stats["pending"], stats["dropped"], stats["failed_flushes"]) == (2, 1, 1)
+
+    recorder.session_factory = TestSession
+    assert recorder.flush() == 2
+
+
+def test_a_rejected_row_is_dropped_without_failing_its_batch():
+    checked = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    event.listen(checked, "connect", lambda connection, _: connection.execute("PRAGMA foreign_keys=ON"))
+    with checked.begin() as connection:
+        # Bare parents for the scope foreign keys, the real tables use Postgres types
+        for table in ("users", "courses", "conversations"):
+            connection.exec_driver_sql(f"CREATE TABLE {table} (id PRIMARY KEY)")
+    AiAgent.__table__.create(checked)
+    LlmUsage.__table__.create(checked)
+    CheckedSession = sessionmaker(bind=checked)
+    with CheckedSession() as session:
+        session.add(AiAgent(id=31, name="host agent", model_name="gpt-4o-mini", system_prompt="You help students."))
+        session.commit()
+
+    recorder = UsageRecorder(session_factory=CheckedSession)
+    recorder.record(31, "gpt-4o-mini", "parser", usage(300, 20))
+    recorder.record(404, "gpt-4o-mini", "answer", usage(900, 150))  # the agent doesn't exist
+    recorder.record(31, "gpt-4o-mini", "answer", usage(900, 150))
+    assert recorder.flush() == 2
+    stats = recorder.get_stats()
+    assert (stats["written"], stats["rejected"], stats["pending"], stats["failed_flushes"]) == (2, 1, 0, 0)
+    with CheckedSession() as session:
+        assert [row.kind for row in session.query(LlmUsage).order_by(LlmUsage.id)] == ["parser", "answer"]
+
+    # The next batch is written in one insert again
+    recorder.record(31, "gpt-4o-mini", "summary", usage(50, 10))
+    assert recorder.flush() == 1
+
+
+@pytest.mark.asyncio
+async def test_agent_completions_are_accounted_and_aggregated():
+    agents = Agents(llm=FakeProvider(latency_ms=0, tokens_per_sec=0, reply_tokens=12))
+    agents.registry = AgentRegistry(session_factory=TestSession, ttl=3600)
+    agents.router, agents.response_cache = None, None
+    agents.usage_recorder = UsageRecorder(session_factory=TestSession)
+
+    set_usage_scope(course_id=4, user_id=9)
+    _ = [event async for event in agents.stream_response("What is in week 2?", agent_id=31)]
+    await agents._execute_agent(32, "What is in week 2?")
+    agents.usage_recorder.flush()
+
+    today = date.today()
+    session = TestSession()
+    per_agent = {row["agent_id"]: row for row in crud.usage_by_agent(session, today, today)}
+    assert per_agent[31]["agent_name"] == "host agent"
+    assert per_agent[31]["completion_tokens"] == 12
+    assert per_agent[32]["calls"] == 1
+    daily = crud.usage_by_day(session, today, today)
+    assert len(daily) == 1 and daily[0]["calls"] == 2
+    assert daily[0]["cost_usd"] == pytest.approx(sum(row["cost_usd"] for row in per_agent.values()))
+    assert [row["course_id"] for row in crud.usage_by_course(session, today, today)] == [4]
+    assert crud.usage_by_day(session, today, today, agent_id=32)[0]["calls"] == 1